@@ -19,8 +19,9 @@ from aiohttp import web
 
 from . import settings
 from database.models import close_pg, init_pg
-from database.consumers import register_consumer_in_the_database
+from database.consumers import get_ip, register_consumer_in_the_database
 from database.settings import get_postgres_credentials
+from .heartbeat import start_heartbeats
 from .urls import setup_routes
 
 
@@ -28,19 +29,29 @@ async def on_startup(app):
     # initialize database connection
     await init_pg(app)
 
+    # the address of the consumer does not change, so there is no need to look it up on every request
+    app["consumer_ip"] = get_ip(app)
+
     # register self in the database
     app["register_consumer_task"] = asyncio.create_task(register_consumer_in_the_database(app))
 
+    # let the producer know that this consumer is alive
+    app["heartbeat_thread"] = start_heartbeats(app)
+
 
 async def on_cleanup(app):
-    # cancel the register consumer task
-    task = app.get("register_consumer_task")
-    if task:
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            logging.info("Background task register_consumer_in_the_database was cancelled")
+    # cancel background tasks
+    if "heartbeat_thread" in app:
+        app["heartbeat_thread"].stop()
+
+    for name in ["register_consumer_task"]:
+        task = app.get(name)
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                logging.info(f"Background task {name} was cancelled")
 
     # close the database connection
     await close_pg(app)
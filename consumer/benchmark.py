@@ -0,0 +1,97 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import pathlib
+import re
+import sys
+import time
+
+import nltk
+
+from consumer.views.submit_job import article_tree, find_sentences, get_paragraphs, get_sections, job_regex, \
+    sentence_with_context
+
+
+def tokenize_section(paragraphs, pattern):
+    """
+    Previous way of finding sentences: split the whole section and search the job_id in each sentence
+    :param paragraphs: list of paragraphs returned by get_paragraphs
+    :param pattern: compiled regex returned by job_regex
+    :return: list of sentences
+    """
+    tokenized_text = nltk.sent_tokenize(" ".join(paragraphs))
+    return [
+        sentence_with_context(tokenized_text, index) for index, sentence in enumerate(tokenized_text)
+        if re.search(pattern.pattern, sentence.lower()) and len(sentence.split()) > 3
+    ]
+
+
+def load_sections(path):
+    """
+    Get the paragraphs of each section of the articles saved in path
+    :param path: folder with articles (XML returned by Europe PMC fullTextXML)
+    :return: list of lists of paragraphs
+    """
+    sections = []
+    for filename in sorted(pathlib.Path(path).glob("*.xml")):
+        article = article_tree(filename.read_text(encoding="utf-8"), filename.stem)
+        if article is not None:
+            for section in get_sections(article, include_abstract=True).values():
+                if section is not None:
+                    sections.append(get_paragraphs(section))
+    return sections
+
+
+def run(function, sections, patterns, repeat):
+    """
+    Find the sentences of all sections for all job_ids
+    :return: sentences found and the best time, in seconds
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = [function(paragraphs, pattern) for pattern in patterns for paragraphs in sections]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return output, best
+
+
+def main():
+    """
+    Compare the sentences found by tokenizing whole sections with the sentences found by find_sentences.
+    Run it with: python3 -m consumer.benchmark --articles <folder> --job-id <id> [--job-id <id> ...]
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", required=True, help="folder with articles saved as <pmcid>.xml")
+    parser.add_argument("--job-id", dest="job_ids", action="append", required=True, help="id to search for")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs, the best one is reported")
+    args = parser.parse_args()
+
+    sections = load_sections(args.articles)
+    patterns = [job_regex(job_id) for job_id in args.job_ids]
+
+    expected, baseline = run(tokenize_section, sections, patterns, args.repeat)
+    output, elapsed = run(find_sentences, sections, patterns, args.repeat)
+
+    mismatches = sum(1 for a, b in zip(expected, output) if a != b)
+    print(f"sections: {len(sections)}, job_ids: {len(patterns)}, sentences: {sum(len(item) for item in expected)}")
+    print(f"tokenize whole sections: {baseline:.3f}s")
+    print(f"find_sentences: {elapsed:.3f}s ({baseline / elapsed if elapsed else float('inf'):.1f}x faster)")
+    print(f"sections with different output: {mismatches}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import functools
+import gzip
+import itertools
+import logging
+import pathlib
+import re
+import tarfile
+
+import numpy as np
+
+from consumer.settings import CORPUS
+
+# PMC Open Access packages contain files like PMC000xxxxxx/PMC176545.xml
+PMCID_REGEX = re.compile(r"PMC(\d+)\.n?xml$")
+
+# files created by build_index in the corpus folder
+INDEX_FILE = "index.npy"
+PACKAGES_FILE = "packages.txt"
+
+# rows of the index: pmcid (without the PMC prefix), package, offset of the file in the uncompressed package, size
+PMCID, PACKAGE, OFFSET, SIZE = range(4)
+
+
+def pmcid_number(name):
+    """
+    Get the number of a PMCID from a file name or a PMCID
+    :param name: file name (PMC000xxxxxx/PMC176545.xml) or PMCID (PMC176545)
+    :return: 176545 or None
+    """
+    match = PMCID_REGEX.search(name) if name.endswith("xml") else re.match(r"PMC(\d+)$", name)
+    return int(match.group(1)) if match else None
+
+
+def open_package(path):
+    """
+    Open the uncompressed content of a package. Packages are tar files, compressed or not.
+    """
+    return gzip.open(path, "rb") if path.suffix in (".gz", ".tgz") else open(path, "rb")
+
+
+def build_index(folder):
+    """
+    Read each package in folder once (as a stream) and save the position of each article.
+    The index is a (4, number of articles) array sorted by pmcid, so that each row can be
+    memory-mapped and searched with np.searchsorted.
+    :param folder: folder with PMC Open Access bulk packages (*.tar.gz or *.tar)
+    :return: number of articles in the index
+    """
+    folder = pathlib.Path(folder)
+    packages = sorted(
+        item for item in folder.iterdir() if item.name.endswith((".tar.gz", ".tgz", ".tar"))
+    )
+
+    # int arrays take much less memory than lists of tuples
+    columns = [np.zeros(0, dtype=np.uint64) for _ in range(4)]
+    for number, package in enumerate(packages):
+        rows = []
+        with tarfile.open(package, mode="r|*") as tar:
+            for member in tar:
+                pmcid = pmcid_number(member.name) if member.isfile() else None
+                if pmcid:
+                    rows.append((pmcid, number, member.offset_data, member.size))
+
+        rows = np.array(rows, dtype=np.uint64).reshape(-1, 4)
+        columns = [np.concatenate([columns[column], rows[:, column]]) for column in range(4)]
+        logging.info("Indexed {} articles from {}".format(len(rows), package.name))
+
+    index = np.vstack(columns)
+    index = index[:, np.argsort(index[PMCID], kind="stable")]
+    np.save(folder / INDEX_FILE, index)
+    (folder / PACKAGES_FILE).write_text("\n".join(package.name for package in packages) + "\n")
+
+    return index.shape[1]
+
+
+class Corpus(object):
+    """
+    Local copy of the PMC Open Access subset, used instead of the Europe PMC API
+    """
+    def __init__(self, folder):
+        self.folder = pathlib.Path(folder)
+        self.packages = [item for item in (self.folder / PACKAGES_FILE).read_text().split("\n") if item]
+        self.index = np.load(self.folder / INDEX_FILE, mmap_mode="r")
+
+    def __len__(self):
+        return self.index.shape[1]
+
+    def locate(self, pmcids):
+        """
+        Find the position of the articles in the packages
+        :param pmcids: list of PMCIDs
+        :return: list of (package, offset, size, pmcid) of the articles found
+        """
+        numbers = [pmcid_number(pmcid) for pmcid in pmcids]
+        pmcids = [pmcid for pmcid, number in zip(pmcids, numbers) if number]
+        numbers = np.array([number for number in numbers if number], dtype=np.uint64)
+        positions = np.searchsorted(self.index[PMCID], numbers)
+        positions[positions == len(self)] = 0
+
+        return [
+            (int(self.index[PACKAGE, position]), int(self.index[OFFSET, position]),
+             int(self.index[SIZE, position]), pmcid)
+            for pmcid, number, position in zip(pmcids, numbers, positions)
+            if len(self) and self.index[PMCID, position] == number
+        ]
+
+    def articles(self, pmcids):
+        """
+        Read articles from the packages. Articles are read in the order they are stored, so that
+        each package is read once, even if it is compressed.
+        :param pmcids: list of PMCIDs
+        :return: generator of (pmcid, XML of the article)
+        """
+        located = sorted(self.locate(pmcids))
+        for package, articles in itertools.groupby(located, key=lambda item: item[0]):
+            with open_package(self.folder / self.packages[package]) as handle:
+                for _, offset, size, pmcid in articles:
+                    handle.seek(offset)
+                    yield pmcid, handle.read(size).decode("utf-8", errors="replace")
+
+    def __iter__(self):
+        """
+        Read all articles, one package at a time
+        :return: generator of (pmcid, XML of the article)
+        """
+        for package in self.packages:
+            with tarfile.open(self.folder / package, mode="r|*") as tar:
+                for member in tar:
+                    pmcid = pmcid_number(member.name) if member.isfile() else None
+                    if pmcid:
+                        content = tar.extractfile(member).read()
+                        yield "PMC%d" % pmcid, content.decode("utf-8", errors="replace")
+
+
+@functools.lru_cache(maxsize=None)
+def get_corpus():
+    """
+    Corpus defined in the CORPUS setting
+    :return: Corpus or None if CORPUS is not set or the index has not been created
+    """
+    if CORPUS and (pathlib.Path(CORPUS) / INDEX_FILE).exists():
+        return Corpus(CORPUS)
+    return None
+
+
+if __name__ == "__main__":
+    """
+    To index the packages, run: python3 -m consumer.corpus <folder>
+    """
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", help="folder with PMC Open Access bulk packages (*.tar.gz or *.tar)")
+    args = parser.parse_args()
+    logging.info("{} articles indexed".format(build_index(args.folder)))
@@ -0,0 +1,104 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import logging
+import threading
+
+from aiopg.sa import create_engine
+
+from database.consumers import send_heartbeat
+from database.models import CONSUMER_STATUS_CHOICES
+
+
+class Progress(object):
+    """Job (or chunk) this consumer is running and the number of articles processed so far"""
+    def __init__(self):
+        self.job_id = None
+        self.articles = 0
+
+    def start(self, job_id):
+        self.job_id = job_id
+        self.articles = 0
+
+    def step(self):
+        self.articles += 1
+
+    def finish(self):
+        self.job_id = None
+
+    @property
+    def status(self):
+        return CONSUMER_STATUS_CHOICES.busy if self.job_id else CONSUMER_STATUS_CHOICES.available
+
+
+progress = Progress()
+
+
+class HeartbeatThread(threading.Thread):
+    """
+    Send heartbeats from a thread with its own event loop and database connection. The event loop of the
+    consumer runs blocking work (requests, nltk, XML parsing), and a heartbeat delayed by it for longer than
+    HEARTBEAT_TIMEOUT would make the producer requeue a job that is still running.
+    """
+    def __init__(self, settings, interval, send):
+        """
+        :param settings: postgres credentials (POSTGRES_USER, POSTGRES_PASSWORD, ...)
+        :param interval: seconds between two heartbeats
+        :param send: coroutine function that receives the engine and sends one heartbeat
+        """
+        super().__init__(name="heartbeat", daemon=True)
+        self.settings = settings
+        self.interval = interval
+        self.send = send
+        self.stopped = threading.Event()
+
+    def run(self):
+        asyncio.run(self.send_heartbeats())
+
+    def stop(self):
+        self.stopped.set()
+        self.join(timeout=self.interval)
+
+    async def send_heartbeats(self):
+        loop = asyncio.get_running_loop()
+        async with create_engine(
+                user=self.settings.POSTGRES_USER,
+                password=self.settings.POSTGRES_PASSWORD,
+                database=self.settings.POSTGRES_DATABASE,
+                host=self.settings.POSTGRES_HOST,
+                port=self.settings.POSTGRES_PORT,
+                minsize=1,
+                maxsize=1
+        ) as engine:
+            while not self.stopped.is_set():
+                try:
+                    await self.send(engine)
+                except Exception as e:
+                    logging.error(f"Unexpected error in send_heartbeats: {str(e)}", exc_info=True)
+                await loop.run_in_executor(None, self.stopped.wait, self.interval)
+
+
+def start_heartbeats(app):
+    """
+    Periodically tell the producer that this consumer is alive and how far the current job is
+
+    :param app: app object
+    :return: HeartbeatThread
+    """
+    async def send(engine):
+        await send_heartbeat(engine, app["consumer_ip"], progress.status, progress.articles)
+
+    thread = HeartbeatThread(app["settings"], app["settings"].HEARTBEAT_INTERVAL, send)
+    thread.start()
+    return thread
@@ -0,0 +1,120 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import uuid
+
+from consumer import settings as consumer_settings
+from consumer.corpus import Corpus
+from consumer.heartbeat import HeartbeatThread, Progress
+from consumer.views.submit_job import job_regex, parse_article, save_hits
+from database.consumers import register_corpus_scan, send_corpus_scan_heartbeat, unregister_consumers
+from database.job import save_hit_count, save_job, search_performed, set_job_status
+from database.models import close_pg, init_pg, JOB_STATUS_CHOICES
+from database.results import count_results
+from database.settings import get_postgres_credentials
+from database.stats import refresh_job_stats
+
+
+async def scan_corpus(engine, corpus, job_ids, progress=None):
+    """
+    Search all articles of the corpus for a list of ids. Results are saved the same way
+    as in seek_references, but articles are read from disk, so there is no rate limit.
+    The jobs must be registered with register_corpus_scan, otherwise the producer requeues them.
+    :param engine: params to connect to the db
+    :param corpus: Corpus object
+    :param job_ids: list of ids
+    :param progress: Progress object, updated for each article scanned
+    :return: number of articles saved for each job
+    """
+    regexes = {}
+    for job_id in job_ids:
+        if not await search_performed(engine, job_id):
+            await save_job(engine, job_id, query=None, search_limit=None)
+        await set_job_status(engine, job_id.lower(), status=JOB_STATUS_CHOICES.started)
+        regexes[job_id] = job_regex(job_id)
+
+    hit_count = {job_id: 0 for job_id in job_ids}
+    for number, (pmcid, get_article) in enumerate(corpus, start=1):
+        if progress:
+            progress.step()
+        text = get_article.lower()
+        for job_id, regex in regexes.items():
+            # a cheap test before parsing the article
+            if job_id.lower() not in text:
+                continue
+
+            parsed = parse_article(job_id, pmcid, get_article, regex)
+            if parsed:
+                # the number of citations is only available in the API
+                await save_hits(engine, {"pmcid": pmcid, "cited_by": 0}, parsed)
+                hit_count[job_id] += 1
+
+        if number % 10000 == 0:
+            logging.info("{} articles scanned".format(number))
+
+    for job_id in job_ids:
+        await save_hit_count(engine, job_id.lower(), await count_results(engine, job_id.lower()))
+        await refresh_job_stats(engine, job_id.lower())
+        await set_job_status(engine, job_id.lower(), status=JOB_STATUS_CHOICES.success)
+
+    return hit_count
+
+
+async def main():
+    """
+    Scan the local corpus (see consumer.corpus) for the ids given as arguments or in a file (one id per line).
+    Run it with: python3 -m consumer.scan_corpus <folder> --job-id RF00001 --ids-file ids.txt
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", help="folder with PMC Open Access bulk packages and their index")
+    parser.add_argument("--job-id", dest="job_ids", action="append", default=[], help="id to search for")
+    parser.add_argument("--ids-file", help="file with one id per line")
+    args = parser.parse_args()
+
+    job_ids = args.job_ids
+    if args.ids_file:
+        with open(args.ids_file) as ids_file:
+            job_ids.extend(line.strip() for line in ids_file if line.strip())
+
+    app = {"settings": get_postgres_credentials(os.getenv("ENVIRONMENT", "LOCAL"))}
+    await init_pg(app)
+    try:
+        # the scan is registered as a consumer of each job and sends heartbeats from a thread,
+        # because reading and parsing the packages blocks the event loop
+        progress = Progress()
+        consumers = await register_corpus_scan(app["engine"], "scan-%s" % uuid.uuid4().hex[:8], job_ids)
+
+        async def send(engine):
+            await send_corpus_scan_heartbeat(engine, consumers, progress.articles)
+
+        heartbeat = HeartbeatThread(app["settings"], consumer_settings.HEARTBEAT_INTERVAL, send)
+        heartbeat.start()
+        try:
+            hit_count = await scan_corpus(app["engine"], Corpus(args.folder), job_ids, progress)
+        finally:
+            heartbeat.stop()
+            await unregister_consumers(app["engine"], consumers)
+
+        for job_id, count in hit_count.items():
+            logging.info("{}: {} articles".format(job_id, count))
+    finally:
+        await close_pg(app)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
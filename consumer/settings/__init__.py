@@ -43,6 +43,39 @@ PORT = 8081
 # Europe PMC API
 EUROPE_PMC = "https://www.ebi.ac.uk/europepmc/webservices/rest/"
 
+# jobs with more articles than this are split into chunks that can be processed by any consumer (0 disables it)
+SPLIT_JOBS_ABOVE = 2000
+
+# number of articles in each chunk
+CHUNK_SIZE = 500
+
+# the progress of a job is saved every CHECKPOINT_INTERVAL articles
+CHECKPOINT_INTERVAL = 20
+
+# folder with PMC Open Access bulk packages indexed with `python3 -m consumer.corpus <folder>`.
+# Articles found there are read from disk instead of the Europe PMC API
+CORPUS = ''
+
+# folder with the inverted index of the articles processed by the consumers (can be shared by all consumers).
+# Articles in the index that do not contain the job_id are not downloaded again
+TEXT_INDEX = ''
+
+# database driver used by the database functions: aiopg or asyncpg (prepared statements cached per connection)
+DATABASE_DRIVER = 'aiopg'
+
+# number of connections kept open (POOL_MINSIZE) and maximum number of connections of the pool
+POOL_MINSIZE = 1
+POOL_MAXSIZE = 10
+
+# statements running for longer than this number of milliseconds are cancelled (0 disables it)
+STATEMENT_TIMEOUT = 60000
+
+# seconds to wait for a free connection of the pool before giving up
+ACQUIRE_TIMEOUT = 30.0
+
+# seconds between two heartbeats (see HEARTBEAT_TIMEOUT in the producer settings)
+HEARTBEAT_INTERVAL = 10
+
 
 def substitute_environment_variables():
     """
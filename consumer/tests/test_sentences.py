@@ -0,0 +1,114 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import random
+import unittest
+
+import nltk
+
+from consumer.views.submit_job import find_sentences, job_regex, sentence_with_context
+
+SECTIONS = [
+    # a single paragraph
+    [
+        "The 5S rRNA (RF00001) is a component of the large ribosomal subunit. It is found in all organisms. "
+        "Its structure was described by Smith et al. in 1999 (see Fig. 2). RF00001 has many members."
+    ],
+    # the sentence with the id continues in the next paragraphs (titles and list items without a full stop)
+    [
+        "Methods",
+        "We selected the families of Rfam, e.g. tRNA, SRP RNA and",
+        "RF00001",
+        "as well as the",
+        "5S ribosomal RNA of bacteria. The alignments were built as in Dr. Jones' paper. They were checked by hand.",
+        "Results",
+        "All families were found.",
+    ],
+    # the id is split across short paragraphs
+    [
+        "Many families are known. The most studied one is the 5S",
+        "rRNA",
+        "of plants and animals, which is described below. A second family is also studied. It is smaller.",
+    ],
+    [
+        "Several rRNAs are described in this study. The first one is the 5S",
+        "ribosomal",
+        "RNA of plants, which is the main topic of the paper. A second family is also studied. It is smaller.",
+        "Nothing else is mentioned here. Or here. Or here.",
+    ],
+    # matches near the first and the last sentence of the section, and matches that share a character
+    [
+        "RF00001 is the first word of this section. Another sentence follows here. And a third one.",
+        "Nothing to see here. Or here. Or even here. Still nothing in this paragraph.",
+        "The last sentence mentions RF00001 RF00001 twice",
+    ],
+    # abbreviations, quotes and brackets around the sentence breaks
+    [
+        "The gene (RF00001.) was knocked down in mice (n = 5). \"The 5S rRNA level dropped.\" It was restored.",
+        "See Table 1. The U.S. group confirmed it (i.e. RF00001 was not expressed)! Why? Nobody knows.",
+        "In Fig. 3 the 5S rRNA... is shown. 5S rRNA; and others.",
+    ],
+]
+
+WORDS = [
+    "the", "gene", "RNA", "rRNA", "5S", "RF00001", "RF00001.", "(RF00001)", "“5S", "rRNA”", "Fig.", "e.g.", "al.",
+    "et", "Dr.", "U.S.", "(see", "Table", "1).", "was", "found.", "It", "is?", "No!", "\"quoted.\"", "level", "A.",
+    "...", "end.)", "RF00001;",
+]
+
+
+def tokenize_section(paragraphs, pattern):
+    """
+    Split the whole section, as the consumer did before find_sentences
+    """
+    tokenized_text = nltk.sent_tokenize(" ".join(paragraphs))
+    return [
+        sentence_with_context(tokenized_text, index) for index, sentence in enumerate(tokenized_text)
+        if pattern.search(sentence) and len(sentence.split()) > 3
+    ]
+
+
+def random_sections(seed, count):
+    """
+    Sections made of random words, with paragraphs of very different lengths (including empty paragraphs)
+    """
+    generator = random.Random(seed)
+    for _ in range(count):
+        yield [
+            " ".join(generator.choice(WORDS) for _ in range(generator.choice([0, 1, 2, 3, 5, 10, 30, 60])))
+            for _ in range(generator.randint(1, 12))
+        ]
+
+
+class FindSentencesTestCase(unittest.TestCase):
+    """
+    Run these tests with:
+    python3 -m unittest consumer.tests.test_sentences
+    """
+    def assert_same_sentences(self, paragraphs):
+        for job_id in ["RF00001", "5S rRNA", "5S ribosomal RNA", "RNA"]:
+            pattern = job_regex(job_id)
+            self.assertEqual(
+                find_sentences(paragraphs, pattern), tokenize_section(paragraphs, pattern), (job_id, paragraphs)
+            )
+
+    def test_sections(self):
+        for paragraphs in SECTIONS:
+            self.assert_same_sentences(paragraphs)
+
+    def test_random_sections(self):
+        for paragraphs in random_sections(seed=1, count=500):
+            self.assert_same_sentences(paragraphs)
+
+    def test_no_match(self):
+        assert find_sentences(["There is no id in this paragraph.", "Nor in this one."], job_regex("RF00001")) == []
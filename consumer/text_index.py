@@ -0,0 +1,267 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import functools
+import hashlib
+import logging
+import os
+import pathlib
+import re
+import socket
+import threading
+import time
+
+import numpy as np
+
+from consumer.corpus import pmcid_number
+from consumer.settings import TEXT_INDEX
+
+# characters that can surround a job_id (see job_regex). If the job_id matches an article, each of
+# its tokens is a token of the article, so the index never misses an article
+TOKEN_SPLIT = re.compile(r"[\s()“”'\";.,:?/]+")
+
+# articles kept in memory before a new segment is written
+SEGMENT_SIZE = 200
+
+# segments written by a consumer are merged by tiers: MERGE_FACTOR segments of similar size
+# (number of articles between SEGMENT_SIZE * MERGE_FACTOR ** tier and SEGMENT_SIZE * MERGE_FACTOR ** (tier + 1))
+# are merged into one segment of the next tier, so every article is only rewritten once per tier
+MERGE_FACTOR = 10
+
+
+def tokens(text):
+    """
+    Split the text of an article (or a job_id) into lowercase tokens
+    :param text: string
+    :return: set of tokens
+    """
+    return set(item for item in TOKEN_SPLIT.split(text.lower()) if item)
+
+
+def token_hash(token):
+    """
+    Tokens are stored as 64-bit hashes. A collision only adds an article to the candidates of a job
+    """
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class Segment(object):
+    """
+    Immutable part of the index, memory-mapped from four files:
+    - docs: sorted pmcids of the articles in the segment
+    - terms: sorted token hashes
+    - offsets: position of the postings of each term (len(terms) + 1 values)
+    - postings: pmcids of the articles that contain each term
+    """
+    FILES = ["terms", "offsets", "postings", "docs"]
+
+    def __init__(self, folder, name):
+        self.name = name
+        self.folder = folder
+        for item in self.FILES:
+            setattr(self, item, np.load(folder / f"{name}.{item}.npy", mmap_mode="r"))
+
+    def postings_of(self, term):
+        position = np.searchsorted(self.terms, term)
+        if position < len(self.terms) and self.terms[position] == term:
+            return self.postings[self.offsets[position]:self.offsets[position + 1]]
+        return self.postings[0:0]
+
+    def contains(self, numbers):
+        positions = np.searchsorted(self.docs, numbers)
+        positions[positions == len(self.docs)] = 0
+        return self.docs[positions] == numbers if len(self.docs) else np.zeros(len(numbers), dtype=bool)
+
+    @classmethod
+    def write(cls, folder, name, postings, docs):
+        """
+        Save a segment. The docs file is written last, so readers never see an incomplete segment.
+        :param postings: dict of token hash -> iterable of pmcid numbers
+        :param docs: iterable of pmcid numbers
+        """
+        terms = np.array(sorted(postings), dtype=np.uint64)
+        lists = [np.unique(np.array(list(postings[int(term)]), dtype=np.uint64)) for term in terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+        np.cumsum([len(item) for item in lists], out=offsets[1:])
+        arrays = {
+            "terms": terms,
+            "offsets": offsets,
+            "postings": np.concatenate(lists) if lists else np.zeros(0, dtype=np.uint64),
+            "docs": np.unique(np.array(list(docs), dtype=np.uint64)),
+        }
+        for item in cls.FILES:
+            with open(folder / f"{name}.{item}.tmp", "wb") as handle:
+                np.save(handle, arrays[item])
+            os.replace(folder / f"{name}.{item}.tmp", folder / f"{name}.{item}.npy")
+
+    def remove(self):
+        for item in reversed(self.FILES):
+            (self.folder / f"{self.name}.{item}.npy").unlink()
+
+
+class TextIndex(object):
+    """
+    Inverted index (token -> pmcids) of the articles processed by the consumers.
+
+    New articles are kept in memory and written as a new segment every SEGMENT_SIZE articles.
+    Several consumers can share the folder, as each one only writes (and merges) segments
+    whose names start with its own prefix. Segments that are merged while another consumer
+    reads them stay readable, because they are memory-mapped.
+    """
+    def __init__(self, folder, prefix):
+        self.folder = pathlib.Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix
+        self.segments = {}
+        self.postings = {}
+        self.docs = set()
+        self.merge_lock = threading.Lock()
+
+    def list_segments(self):
+        return set(item.name[:-len(".docs.npy")] for item in self.folder.glob("*.docs.npy"))
+
+    def refresh(self):
+        """
+        Load segments written since the last call (also by other consumers) and forget removed ones.
+        A segment can be removed between listing and loading it when it is merged: the merged segment
+        is written before the old ones are removed, so the folder is listed again.
+        """
+        while True:
+            names = self.list_segments()
+            for name in set(self.segments) - names:
+                del self.segments[name]
+            try:
+                for name in sorted(names - set(self.segments)):
+                    self.segments[name] = Segment(self.folder, name)
+            except FileNotFoundError:
+                logging.debug("A segment of the text index was merged while loading it, listing segments again")
+                continue
+            return list(self.segments.values())
+
+    def add(self, pmcid, text):
+        """
+        Add an article to the index
+        :param pmcid: id of the article
+        :param text: text of the article, without tags
+        """
+        number = pmcid_number(pmcid)
+        if not number or not text:
+            return
+
+        for token in tokens(text):
+            self.postings.setdefault(token_hash(token), set()).add(number)
+        self.docs.add(number)
+
+        if len(self.docs) >= SEGMENT_SIZE:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the articles kept in memory as a new segment
+        """
+        if self.docs:
+            Segment.write(self.folder, f"{self.prefix}-{time.time_ns()}", self.postings, self.docs)
+            self.postings = {}
+            self.docs = set()
+
+    def tier(self, segment):
+        size, tier = len(segment.docs), 0
+        while size >= SEGMENT_SIZE * MERGE_FACTOR ** (tier + 1):
+            tier += 1
+        return tier
+
+    def merge(self):
+        """
+        Merge the segments written by this consumer, MERGE_FACTOR segments of the same tier at a time.
+        It does not use the segments loaded by refresh, so it can run in an executor.
+        """
+        with self.merge_lock:
+            while True:
+                tiers = {}
+                for name in sorted(self.list_segments()):
+                    if name.startswith(self.prefix + "-"):
+                        try:
+                            segment = Segment(self.folder, name)
+                        except FileNotFoundError:
+                            continue
+                        tiers.setdefault(self.tier(segment), []).append(segment)
+
+                full = [segments for tier, segments in sorted(tiers.items()) if len(segments) >= MERGE_FACTOR]
+                if not full:
+                    return
+                self.merge_segments(full[0][:MERGE_FACTOR])
+
+    def merge_segments(self, segments):
+        """
+        Replace segments with a single segment containing all of their articles
+        """
+        postings = {}
+        for segment in segments:
+            for position, term in enumerate(segment.terms):
+                start, end = segment.offsets[position], segment.offsets[position + 1]
+                postings.setdefault(int(term), []).append(segment.postings[start:end])
+        postings = {term: np.concatenate(items) for term, items in postings.items()}
+        docs = np.concatenate([segment.docs for segment in segments])
+
+        Segment.write(self.folder, f"{self.prefix}-{time.time_ns()}", postings, docs)
+        for segment in segments:
+            segment.remove()
+        logging.debug("Merged {} segments of the text index".format(len(segments)))
+
+    def seen(self, pmcids):
+        """
+        Articles that are in the index
+        :param pmcids: list of PMCIDs
+        :return: set of PMCIDs
+        """
+        numbers = np.array([pmcid_number(pmcid) or 0 for pmcid in pmcids], dtype=np.uint64)
+        found = np.array([int(number) in self.docs for number in numbers], dtype=bool)
+        for segment in self.refresh():
+            found |= segment.contains(numbers)
+        return set(pmcid for pmcid, value in zip(pmcids, found) if value)
+
+    def lookup(self, job_id):
+        """
+        Articles that contain all tokens of the job_id. These are the only articles in the index
+        that can mention the job_id (the regex still has to be checked).
+        :param job_id: id of the job
+        :return: set of PMCIDs or None if the job_id has no tokens
+        """
+        terms = [token_hash(token) for token in tokens(job_id)]
+        if not terms:
+            return None
+
+        result = set()
+        for segment in self.refresh():
+            numbers = None
+            for term in terms:
+                postings = segment.postings_of(term)
+                numbers = postings if numbers is None else np.intersect1d(numbers, postings, assume_unique=True)
+            result.update(int(number) for number in numbers)
+
+        numbers = None
+        for term in terms:
+            postings = self.postings.get(term, set())
+            numbers = set(postings) if numbers is None else numbers & postings
+        result.update(numbers)
+
+        return set("PMC%d" % number for number in result)
+
+
+@functools.lru_cache(maxsize=None)
+def get_text_index():
+    """
+    Index defined in the TEXT_INDEX setting. Segments written by this consumer are named after its host.
+    :return: TextIndex or None if TEXT_INDEX is not set
+    """
+    return TextIndex(TEXT_INDEX, socket.gethostname()) if TEXT_INDEX else None
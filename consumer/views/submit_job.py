@@ -11,8 +11,9 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 import asyncio
+import bisect
 import datetime
-import joblib
+import functools
 import logging
 import nltk
 import re
@@ -21,12 +22,22 @@ import requests
 from aiohttp import web
 from aiojobs.aiohttp import spawn
 
-from consumer.settings import EUROPE_PMC
-from database.consumers import get_ip, set_consumer_status_and_job_id
-from database.job import get_hit_count, get_search_date, save_hit_count, set_job_status, get_query_and_limit
+from consumer.corpus import get_corpus
+from consumer.heartbeat import progress
+from consumer.text_index import get_text_index
+from database.article_text import get_article_text, get_pmcid_with_text, save_article_text
+from consumer.settings import CHECKPOINT_INTERVAL, CHUNK_SIZE, EUROPE_PMC, SPLIT_JOBS_ABOVE
+from database.consumers import set_consumer_status_and_job_id
+from database.job import get_checkpoint, get_search_date, save_checkpoint, save_hit_count, set_job_status, \
+    get_query_and_limit
+from database.job_chunk import finish_job_chunk, get_chunk_checkpoint, get_job_chunk, save_chunk_checkpoint, \
+    save_job_chunks, set_chunk_status
 from database.models import CONSUMER_STATUS_CHOICES, JOB_STATUS_CHOICES
-from database.results import get_pmcid, get_pmcid_in_result, save_article, save_result, save_abstract_sentences, \
-    save_body_sentences
+from database.pool import unit_of_work
+from database.results import count_results, get_pmcid, get_pmcid_in_result, save_article, save_result, \
+    save_abstract_sentences, save_body_sentences
+from database.stats import refresh_job_stats
+from training.classifier import load_classifier
 from training.export_data import clean_text
 from xml.etree import ElementTree as ET
 from xml.etree.ElementTree import ParseError
@@ -49,16 +60,24 @@ async def submit_job(request):
     try:
         data = await request.json()
         job_id = data['job_id']
+        chunk = data.get('chunk')
         engine = request.app['engine']
-        consumer_ip = get_ip(request.app)
-        logging.debug("Submit job: consumer = {}, job_id = {}".format(consumer_ip, job_id))
-    except (KeyError, TypeError, ValueError) as e:
+        consumer_ip = request.app['consumer_ip']
+        logging.debug("Submit job: consumer = {}, job_id = {}, chunk = {}".format(consumer_ip, job_id, chunk))
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
         logging.debug("Error getting data. Error message: {}".format(e))
         raise web.HTTPBadRequest(text=str(e)) from e
 
     # update consumer
+    progress.start(job_id.lower())
     await set_consumer_status_and_job_id(engine, consumer_ip, CONSUMER_STATUS_CHOICES.busy, job_id.lower())
 
+    if chunk is not None:
+        # this is part of a job that has already been started by another consumer
+        await set_chunk_status(engine, job_id.lower(), chunk, JOB_STATUS_CHOICES.started, consumer_ip)
+        await spawn(request, seek_chunk(engine, job_id, chunk, consumer_ip))
+        return web.HTTPCreated()
+
     # set job status
     await set_job_status(engine, job_id.lower(), status=JOB_STATUS_CHOICES.started)
 
@@ -78,7 +97,7 @@ async def articles_list(job_id, query_filter, date, page="*"):
     :param query_filter: query used to filter results
     :param date: search by date
     :param page: results page (* means the first page of results)
-    :return: list of "PMCIDs" and the next page, if any
+    :return: list of "PMCIDs", the next page, if any, and the total number of articles
     """
     search_date = f' AND (FIRST_PDATE:[{date} TO {datetime.date.today().strftime("%Y-%m-%d")}])' if date else ''
     query_filter = f' AND {query_filter}' if query_filter else ''
@@ -114,16 +133,23 @@ async def articles_list(job_id, query_filter, date, page="*"):
             next_page = root.find('nextCursorMark').text
         except AttributeError:
             next_page = None
+
+        # get number of articles
+        try:
+            hit_count = int(root.find('hitCount').text)
+        except (AttributeError, TypeError, ValueError):
+            hit_count = 0
     else:
         pmcid_list = []
         next_page = None
+        hit_count = 0
 
-    return pmcid_list, next_page
+    return pmcid_list, next_page, hit_count
 
 
-def get_text(sec):
+def get_paragraphs(sec):
     """
-    Takes a given section's node in the XML tree and iterates over all paragraphs, joining the text together.
+    Takes a given section's node in the XML tree and iterates over all paragraphs, returning the text of each one.
 
     This implicitly removes any tags present, so if we need them we might have to do something more fancy
     """
@@ -153,9 +179,93 @@ def get_text(sec):
     ]
 
     # remove multiple spaces and items with a single string
-    sec_sentences = [" ".join(item.split()) for item in sec_sentences if len(item.split()) > 1]
+    return [" ".join(item.split()) for item in sec_sentences if len(item.split()) > 1]
 
-    return " ".join(sec_sentences) if sec_sentences else ""
+
+def get_text(sec):
+    """
+    Takes a given section's node in the XML tree and joins the text of all paragraphs together.
+    """
+    return " ".join(get_paragraphs(sec))
+
+
+def sentence_with_context(tokenized_text, index):
+    """
+    Join a sentence with the previous and the next sentence, if any
+    :param tokenized_text: list of sentences
+    :param index: position of the sentence in tokenized_text
+    :return: string
+    """
+    prev_sentence = tokenized_text[index - 1] if index > 0 else None
+    next_sentence = tokenized_text[index + 1] if index < len(tokenized_text) - 1 else None
+    return " ".join(item for item in [prev_sentence, tokenized_text[index], next_sentence] if item)
+
+
+def find_sentences(paragraphs, pattern):
+    """
+    Find the sentences of a section that contain the job_id, together with the previous and next sentence.
+
+    Only the paragraphs around a match are split into sentences. The result is the same as splitting the
+    whole section, i.e. nltk.sent_tokenize(get_text(sec)), because punkt decides each sentence break from
+    the token before and the token after it. A window of paragraphs starts and ends at a token, so all
+    of its sentences except the first and the last one are sentences of the whole section. The first and
+    last ones may continue in the neighbouring paragraphs, so the window grows until the sentences taken
+    from it (and their previous and next sentences) are away from its edges.
+    :param paragraphs: list of paragraphs returned by get_paragraphs
+    :param pattern: compiled regex returned by job_regex
+    :return: list of sentences
+    """
+    text = " ".join(paragraphs)
+    last = len(paragraphs) - 1
+
+    # offset of each paragraph in text
+    starts = []
+    offset = 0
+    for paragraph in paragraphs:
+        starts.append(offset)
+        offset += len(paragraph) + 1
+
+    # windows of paragraphs around the matches. Matches can overlap (the character after a job_id can be
+    # the one before the next one), so the search restarts after the start of each match instead of its end
+    windows = []
+    match = pattern.search(text)
+    while match:
+        lo = max(bisect.bisect_right(starts, match.start()) - 2, 0)
+        hi = min(bisect.bisect_right(starts, match.end()), last)
+        if windows and lo <= windows[-1][1] + 1:
+            windows[-1][1] = max(windows[-1][1], hi)
+        else:
+            windows.append([lo, hi])
+        match = pattern.search(text, match.start() + 1)
+
+    sentences = []
+    index = 0
+    while index < len(windows):
+        lo, hi = windows[index]
+        tokenized_text = nltk.sent_tokenize(" ".join(paragraphs[lo:hi + 1]))
+        found = [position for position, sentence in enumerate(tokenized_text) if pattern.search(sentence)]
+
+        grow_lo = found and lo > 0 and found[0] < 3
+        grow_hi = found and hi < last and found[-1] > len(tokenized_text) - 4
+        if grow_lo or grow_hi:
+            lo, hi = lo - 1 if grow_lo else lo, hi + 1 if grow_hi else hi
+            if index > 0 and lo <= windows[index - 1][1]:
+                # merge with the previous window and process it again
+                lo = windows.pop(index - 1)[0]
+                sentences.pop()
+                index -= 1
+            if index + 1 < len(windows) and hi >= windows[index + 1][0]:
+                hi = windows.pop(index + 1)[1]
+            windows[index] = [lo, hi]
+            continue
+
+        sentences.append([
+            sentence_with_context(tokenized_text, position) for position in found
+            if len(tokenized_text[position].split()) > 3
+        ])
+        index += 1
+
+    return [sentence for window in sentences for sentence in window]
 
 
 def get_sections(tree, include_abstract=False):
@@ -201,11 +311,485 @@ def get_sections(tree, include_abstract=False):
     return section_map
 
 
+def job_regex(job_id):
+    """
+    Regular expression used to find the job_id in the text of an article
+    :param job_id: id of the job
+    :return: compiled, case-insensitive regex
+    """
+    return re.compile(r"(^|\s|\(|\“|\'|\"|\;)" + re.escape(job_id.lower()) + "($|[\s.,:;?'”\"/)])", re.IGNORECASE)
+
+
+def match_span(regex, sentence):
+    """
+    Position of the job_id in a sentence
+    :param regex: compiled regex returned by job_regex
+    :param sentence: sentence saved in the database
+    :return: start and end of the first match, or None, None
+    """
+    match = regex.search(sentence)
+    return (match.end(1), match.start(2)) if match else (None, None)
+
+
+def article_tree(get_article, pmcid):
+    """
+    Parse the XML of an article, ignoring tables, figures and supplementary material
+    :param get_article: XML returned by Europe PMC
+    :param pmcid: id of the article
+    :return: root of the XML tree or None
+    """
+    full_txt = re.sub(
+        r"(?is)<(counts|table-wrap|table|fig-group|fig|supplementary-material).*?>.*?(</\1>)", "", get_article
+    )
+
+    try:
+        return ET.fromstring(full_txt)
+    except ParseError as e:
+        logging.debug("There was an error parsing the article {}. Error message: {} ".format(pmcid, e))
+        return None
+
+
+def article_text(get_article):
+    """
+    Get the text (abstract, body and floats group) of an article, without tags
+    :param get_article: XML of the article
+    :return: string or None if the article has no body
+    """
+    abstract_txt = re.search('<abstract(.*?)</abstract>', get_article, re.DOTALL)
+    body_txt = re.search('<body(.*?)</body>', get_article, re.DOTALL)
+    floats_group_txt = re.search('<floats-group(.*?)</floats-group>', get_article, re.DOTALL)
+
+    if abstract_txt and body_txt and floats_group_txt:
+        full_txt = abstract_txt[0] + body_txt[0] + floats_group_txt[0]
+    elif abstract_txt and body_txt:
+        full_txt = abstract_txt[0] + body_txt[0]
+    elif body_txt:
+        full_txt = body_txt[0]
+    else:
+        return None
+
+    # remove tags
+    return re.sub('<[^>]*>', ' ', full_txt)
+
+
+def article_content(pmcid, get_article, full_txt_no_tags=None):
+    """
+    Get everything needed to find the sentences of an article, for any job_id.
+    This content is saved in the database, so that other jobs do not need to download and parse the article again
+    :param pmcid: id of the article
+    :param get_article: XML of the article (Europe PMC fullTextXML or PMC Open Access package)
+    :param full_txt_no_tags: text returned by article_text, if it is already available
+    :return: dict with the text, title, abstract, paragraphs of each section and metadata or None
+    """
+    # get text
+    full_txt_no_tags = full_txt_no_tags if full_txt_no_tags else article_text(get_article)
+    if not full_txt_no_tags:
+        logging.debug("Text not found for pmcid {}.".format(pmcid))
+        return None
+
+    # parse using ElementTree
+    article = article_tree(get_article, pmcid)
+    if not article:
+        return None
+
+    content = {"text": " ".join(full_txt_no_tags.split()), "translated": False}
+
+    # if the trans-title-group element is found it is because this article was not written in English
+    trans_title = article.find("./front/article-meta/title-group/trans-title-group")
+    if trans_title:
+        content["translated"] = True
+        return content
+
+    # get title
+    get_title = article.find("./front/article-meta/title-group/article-title")
+    try:
+        content["title"] = ''.join(get_title.itertext()).strip()
+    except AttributeError:
+        content["title"] = None
+
+    # get abstract
+    get_abstract_tags = article.findall(".//abstract")
+    abstract_types = ['teaser', 'web-summary', 'summary', 'precis', 'graphical', 'author-highlights']
+    get_abstract_tags = [
+        item for item in get_abstract_tags if
+        not any(elem in item.attrib.values() for elem in abstract_types)
+    ]
+    abstract_text = [" ".join(item.itertext()) for item in get_abstract_tags]
+    content["abstract"] = " ".join(abstract_text).replace(" .", ".").replace("  ", " ")
+
+    # get paragraphs of each section
+    content["sections"] = [
+        [section_name, get_paragraphs(section)] for section_name, section in get_sections(article).items()
+    ]
+
+    content["metadata"] = article_metadata(article, pmcid)
+
+    return content
+
+
+def find_hits(job_id, pmcid, content, regex):
+    """
+    Find the sentences of an article that contain the job_id
+    :param job_id: id of the job
+    :param pmcid: id of the article
+    :param content: dict returned by article_content
+    :param regex: compiled regex used to find the job_id (see job_regex)
+    :return: dict with the content, the result and the sentences found or None
+    """
+    # skip current article if job_id is not found
+    if not regex.search(content["text"]):
+        logging.debug("Job_id {} not found for pmcid {}.".format(job_id, pmcid))
+        return None
+
+    # articles that were not written in English are skipped
+    if content["translated"]:
+        return None
+
+    title = content["title"]
+    if title is None:
+        logging.debug("Title not found for pmcid {} and job_id {}".format(pmcid, job_id))
+        return None
+
+    result_response = {}
+
+    # check if the title has the job_id
+    result_response["id_in_title"] = True if job_id.lower() in title.lower() else False
+
+    # check if the abstract has the job_id
+    abstract = content["abstract"]
+    abstract_sentences = []
+    if regex.search(abstract):
+        abstract_sentences = [item for item in nltk.sent_tokenize(abstract) if regex.search(item)]
+    result_response["id_in_abstract"] = True if abstract_sentences else False
+
+    # check if the body has the job_id
+    body_sentences = {}
+    for section_name, paragraphs in content["sections"]:
+        body_sentences[section_name] = find_sentences(paragraphs, regex)
+
+    if abstract_sentences and not any(body_sentences.values()):
+        result_response["id_in_body"] = False
+    elif not abstract_sentences and not any(body_sentences.values()):
+        result_response["id_in_body"] = True
+        body_sentences['other'] = ["%s found in an image, table or supplementary material" % job_id]
+    else:
+        result_response["id_in_body"] = True
+
+    # add job_id and pmcid
+    result_response["job_id"] = job_id.lower()
+    result_response["pmcid"] = pmcid
+
+    return {
+        "content": content,
+        "result": result_response,
+        "abstract_sentences": abstract_sentences,
+        "body_sentences": body_sentences,
+    }
+
+
+def parse_article(job_id, pmcid, get_article, regex, full_txt_no_tags=None):
+    """
+    Find the sentences of an article that contain the job_id. The XML is only parsed if the job_id is in the text
+    :param job_id: id of the job
+    :param pmcid: id of the article
+    :param get_article: XML of the article (Europe PMC fullTextXML or PMC Open Access package)
+    :param regex: compiled regex used to find the job_id (see job_regex)
+    :param full_txt_no_tags: text returned by article_text, if it is already available
+    :return: dict returned by find_hits or None
+    """
+    full_txt_no_tags = full_txt_no_tags if full_txt_no_tags else article_text(get_article)
+    if not full_txt_no_tags or not regex.search(full_txt_no_tags):
+        logging.debug("Job_id {} not found for pmcid {}.".format(job_id, pmcid))
+        return None
+
+    content = article_content(pmcid, get_article, full_txt_no_tags)
+    return find_hits(job_id, pmcid, content, regex) if content else None
+
+
+def article_metadata(article, pmcid):
+    """
+    Get the type, authors, ids, year and journal of an article
+    :param article: root of the XML tree
+    :param pmcid: id of the article
+    :return: dict
+    """
+    article_response = {}
+
+    # get article type
+    if "article-type" in article.attrib:
+        article_type = article.attrib["article-type"].strip()
+        article_response["type"] = article_type.replace("-", " ").capitalize()
+    else:
+        article_response["type"] = ""
+
+    # get authors of the article
+    get_contrib_group = article.find("./front/article-meta/contrib-group")
+    article_response['author'] = ''
+
+    try:
+        get_authors = get_contrib_group.findall(".//name")
+        authors = []
+        for author in get_authors:
+            surname = author.find('surname').text if author.find('surname').text else ''
+            given_names = author.find('given-names').text if author.find('given-names').text else ''
+            if surname and given_names:
+                authors.append(surname + ", " + given_names)
+            elif surname or given_names:
+                authors.append(surname + given_names)
+        article_response["author"] = '; '.join(authors)
+    except AttributeError:
+        pass
+
+    # get pmid and doi
+    article_meta = article.findall("./front/article-meta/article-id")
+    article_response['doi'] = ''
+    article_response['pmid'] = ''
+
+    for item in article_meta:
+        if item.attrib == {'pub-id-type': 'doi'}:
+            article_response["doi"] = item.text
+        elif item.attrib == {'pub-id-type': 'pmid'}:
+            article_response["pmid"] = item.text
+
+    # get year
+    article_response["year"] = 0
+    get_year = article.findall("./front/article-meta/pub-date")
+    pub_type = ['epub', 'ppub', 'pub']
+    for item in get_year:
+        if set(pub_type).intersection(item.attrib.values()):
+            year = int(item.find('year').text) if item.find('year').text else 0
+            article_response["year"] = year
+
+    # get journal
+    article_response["journal"] = ''
+    get_journal = article.find("./front/journal-meta/journal-title-group/journal-title")
+    try:
+        article_response["journal"] = get_journal.text
+    except AttributeError:
+        # maybe it is in a different element
+        journal = article.find("./front/journal-meta/journal-title")
+        try:
+            article_response["journal"] = journal.text
+        except AttributeError:
+            logging.debug("Journal not found for pmcid {}".format(pmcid))
+
+    return article_response
+
+
+async def save_hits(engine, element, parsed):
+    """
+    Save an article (if it is not in the database yet), the result and the sentences found by find_hits.
+    They are saved in a single transaction: a job that is resumed skips the articles that have a result
+    (see get_pmcid_in_result), so a result must never be saved without its sentences.
+    :param engine: params to connect to the db
+    :param element: dict containing pmcid and cited_by
+    :param parsed: dict returned by find_hits
+    :return: None
+    """
+    abstract_sentences = parsed["abstract_sentences"]
+    body_sentences = parsed["body_sentences"]
+    content = parsed["content"]
+
+    # check if this article is already in the database
+    article_in_db = await get_pmcid(engine, element["pmcid"])
+
+    article_response = None
+    if not article_in_db:
+        article_response = dict(content["metadata"])
+        article_response["title"] = content["title"]
+        article_response["abstract"] = content["abstract"]
+
+        # text classification - is it RNA-related?
+        cleaned_abstract = await clean_text(content["abstract"])
+        rna_pipeline, version = load_classifier()
+        relevance_label = rna_pipeline.predict([cleaned_abstract])[0]
+        article_response["rna_related"] = bool(int(relevance_label))
+        probability = rna_pipeline.predict_proba([cleaned_abstract])[0][1]
+        article_response["probability"] = round(float(probability), 2)
+        article_response["model_version"] = version
+
+        # add pmcid
+        article_response["pmcid"] = element["pmcid"]
+
+        # add citation
+        article_response["cited_by"] = element["cited_by"]
+
+        # add score
+        article_response['score'] = len(abstract_sentences) + len(body_sentences)
+
+        # add retracted info
+        article_response['retracted'] = False
+
+    async with unit_of_work(engine) as uow:
+        async with uow.connection.begin():
+            await save_result_and_sentences(uow, parsed, article_response)
+
+
+async def save_result_and_sentences(engine, parsed, article_response):
+    """
+    Save the article, the result and the sentences found by find_hits (called by save_hits)
+    :param engine: params to connect to the db
+    :param parsed: dict returned by find_hits
+    :param article_response: article to save or None if it is already in the database
+    :return: None
+    """
+    abstract_sentences = parsed["abstract_sentences"]
+    body_sentences = parsed["body_sentences"]
+
+    # save article
+    if article_response:
+        await save_article(engine, article_response)
+
+    # save result
+    result_id = await save_result(engine, parsed["result"])
+
+    if result_id:
+        job_id = parsed["result"]["job_id"]
+        regex = job_regex(job_id)
+
+        # save abstract sentences
+        abstract_sentences_to_save = []
+        for item in abstract_sentences:
+            match_start, match_end = match_span(regex, item)
+            abstract_sentences_to_save.append(
+                {"result_id": result_id, "job_id": job_id, "sentence": item, "match_start": match_start,
+                 "match_end": match_end}
+            )
+        if abstract_sentences_to_save:
+            await save_abstract_sentences(engine, abstract_sentences_to_save)
+
+        # save body sentences
+        body_sentences_to_save = []
+        for loc, sentences in body_sentences.items():
+            # rename location (remove counter)
+            if loc.startswith("intro"):
+                location = "intro"
+            elif loc.startswith("results"):
+                location = "results"
+            elif loc.startswith("discussion"):
+                location = "discussion"
+            elif loc.startswith("conclusion"):
+                location = "conclusion"
+            elif loc.startswith("method"):
+                location = "method"
+            else:
+                location = "other"
+
+            for item in sentences:
+                match_start, match_end = match_span(regex, item)
+                body_sentences_to_save.append({
+                    "result_id": result_id,
+                    "job_id": job_id,
+                    "sentence": item,
+                    "location": location,
+                    "match_start": match_start,
+                    "match_end": match_end
+                })
+        if body_sentences_to_save:
+            await save_body_sentences(engine, body_sentences_to_save)
+
+
+async def process_articles(engine, job_id, pmcid_list, regex, start=0, skip=(), checkpoint=None):
+    """
+    Fetch each article of pmcid_list and save the sentences that contain the job_id.
+    Articles saved by previous jobs are read from the database, articles found in the local corpus
+    (see CORPUS) are read from disk instead of the API and articles of the text index (see TEXT_INDEX)
+    that do not contain the job_id are skipped.
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :param pmcid_list: list of dicts containing pmcid and cited_by
+    :param regex: compiled regex used to find the job_id (see job_regex)
+    :param start: index of the first article to process (used to resume a job)
+    :param skip: pmcids that should not be processed, e.g. articles that already have results for this job
+    :param checkpoint: coroutine function that saves the index of the next article to process
+    :return: number of articles saved for this job
+    """
+    hit_count = 0
+
+    pmcids = [item["pmcid"] for item in pmcid_list[start:] if item["pmcid"] not in skip]
+
+    # articles that were processed before (by any job) and do not contain the job_id
+    text_index = get_text_index()
+    not_found = set()
+    if text_index:
+        candidates = text_index.lookup(job_id)
+        if candidates is not None:
+            not_found = text_index.seen(pmcids) - candidates
+
+    # articles whose text has been saved by previous jobs
+    saved_articles = await get_pmcid_with_text(engine, pmcids) if pmcids else set()
+
+    # read the articles available on disk in a single pass over each package
+    # (in an executor, because seeking in a compressed package decompresses everything before the article)
+    corpus = get_corpus()
+    local_articles = {}
+    if corpus:
+        local_pmcids = [pmcid for pmcid in pmcids if pmcid not in not_found and pmcid not in saved_articles]
+        local_articles = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: dict(corpus.articles(local_pmcids))
+        )
+
+    for index, element in enumerate(pmcid_list):
+        if index < start or element["pmcid"] in skip:
+            continue
+
+        if checkpoint and index > start and (index - start) % CHECKPOINT_INTERVAL == 0:
+            await checkpoint(index)
+
+        progress.step()
+
+        if element["pmcid"] in not_found:
+            continue
+
+        content = await get_article_text(engine, element["pmcid"]) if element["pmcid"] in saved_articles else None
+
+        if content is None:
+            if element["pmcid"] in local_articles:
+                get_article = local_articles.pop(element["pmcid"])
+            else:
+                # wait a while to respect the rate limit
+                await asyncio.sleep(0.6)
+
+                # fetch full article
+                try:
+                    get_article = requests.get(EUROPE_PMC + element["pmcid"] + "/fullTextXML").text
+                except requests.exceptions.RequestException as e:
+                    get_article = None
+                    logging.debug("There was an error fetching article {}. "
+                                  "Error message: {} ".format(element["pmcid"], e))
+
+            if get_article:
+                full_txt_no_tags = article_text(get_article)
+                if text_index:
+                    text_index.add(element["pmcid"], full_txt_no_tags)
+
+                # save the text, so that other jobs can use it
+                content = article_content(element["pmcid"], get_article, full_txt_no_tags)
+                if content:
+                    await save_article_text(engine, element["pmcid"], content)
+
+        if content:
+            parsed = find_hits(job_id, element["pmcid"], content, regex)
+
+            if parsed:
+                await save_hits(engine, element, parsed)
+                hit_count += 1
+
+    if text_index:
+        # merging segments reads and rewrites them, so it runs in an executor
+        text_index.flush()
+        await asyncio.get_running_loop().run_in_executor(None, text_index.merge)
+
+    return hit_count
+
+
 async def seek_references(engine, job_id, consumer_ip, date):
     """
     Using the Europe PMC API, this function first gets a list of articles
     that mention job_id in their content and then parses article by article
     and tries to extract a sentence containing the job_id.
+    The progress is saved after every page of results (and every CHECKPOINT_INTERVAL
+    articles), so a job that was interrupted continues from where it stopped.
     Note:
     - Europe PMC rate limits are 10 requests/second or 500 requests/minute.
     - The Europe PMC SOAP Web Service search results are sorted by relevance.
@@ -216,8 +800,7 @@ async def seek_references(engine, job_id, consumer_ip, date):
     :return: save the results in the database and make the consumer available for a new search
     """
     start = datetime.datetime.now()
-    regex = r"(^|\s|\(|\“|\'|\"|\;)" + re.escape(job_id.lower()) + "($|[\s.,:;?'”\"/)])"
-    pmcid_list = []
+    regex = job_regex(job_id)
     hit_count = 0
     query_filter, search_limit = await get_query_and_limit(engine, job_id.lower())
 
@@ -228,287 +811,125 @@ async def seek_references(engine, job_id, consumer_ip, date):
     # TODO: Should we set a limit on the number of articles to be searched?
     search_limit = search_limit if search_limit else 1000000
 
-    temp_pmcid_list, next_page = await articles_list(job_id, query_filter, date)
-    for item in temp_pmcid_list:
-        if len(pmcid_list) < search_limit and item not in pmcid_list:
-            pmcid_list.append(item)
-
-    while len(pmcid_list) < search_limit and next_page:
-        temp_pmcid_list, next_page = await articles_list(job_id, query_filter, date, next_page)
-        for item in temp_pmcid_list:
-            if len(pmcid_list) < search_limit and item not in pmcid_list:
-                pmcid_list.append(item)
-
-    if date and pmcid_list:
-        # filter pmcid_list to only search for articles/results that are not in the database
-        pmcid_in_db = await get_pmcid_in_result(engine, job_id.lower())
-        pmcid_list = [item for item in pmcid_list if item['pmcid'] not in pmcid_in_db]
-
-    for element in pmcid_list:
-        # wait a while to respect the rate limit
-        await asyncio.sleep(0.6)
-
-        # fetch full article
-        try:
-            get_article = requests.get(EUROPE_PMC + element["pmcid"] + "/fullTextXML").text
-        except requests.exceptions.RequestException as e:
-            get_article = None
-            logging.debug("There was an error fetching article {}. Error message: {} ".format(element["pmcid"], e))
-
-        if get_article:
-            # get text
-            abstract_txt = re.search('<abstract(.*?)</abstract>', get_article, re.DOTALL)
-            body_txt = re.search('<body(.*?)</body>', get_article, re.DOTALL)
-            floats_group_txt = re.search('<floats-group(.*?)</floats-group>', get_article, re.DOTALL)
-
-            if abstract_txt and body_txt and floats_group_txt:
-                full_txt = abstract_txt[0] + body_txt[0] + floats_group_txt[0]
-            elif abstract_txt and body_txt:
-                full_txt = abstract_txt[0] + body_txt[0]
-            elif body_txt:
-                full_txt = body_txt[0]
-            else:
-                logging.debug("Text not found for pmcid {}.".format(element["pmcid"]))
-                continue
+    # articles that already have results for this job are not searched again. This happens when
+    # searching for new articles (date) and when the job is resumed from a checkpoint
+    skip = set(await get_pmcid_in_result(engine, job_id.lower()))
+
+    # continue from the last checkpoint, if any. examined counts the articles of the previous pages,
+    # so that a resumed job does not go over the search_limit
+    page, index, examined = await get_checkpoint(engine, job_id.lower())
+    page = page if page else "*"
+    pmcid_list, next_page, total = await articles_list(job_id, query_filter, date, page)
+
+    if page == "*" and SPLIT_JOBS_ABOVE and min(total, search_limit) > SPLIT_JOBS_ABOVE:
+        # split the job so that idle consumers can help. The job will be finished by
+        # the consumer that processes the last chunk
+        while len(pmcid_list) < search_limit and next_page:
+            temp_pmcid_list, next_page, _ = await articles_list(job_id, query_filter, date, next_page)
+            if not temp_pmcid_list:
+                break
+            pmcid_list.extend(temp_pmcid_list)
+
+        articles = []
+        for item in pmcid_list[:search_limit]:
+            if item["pmcid"] not in skip:
+                articles.append(item)
+                skip.add(item["pmcid"])
+
+        if articles:
+            chunks = [articles[i:i + CHUNK_SIZE] for i in range(0, len(articles), CHUNK_SIZE)]
+            await save_job_chunks(engine, job_id.lower(), chunks)
+            logging.debug("Job_id {} split into {} chunks.".format(job_id, len(chunks)))
+
+            # update consumer
+            progress.finish()
+            await set_consumer_status_and_job_id(engine, consumer_ip, CONSUMER_STATUS_CHOICES.available, "")
+            return
 
-            # remove tags
-            full_txt_no_tags = re.sub('<[^>]*>', ' ', full_txt)
-
-            # skip current iteration if job_id is not found
-            if not re.search(regex, full_txt_no_tags.lower()):
-                logging.debug("Job_id {} not found for pmcid {}.".format(job_id, element["pmcid"]))
-                continue
+        pmcid_list = []
 
-            # remove tables, figures and supplementary material
-            full_txt = re.sub(
-                r"(?is)<(counts|table-wrap|table|fig-group|fig|supplementary-material).*?>.*?(</\1>)", "", get_article
-            )
+    while pmcid_list and examined < search_limit:
+        # the same article can be listed more than once
+        unique = []
+        for item in pmcid_list:
+            if item not in unique:
+                unique.append(item)
+        pmcid_list = unique[:search_limit - examined]
+
+        hit_count += await process_articles(
+            engine,
+            job_id,
+            pmcid_list,
+            regex,
+            start=index,
+            skip=skip,
+            checkpoint=functools.partial(save_checkpoint, engine, job_id.lower(), page, examined=examined)
+        )
+        skip.update(item["pmcid"] for item in pmcid_list)
+        examined += len(pmcid_list)
 
-            # parse using ElementTree
-            try:
-                article = ET.fromstring(full_txt)
-            except ParseError as e:
-                article = None
-                logging.debug("There was an error parsing the article {}. "
-                              "Error message: {} ".format(element["pmcid"], e))
-
-            if article:
-                article_response = {}
-                result_response = {}
-
-                # if the trans-title-group element is found it is because this article was not written in English
-                trans_title = article.find("./front/article-meta/title-group/trans-title-group")
-                if trans_title:
-                    # skip the current iteration
-                    continue
-
-                # get title
-                get_title = article.find("./front/article-meta/title-group/article-title")
-                try:
-                    title = ''.join(get_title.itertext()).strip()
-                    article_response["title"] = title
-                except AttributeError:
-                    # skip the current iteration
-                    logging.debug("Title not found for pmcid {} and job_id {}".format(element["pmcid"], job_id))
-                    continue
-
-                # check if the title has the job_id
-                result_response["id_in_title"] = True if job_id.lower() in title.lower() else False
-
-                # get abstract
-                get_abstract_tags = article.findall(".//abstract")
-                abstract_types = ['teaser', 'web-summary', 'summary', 'precis', 'graphical', 'author-highlights']
-                get_abstract_tags = [
-                    item for item in get_abstract_tags if
-                    not any(elem in item.attrib.values() for elem in abstract_types)
-                ]
-                abstract_text = [" ".join(item.itertext()) for item in get_abstract_tags]
-                abstract = " ".join(abstract_text).replace(" .", ".").replace("  ", " ")
-                article_response["abstract"] = abstract
-
-                # check if the abstract has the job_id
-                abstract_sentences = []
-                for sentence in nltk.sent_tokenize(abstract):
-                    if re.search(regex, sentence.lower()):
-                        abstract_sentences.append(sentence)
-                result_response["id_in_abstract"] = True if abstract_sentences else False
-
-                # check if the body has the job_id
-                sections = get_sections(article)
-                body_sentences = {}
-                for section_name, section in sections.items():
-                    item = get_text(section)
-                    tokenized_text = nltk.sent_tokenize(item)
-                    body_sentences[section_name] = []
-
-                    for index, sentence in enumerate(tokenized_text):
-                        if re.search(regex, sentence.lower()) and len(sentence.split()) > 3:
-                            # try to get the previous and next sentence
-                            prev_sentence = tokenized_text[index - 1] if index > 0 else None
-                            next_sentence = tokenized_text[index + 1] if index < len(tokenized_text) - 1 else None
-
-                            if prev_sentence and next_sentence:
-                                body_sentences[section_name].append(
-                                    prev_sentence + " " + sentence + " " + next_sentence
-                                )
-                            elif prev_sentence:
-                                body_sentences[section_name].append(prev_sentence + " " + sentence)
-                            elif next_sentence:
-                                body_sentences[section_name].append(sentence + " " + next_sentence)
-                            else:
-                                body_sentences[section_name].append(sentence)
-
-                if abstract_sentences and not any(body_sentences.values()):
-                    result_response["id_in_body"] = False
-                elif not abstract_sentences and not any(body_sentences.values()):
-                    result_response["id_in_body"] = True
-                    body_sentences['other'] = ["%s found in an image, table or supplementary material" % job_id]
-                else:
-                    result_response["id_in_body"] = True
-
-                # add job_id and pmcid
-                result_response["job_id"] = job_id.lower()
-                result_response["pmcid"] = element["pmcid"]
-
-                # check if this article is already in the database
-                article_in_db = await get_pmcid(engine, element["pmcid"])
-
-                if not article_in_db:
-                    # get article type
-                    if "article-type" in article.attrib:
-                        article_type = article.attrib["article-type"].strip()
-                        article_response["type"] = article_type.replace("-", " ").capitalize()
-                    else:
-                        article_response["type"] = ""
-
-                    # get authors of the article
-                    get_contrib_group = article.find("./front/article-meta/contrib-group")
-                    article_response['author'] = ''
-
-                    try:
-                        get_authors = get_contrib_group.findall(".//name")
-                        authors = []
-                        for author in get_authors:
-                            surname = author.find('surname').text if author.find('surname').text else ''
-                            given_names = author.find('given-names').text if author.find('given-names').text else ''
-                            if surname and given_names:
-                                authors.append(surname + ", " + given_names)
-                            elif surname or given_names:
-                                authors.append(surname + given_names)
-                        article_response["author"] = '; '.join(authors)
-                    except AttributeError:
-                        pass
-
-                    # get pmid and doi
-                    article_meta = article.findall("./front/article-meta/article-id")
-                    article_response['doi'] = ''
-                    article_response['pmid'] = ''
-
-                    for item in article_meta:
-                        if item.attrib == {'pub-id-type': 'doi'}:
-                            article_response["doi"] = item.text
-                        elif item.attrib == {'pub-id-type': 'pmid'}:
-                            article_response["pmid"] = item.text
-
-                    # get year
-                    article_response["year"] = 0
-                    get_year = article.findall("./front/article-meta/pub-date")
-                    pub_type = ['epub', 'ppub', 'pub']
-                    for item in get_year:
-                        if set(pub_type).intersection(item.attrib.values()):
-                            year = int(item.find('year').text) if item.find('year').text else 0
-                            article_response["year"] = year
-
-                    # get journal
-                    article_response["journal"] = ''
-                    get_journal = article.find("./front/journal-meta/journal-title-group/journal-title")
-                    try:
-                        article_response["journal"] = get_journal.text
-                    except AttributeError:
-                        # maybe it is in a different element
-                        journal = article.find("./front/journal-meta/journal-title")
-                        try:
-                            article_response["journal"] = journal.text
-                        except AttributeError:
-                            logging.debug("Journal not found for pmcid {}".format(element["pmcid"]))
-
-                    # text classification - is it RNA-related?
-                    cleaned_abstract = await clean_text(abstract)
-                    rna_pipeline = joblib.load("training/svc_pipeline.pkl")
-                    relevance_label = rna_pipeline.predict([cleaned_abstract])[0]
-                    article_response["rna_related"] = bool(int(relevance_label))
-                    probability = rna_pipeline.predict_proba([cleaned_abstract])[0][1]
-                    article_response["probability"] = round(float(probability), 2)
-
-                    # add pmcid
-                    article_response["pmcid"] = element["pmcid"]
-
-                    # add citation
-                    article_response["cited_by"] = element["cited_by"]
-
-                    # add score
-                    article_response['score'] = len(abstract_sentences) + len(body_sentences)
-
-                    # add retracted info
-                    article_response['retracted'] = False
-
-                    # save article
-                    await save_article(engine, article_response)
-
-                # save result
-                result_id = await save_result(engine, result_response)
-
-                if result_id:
-                    # save abstract sentences
-                    abstract_sentences = [{"result_id": result_id, "sentence": item} for item in abstract_sentences]
-                    if abstract_sentences:
-                        await save_abstract_sentences(engine, abstract_sentences)
-
-                    # save body sentences
-                    body_sentences_to_save = []
-                    for loc, sentences in body_sentences.items():
-                        # rename location (remove counter)
-                        if loc.startswith("intro"):
-                            location = "intro"
-                        elif loc.startswith("results"):
-                            location = "results"
-                        elif loc.startswith("discussion"):
-                            location = "discussion"
-                        elif loc.startswith("conclusion"):
-                            location = "conclusion"
-                        elif loc.startswith("method"):
-                            location = "method"
-                        else:
-                            location = "other"
-
-                        for item in sentences:
-                            body_sentences_to_save.append(
-                                {"result_id": result_id, "sentence": item, "location": location}
-                            )
-                    if body_sentences_to_save:
-                        await save_body_sentences(engine, body_sentences_to_save)
+        if not next_page or next_page == page:
+            break
 
-                hit_count += 1
+        # move on to the next page of results
+        page, index = next_page, 0
+        await save_checkpoint(engine, job_id.lower(), page, index, examined=examined)
+        pmcid_list, next_page, _ = await articles_list(job_id, query_filter, date, page)
 
     if hit_count > 0:
         logging.debug("Saving {} result(s) in DB. Search performed in {} seconds".format(
             str(hit_count), (datetime.datetime.now() - start).total_seconds())
         )
 
-    elif not pmcid_list:
+    elif not total:
         # if pmcid is not found so no articles were actually found
         logging.debug("No results found for job_id {}.".format(job_id))
 
-    # get hit_count if this search is to update a job_id
-    if date:
-        current_hit_count = await get_hit_count(engine, job_id.lower())
-        hit_count = hit_count + current_hit_count
+    # save hit_count. This includes the results of previous searches (date) and
+    # the results saved before the job was interrupted
+    async with unit_of_work(engine) as uow:
+        await save_hit_count(uow, job_id.lower(), await count_results(uow, job_id.lower()))
+        await refresh_job_stats(uow, job_id.lower())
 
-    # save hit_count
-    await save_hit_count(engine, job_id.lower(), hit_count)
+        # set job status
+        await save_checkpoint(uow, job_id.lower(), None, None)
+        await set_job_status(uow, job_id.lower(), status=JOB_STATUS_CHOICES.success)
 
-    # set job status
-    await set_job_status(engine, job_id.lower(), status=JOB_STATUS_CHOICES.success)
+        # update consumer
+        progress.finish()
+        await set_consumer_status_and_job_id(uow, consumer_ip, CONSUMER_STATUS_CHOICES.available, "")
+
+
+async def seek_chunk(engine, job_id, chunk, consumer_ip):
+    """
+    Process the articles of a chunk created by seek_references
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :param chunk: number of the chunk
+    :param consumer_ip: consumer IP address
+    :return: save the results in the database and make the consumer available for a new search
+    """
+    start = datetime.datetime.now()
+    pmcid_list = await get_job_chunk(engine, job_id.lower(), chunk)
+    index = await get_chunk_checkpoint(engine, job_id.lower(), chunk)
+    hit_count = await process_articles(
+        engine,
+        job_id,
+        pmcid_list,
+        job_regex(job_id),
+        start=index,
+        skip=set(await get_pmcid_in_result(engine, job_id.lower())),
+        checkpoint=functools.partial(save_chunk_checkpoint, engine, job_id.lower(), chunk)
+    )
+    logging.debug("Saving {} result(s) of chunk {} of job_id {} in DB. Search performed in {} seconds".format(
+        str(hit_count), chunk, job_id, (datetime.datetime.now() - start).total_seconds())
+    )
+
+    # the last chunk also finishes the job
+    if await finish_job_chunk(engine, job_id.lower(), chunk):
+        logging.debug("All chunks of job_id {} have been processed.".format(job_id))
+        await refresh_job_stats(engine, job_id.lower())
 
     # update consumer
+    progress.finish()
     await set_consumer_status_and_job_id(engine, consumer_ip, CONSUMER_STATUS_CHOICES.available, "")
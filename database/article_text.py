@@ -0,0 +1,109 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+import psycopg2
+import sqlalchemy as sa
+import zlib
+
+from database import DatabaseConnectionError, SQLError
+from database.models import ArticleText
+
+
+def compress(content):
+    """
+    Serialize the content of an article
+    :param content: dict
+    :return: bytes
+    """
+    return zlib.compress(json.dumps(content, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def decompress(data):
+    """
+    Inverse of compress
+    :param data: bytes
+    :return: dict
+    """
+    return json.loads(zlib.decompress(bytes(data)).decode("utf-8"))
+
+
+async def save_article_text(engine, pmcid, content):
+    """
+    Save the text of an article, so that other jobs do not need to download and parse it again
+    :param engine: params to connect to the db
+    :param pmcid: id of the article
+    :param content: dict returned by article_content
+    :return: None
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                query = sa.text('''
+                    INSERT INTO litscan_article_text(pmcid, content)
+                    VALUES (:pmcid, :content)
+                    ON CONFLICT (pmcid) DO UPDATE SET content=EXCLUDED.content
+                ''')
+                await connection.execute(query, pmcid=pmcid, content=compress(content))
+            except Exception as e:
+                raise SQLError("Failed to save the text of pmcid = %s" % pmcid) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in save_article_text, pmcid = %s" % pmcid) from e
+
+
+async def get_article_text(engine, pmcid):
+    """
+    Get the text of an article
+    :param engine: params to connect to the db
+    :param pmcid: id of the article
+    :return: dict or None if the text has not been saved
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                query = (sa.select([ArticleText.c.content])
+                         .select_from(ArticleText)
+                         .where(ArticleText.c.pmcid == pmcid))
+
+                async for row in connection.execute(query):
+                    return decompress(row.content)
+
+            except Exception as e:
+                raise SQLError("Failed to get the text of pmcid = %s" % pmcid) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in get_article_text, pmcid = %s" % pmcid) from e
+
+
+async def get_pmcid_with_text(engine, pmcids):
+    """
+    Find which articles have their text saved
+    :param engine: params to connect to the db
+    :param pmcids: list of pmcids
+    :return: set of pmcids
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                query = (sa.select([ArticleText.c.pmcid])
+                         .select_from(ArticleText)
+                         .where(ArticleText.c.pmcid.in_(pmcids)))
+
+                output = set()
+                async for row in connection.execute(query):
+                    output.add(row.pmcid)
+
+                return output
+
+            except Exception as e:
+                raise SQLError("Failed to get pmcids in get_pmcid_with_text") from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in get_pmcid_with_text") from e
@@ -0,0 +1,332 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import json
+import psycopg2
+import sqlalchemy as sa
+
+from collections import OrderedDict
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql.dml import Insert
+
+try:
+    import asyncpg
+except ImportError:  # only needed with DATABASE_DRIVER = 'asyncpg'
+    asyncpg = None
+
+# Engine backed by asyncpg, with the interface of the aiopg.sa engine used by the functions in database/*.py
+# (engine.acquire(), connection.execute(query, **params), rows with attribute access), so they can run on
+# either driver without changes. Statements are compiled once per SQLAlchemy cache key and prepared once per
+# connection (using the statement cache of asyncpg), and their parameters are sent with the binary protocol.
+# Multi-row inserts are sent with executemany or COPY.
+
+# compile_query and the helpers below use private APIs of SQLAlchemy 1.4 (cache keys, bind processors and the
+# values of insert statements), which change between minor versions. The version is pinned in requirements.txt
+if not sa.__version__.startswith('1.4.'):
+    raise ImportError("database.asyncpg_engine requires SQLAlchemy 1.4, found %s" % sa.__version__)
+
+# same options aiopg uses to compile statements, with positional parameters ($1, $2, ...). Without implicit
+# returning, inserts would have a NULL parameter for the SERIAL primary key instead of leaving it to the sequence
+DIALECT = postgresql.dialect(paramstyle='format')
+DIALECT.implicit_returning = True
+
+# number of compiled statements kept in memory (shared by all connections)
+COMPILED_CACHE_SIZE = 500
+
+# number of prepared statements kept by each connection (statement_cache_size of asyncpg)
+PREPARED_CACHE_SIZE = 200
+
+# multi-row inserts with at least this number of rows are sent with COPY
+COPY_THRESHOLD = 100
+
+compiled_cache = OrderedDict()
+
+
+def lru_get(cache, key):
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    return None
+
+
+def lru_set(cache, key, value, size):
+    cache[key] = value
+    if len(cache) > size:
+        cache.popitem(last=False)
+
+
+def compile_query(query, params):
+    """
+    Compile a SQLAlchemy statement or a string to SQL with positional parameters
+    :param query: SQLAlchemy statement or SQL string
+    :param params: dict with parameters (used by sa.text statements)
+    :return: SQL string and list of arguments
+    """
+    if isinstance(query, str):
+        query = sa.text(query)
+
+    cache_key = query._generate_cache_key()
+    compiled = lru_get(compiled_cache, cache_key.key) if cache_key is not None else None
+    if compiled is None:
+        compiled = query.compile(dialect=DIALECT, cache_key=cache_key)
+        if compiled.post_compile_params:
+            # IN with a list of values: the number of parameters depends on the list, so it is not cached
+            compiled = query.compile(dialect=DIALECT, compile_kwargs={'render_postcompile': True})
+            cache_key = None
+        elif cache_key is not None:
+            lru_set(compiled_cache, cache_key.key, compiled, COMPILED_CACHE_SIZE)
+
+    values = compiled.construct_params(
+        params or None, extracted_parameters=cache_key.bindparams if cache_key is not None else None
+    )
+    processors = compiled._bind_processors
+    args = [processors[name](values[name]) if name in processors else values[name] for name in compiled.positiontup]
+    sql = compiled.string % tuple('$%d' % (index + 1) for index in range(len(args)))
+    return sql, args
+
+
+def multi_values(query):
+    """
+    Rows of a multi-row insert without RETURNING
+    :param query: SQLAlchemy statement or SQL string
+    :return: list of dicts (column name -> value) or None for other statements
+    """
+    if not isinstance(query, Insert) or not query._multi_values or query._returning:
+        return None
+    return [
+        {key.key if hasattr(key, 'key') else key: value for key, value in row.items()}
+        for row in query._multi_values[0]
+    ]
+
+
+def on_conflict(query):
+    """ON CONFLICT clause of an insert statement or None"""
+    return query._post_values_clause
+
+
+def insert_row(table, row, clause):
+    """Insert statement of a single row, with the ON CONFLICT clause of the multi-row insert"""
+    statement = postgresql.insert(table).values(row)
+    statement._post_values_clause = clause
+    return statement
+
+
+class Row(object):
+    """Row with the same access patterns as aiopg rows: row.column, row['column'] and row[0]"""
+    __slots__ = ('_row',)
+
+    def __init__(self, record):
+        self._row = record
+
+    def __getattr__(self, name):
+        try:
+            return self._row[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, key):
+        return self._row[key]
+
+    def __iter__(self):
+        return iter(self._row.values())
+
+    def __len__(self):
+        return len(self._row)
+
+    def keys(self):
+        return self._row.keys()
+
+
+class Result(object):
+    """Rows returned by a statement, with the methods of aiopg.sa.ResultProxy"""
+    def __init__(self, rows, status):
+        self._rows = rows
+        parts = (status or '').split()
+        self.rowcount = int(parts[-1]) if parts and parts[-1].isdigit() else -1
+
+    async def __aiter__(self):
+        for row in self._rows:
+            yield row
+
+    async def fetchall(self):
+        return list(self._rows)
+
+    async def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    async def first(self):
+        return self._rows[0] if self._rows else None
+
+    async def scalar(self):
+        return self._rows[0][0] if self._rows else None
+
+
+class Execution(object):
+    """Result of connection.execute(): it can be awaited or iterated with async for, as in aiopg"""
+    def __init__(self, connection, query, params):
+        self._connection = connection
+        self._query = query
+        self._params = params
+
+    def __await__(self):
+        return self._connection._execute(self._query, self._params).__await__()
+
+    async def __aiter__(self):
+        result = await self
+        for row in result._rows:
+            yield row
+
+
+class SAConnection(object):
+    def __init__(self, connection):
+        self._connection = connection
+
+    def execute(self, query, **params):
+        return Execution(self, query, params)
+
+    def begin(self):
+        return self._connection.transaction()
+
+    async def _execute(self, query, params):
+        try:
+            rows = multi_values(query)
+            if rows:
+                return await self._insert_many(query, rows)
+
+            if isinstance(query, str) and not params and not query.lstrip()[:6].upper() in ('SELECT', 'WITH'):
+                # DDL without parameters uses the simple protocol (e.g. CREATE INDEX CONCURRENTLY, which
+                # cannot be prepared). Other statements are compiled, so that their parameters are sent
+                return Result([], await self._connection.execute(query))
+
+            # fetch prepares the statement once per connection (asyncpg keeps statement_cache_size statements
+            # and prepares them again when the schema changes)
+            sql, args = compile_query(query, params)
+            rows = await self._connection.fetch(sql, *args)
+            return Result([Row(row) for row in rows], None)
+        except asyncpg.PostgresError as e:
+            # the functions in database/*.py handle psycopg2 errors
+            raise psycopg2.DatabaseError(str(e)) from e
+
+    async def _insert_many(self, query, rows):
+        """
+        Insert many rows with executemany (or COPY for large batches) instead of a multi-row VALUES statement,
+        whose SQL would change with the number of rows
+        :param query: multi-row insert statement
+        :param rows: list of dicts returned by multi_values
+        """
+        clause = on_conflict(query)
+
+        # COPY does not support ON CONFLICT
+        if len(rows) >= COPY_THRESHOLD and clause is None:
+            columns = list(rows[0])
+            status = await self._connection.copy_records_to_table(
+                query.table.name, records=[tuple(row[column] for column in columns) for row in rows], columns=columns
+            )
+        else:
+            # each row is compiled on its own, so that its arguments follow the columns of the SQL (in the order
+            # of the table, not of the dict). The statement is the same for all rows, so it is compiled from cache
+            sql = None
+            records = []
+            for row in rows:
+                sql, args = compile_query(insert_row(query.table, row, clause), {})
+                records.append(args)
+            await self._connection.executemany(sql, records)
+            status = 'INSERT 0 %s' % len(records)
+        return Result([], status)
+
+
+class _AcquireContext(object):
+    def __init__(self, engine, timeout):
+        self._engine = engine
+        self._timeout = timeout
+        self._connection = None
+
+    async def __aenter__(self):
+        try:
+            self._connection = await self._engine.pool.acquire(timeout=self._timeout)
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+            raise psycopg2.OperationalError(str(e)) from e
+        return SAConnection(self._connection)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._engine.pool.release(self._connection)
+
+
+class Engine(object):
+    def __init__(self, pool):
+        self.pool = pool
+
+    def acquire(self, timeout=None):
+        return _AcquireContext(self, timeout)
+
+    # same attributes as the aiopg engine
+    @property
+    def minsize(self):
+        return self.pool.get_min_size()
+
+    @property
+    def maxsize(self):
+        return self.pool.get_max_size()
+
+    @property
+    def size(self):
+        return self.pool.get_size()
+
+    @property
+    def freesize(self):
+        return self.pool.get_idle_size()
+
+    def close(self):
+        self._closing = asyncio.ensure_future(self.pool.close())
+
+    async def wait_closed(self):
+        await self._closing
+
+
+def encode_json(value):
+    # statements compiled by SQLAlchemy already serialize JSON values
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+async def init_connection(connection):
+    for name in ('json', 'jsonb'):
+        await connection.set_type_codec(name, encoder=encode_json, decoder=json.loads, schema='pg_catalog')
+
+
+async def create_engine(user, password, database, host, port, minsize=1, maxsize=10, **kwargs):
+    """
+    Create an engine with the same arguments as aiopg.sa.create_engine
+    :param minsize: minimum number of connections in the pool
+    :param maxsize: maximum number of connections in the pool
+    :param kwargs: other arguments of asyncpg.create_pool
+    :return: Engine object
+    """
+    if asyncpg is None:
+        raise ImportError("asyncpg is required when DATABASE_DRIVER = 'asyncpg'")
+
+    try:
+        pool = await asyncpg.create_pool(
+            user=user,
+            password=password,
+            database=database,
+            host=host,
+            port=int(port),
+            min_size=minsize,
+            max_size=maxsize,
+            statement_cache_size=PREPARED_CACHE_SIZE,
+            init=init_connection,
+            **kwargs
+        )
+    except (OSError, asyncpg.PostgresError) as e:
+        raise psycopg2.OperationalError(str(e)) from e
+    return Engine(pool)
@@ -0,0 +1,121 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from aiopg.sa import create_engine
+from dotenv import load_dotenv
+
+from database import asyncpg_engine
+from database.consumers import get_consumer_status
+from database.job import delete_job_data, get_hit_count, save_job, set_job_status
+from database.models import Article
+from database.results import count_results, save_abstract_sentences, save_result
+from database.settings import get_postgres_credentials
+
+load_dotenv()
+
+BENCHMARK_JOB = "litscan-benchmark"
+BENCHMARK_PMCID = "PMC-BENCHMARK"
+
+
+def calls(engine, result_id):
+    """
+    Database calls made for every article processed by a consumer
+    :param engine: params to connect to the db
+    :param result_id: id of the result used to save sentences
+    :return: list of (name, coroutine function)
+    """
+    sentences = [{"result_id": result_id, "sentence": f"sentence {index}"} for index in range(5)]
+    return [
+        ("set_job_status", lambda: set_job_status(engine, BENCHMARK_JOB, "started")),
+        ("get_hit_count", lambda: get_hit_count(engine, BENCHMARK_JOB)),
+        ("get_consumer_status", lambda: get_consumer_status(engine, "127.0.0.1")),
+        ("count_results", lambda: count_results(engine, BENCHMARK_JOB)),
+        ("save_result", lambda: save_result(engine, {"pmcid": BENCHMARK_PMCID, "job_id": BENCHMARK_JOB})),
+        ("save_abstract_sentences", lambda: save_abstract_sentences(engine, sentences)),
+    ]
+
+
+async def run(engine, iterations):
+    """
+    Time each call, after seeding a job and an article that are deleted at the end
+    :param engine: params to connect to the db
+    :param iterations: number of times each call is made
+    :return: dict with the latencies of each call, in milliseconds
+    """
+    await save_job(engine, BENCHMARK_JOB, "", 100)
+    async with engine.acquire() as connection:
+        await connection.execute(Article.insert().values(pmcid=BENCHMARK_PMCID, title="benchmark"))
+    result_id = await save_result(engine, {"pmcid": BENCHMARK_PMCID, "job_id": BENCHMARK_JOB})
+
+    latencies = {}
+    try:
+        for name, call in calls(engine, result_id):
+            await call()  # warm up (connection, prepared statement)
+            latencies[name] = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                await call()
+                latencies[name].append((time.perf_counter() - start) * 1000)
+    finally:
+        # results and sentences are deleted by the cascade
+        await delete_job_data(engine, BENCHMARK_JOB)
+        async with engine.acquire() as connection:
+            await connection.execute(Article.delete().where(Article.c.pmcid == BENCHMARK_PMCID))
+
+    return latencies
+
+
+async def main():
+    """
+    Compare the latency of the database functions using aiopg and asyncpg.
+    Run it with: python3 -m database.benchmark --iterations 1000
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=1000, help="number of times each call is made")
+    args = parser.parse_args()
+
+    settings = get_postgres_credentials(os.getenv('ENVIRONMENT', 'LOCAL'))
+    credentials = dict(
+        user=settings.POSTGRES_USER,
+        password=settings.POSTGRES_PASSWORD,
+        database=settings.POSTGRES_DATABASE,
+        host=settings.POSTGRES_HOST,
+        port=settings.POSTGRES_PORT
+    )
+
+    output = {}
+    for driver, connect in (("aiopg", create_engine), ("asyncpg", asyncpg_engine.create_engine)):
+        engine = await connect(**credentials)
+        try:
+            output[driver] = await run(engine, args.iterations)
+        finally:
+            engine.close()
+            await engine.wait_closed()
+
+    print(f"{'call':<25} {'driver':<8} {'mean':>8} {'p50':>8} {'p95':>8}  (ms)")
+    for name in output["aiopg"]:
+        for driver in output:
+            values = sorted(output[driver][name])
+            p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+            print(f"{name:<25} {driver:<8} {statistics.mean(values):>8.3f} {statistics.median(values):>8.3f} "
+                  f"{p95:>8.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
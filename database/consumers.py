@@ -17,7 +17,7 @@ import psycopg2
 from collections import namedtuple
 from consumer.settings import PORT
 from database import DatabaseConnectionError
-from database.models import CONSUMER_STATUS_CHOICES
+from database.models import CONSUMER_STATUS_CHOICES, JOB_STATUS_CHOICES
 from netifaces import interfaces, ifaddresses, AF_INET
 
 
@@ -40,23 +40,70 @@ def get_ip(app):
         return addresses[1]
 
 
+async def requeue_consumer_work(engine, consumer_ip):
+    """
+    Set the job (or chunks) left unfinished by a consumer back to pending, so that they can be
+    resumed from their checkpoint by any consumer
+    :param engine: params to connect to the db
+    :param consumer_ip: IP address of the consumer
+    :return: None
+    """
+    try:
+        async with engine.acquire() as connection:
+            # jobs that were split are finished by their chunks
+            query = sa.text('''
+                UPDATE litscan_job j
+                SET status=:pending
+                FROM litscan_consumer c
+                WHERE c.ip=:consumer_ip AND j.job_id=c.job_id AND j.status=:started
+                  AND NOT EXISTS (SELECT 1 FROM litscan_job_chunk WHERE job_id=j.job_id)
+            ''')
+            await connection.execute(
+                query,
+                consumer_ip=consumer_ip,
+                pending=JOB_STATUS_CHOICES.pending,
+                started=JOB_STATUS_CHOICES.started
+            )
+
+            query = sa.text('''
+                UPDATE litscan_job_chunk
+                SET status=:pending, consumer=NULL
+                WHERE consumer=:consumer_ip AND status=:started
+            ''')
+            await connection.execute(
+                query,
+                consumer_ip=consumer_ip,
+                pending=JOB_STATUS_CHOICES.pending,
+                started=JOB_STATUS_CHOICES.started
+            )
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError(str(e)) from e
+
+
 async def register_consumer_in_the_database(app):
     """
-    Utility for consumer to register itself in the database
+    Utility for consumer to register itself in the database. Work left unfinished
+    by a previous run of this consumer is requeued.
     :param app: params to connect to the db
     """
+    # the consumer caches its address on startup
+    consumer_ip = app['consumer_ip'] if 'consumer_ip' in app else get_ip(app)
+    await requeue_consumer_work(app['engine'], consumer_ip)
+
     try:
         async with app['engine'].acquire() as connection:
             if app['settings'].ENVIRONMENT == 'DOCKER':
                 await connection.execute(sa.text('''TRUNCATE TABLE litscan_consumer'''))
 
             sql_query = sa.text('''
-                INSERT INTO litscan_consumer(ip, status, port)
-                VALUES (:consumer_ip, :status, :port)
+                INSERT INTO litscan_consumer(ip, status, port, heartbeat, progress)
+                VALUES (:consumer_ip, :status, :port, LOCALTIMESTAMP, 0)
+                ON CONFLICT (ip) DO UPDATE
+                SET status=EXCLUDED.status, port=EXCLUDED.port, job_id=NULL, heartbeat=LOCALTIMESTAMP, progress=0
             ''')
             await connection.execute(
                 sql_query,
-                consumer_ip=get_ip(app),
+                consumer_ip=consumer_ip,
                 status=CONSUMER_STATUS_CHOICES.available,
                 port=PORT
             )
@@ -132,3 +179,170 @@ async def set_consumer_status_and_job_id(engine, consumer_ip, status, job_id):
 
     except psycopg2.Error as e:
         raise DatabaseConnectionError(str(e)) from e
+
+
+async def send_heartbeat(engine, consumer_ip, status, progress):
+    """
+    Tell the producer that the consumer is alive. A consumer that was marked as dead (e.g. because it was
+    unreachable for a while) only becomes available again when it is not running a job: the job it was
+    running has been requeued, and reviving it as busy would hide that another consumer may be running it.
+    :param engine: params to connect to the db
+    :param consumer_ip: consumer IP address
+    :param status: status the consumer reports (available or busy), only used if it was marked as dead
+    :param progress: number of articles processed in the current job
+    :return: None
+    """
+    try:
+        async with engine.acquire() as connection:
+            query = sa.text('''
+                UPDATE litscan_consumer
+                SET heartbeat=LOCALTIMESTAMP, progress=:progress,
+                  status=CASE WHEN status=:dead AND CAST(:status AS TEXT)=:available THEN :status ELSE status END
+                WHERE ip=:consumer_ip
+            ''')
+            await connection.execute(
+                query,
+                consumer_ip=consumer_ip,
+                status=status,
+                progress=progress,
+                dead=CONSUMER_STATUS_CHOICES.dead,
+                available=CONSUMER_STATUS_CHOICES.available
+            )
+
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError(str(e)) from e
+
+
+async def register_corpus_scan(engine, name, job_ids):
+    """
+    Register a scan of the local corpus (see consumer.scan_corpus) as one busy consumer for each job, so that
+    the producer does not requeue its jobs while it sends heartbeats. If the scan stops, these consumers are
+    marked as dead and their jobs are requeued like the jobs of any other consumer.
+    :param engine: params to connect to the db
+    :param name: name of the scan, at most 13 characters
+    :param job_ids: list of ids
+    :return: list with the name of each consumer (name-1, name-2, ...)
+    """
+    consumers = ["%s-%s" % (name, number) for number in range(1, len(job_ids) + 1)]
+
+    try:
+        async with engine.acquire() as connection:
+            query = sa.text('''
+                INSERT INTO litscan_consumer(ip, status, job_id, heartbeat, progress)
+                SELECT ip, :status, job_id, LOCALTIMESTAMP, 0
+                FROM unnest(CAST(:consumers AS TEXT[]), CAST(:job_ids AS TEXT[])) AS v(ip, job_id)
+            ''')
+            await connection.execute(
+                query,
+                status=CONSUMER_STATUS_CHOICES.busy,
+                consumers=consumers,
+                job_ids=[job_id.lower() for job_id in job_ids]
+            )
+        return consumers
+
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError(str(e)) from e
+
+
+async def send_corpus_scan_heartbeat(engine, consumers, progress):
+    """
+    Heartbeat of the consumers of a corpus scan. Consumers that were marked as dead stay dead, their jobs were requeued.
+    :param engine: params to connect to the db
+    :param consumers: list of consumers returned by register_corpus_scan
+    :param progress: number of articles scanned
+    :return: None
+    """
+    try:
+        async with engine.acquire() as connection:
+            query = sa.text('''
+                UPDATE litscan_consumer
+                SET heartbeat=LOCALTIMESTAMP, progress=:progress
+                WHERE ip = ANY(CAST(:consumers AS TEXT[])) AND status<>:dead
+            ''')
+            await connection.execute(query, consumers=consumers, progress=progress, dead=CONSUMER_STATUS_CHOICES.dead)
+
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError(str(e)) from e
+
+
+async def unregister_consumers(engine, consumers):
+    """
+    Remove consumers from the database, e.g. when a corpus scan is over
+    :param engine: params to connect to the db
+    :param consumers: list of IP addresses or names
+    :return: None
+    """
+    try:
+        async with engine.acquire() as connection:
+            query = sa.text('''DELETE FROM litscan_consumer WHERE ip = ANY(CAST(:consumers AS TEXT[]))''')
+            await connection.execute(query, consumers=consumers)
+
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError(str(e)) from e
+
+
+async def reclaim_dead_consumers(engine, timeout):
+    """
+    Mark consumers that stopped sending heartbeats as dead and requeue their work.
+    Jobs that were left started without any consumer running them are also requeued.
+    :param engine: params to connect to the db
+    :param timeout: number of seconds without heartbeats after which a consumer is considered dead
+    :return: list of IP addresses of the consumers that were marked as dead
+    """
+    try:
+        async with engine.acquire() as connection:
+            query = sa.text('''
+                SELECT ip
+                FROM litscan_consumer
+                WHERE status<>:dead AND heartbeat < LOCALTIMESTAMP - make_interval(secs => :timeout)
+            ''')
+
+            dead_consumers = []
+            async for row in connection.execute(query, dead=CONSUMER_STATUS_CHOICES.dead, timeout=timeout):
+                dead_consumers.append(row.ip)
+
+        for consumer_ip in dead_consumers:
+            await requeue_consumer_work(engine, consumer_ip)
+
+        async with engine.acquire() as connection:
+            if dead_consumers:
+                query = sa.text('''
+                    UPDATE litscan_consumer
+                    SET status=:dead, job_id=NULL, progress=NULL
+                    WHERE ip = ANY(:dead_consumers)
+                ''')
+                await connection.execute(query, dead=CONSUMER_STATUS_CHOICES.dead, dead_consumers=dead_consumers)
+
+            # started jobs that no consumer is running, e.g. the consumer was removed from the table
+            query = sa.text('''
+                UPDATE litscan_job j
+                SET status=:pending
+                WHERE j.status=:started
+                  AND NOT EXISTS (SELECT 1 FROM litscan_job_chunk WHERE job_id=j.job_id)
+                  AND NOT EXISTS (SELECT 1 FROM litscan_consumer WHERE job_id=j.job_id AND status<>:dead)
+            ''')
+            await connection.execute(
+                query,
+                pending=JOB_STATUS_CHOICES.pending,
+                started=JOB_STATUS_CHOICES.started,
+                dead=CONSUMER_STATUS_CHOICES.dead
+            )
+
+            # chunks of consumers that were removed from the table
+            query = sa.text('''
+                UPDATE litscan_job_chunk c
+                SET status=:pending, consumer=NULL
+                WHERE c.status=:started
+                  AND NOT EXISTS (SELECT 1 FROM litscan_consumer WHERE ip=c.consumer AND status<>:dead)
+            ''')
+            await connection.execute(
+                query,
+                pending=JOB_STATUS_CHOICES.pending,
+                started=JOB_STATUS_CHOICES.started,
+                dead=CONSUMER_STATUS_CHOICES.dead
+            )
+
+        return dead_consumers
+
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError(str(e)) from e
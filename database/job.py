@@ -15,35 +15,144 @@ import psycopg2
 import sqlalchemy as sa
 
 from database import DatabaseConnectionError, SQLError
-from database.models import Job, JOB_STATUS_CHOICES
+from database.models import Job, JOB_STATUS_CHOICES, SCHEDULING_POLICY_CHOICES
 
 
-async def find_job_to_run(engine):
+async def find_job_to_run(engine, policy=SCHEDULING_POLICY_CHOICES.fifo, aging_factor=0.0, default_cost=1000,
+                          weights=None, limit=10):
     """
-    Find jobs that need to be performed and delivered to consumers for processing
+    Find jobs that need to be performed and delivered to consumers for processing.
+
+    With the fifo policy jobs are served in the order they were submitted. The other policies use the
+    estimated_hit_count of each job as its cost. The cost is divided by (1 + aging_factor * hours waiting),
+    so big jobs get cheaper while they wait and still make progress.
+    - sjf: cheapest jobs first
+    - fair_share: cheapest jobs first, but taking turns between Expert Databases (litscan_database.name).
+      Databases with a higher weight get proportionally more turns.
     :param engine: params to connect to the db
+    :param policy: an option from SCHEDULING_POLICY_CHOICES
+    :param aging_factor: how much the cost of a job decreases for every hour it spends in the queue
+    :param default_cost: cost used for jobs that have not been estimated yet
+    :param weights: dict with the weight of each Expert Database, used by the fair_share policy
+    :param limit: number of jobs to return (we have 10 consumers)
     :return: sorted list of jobs
     """
     try:
         async with engine.acquire() as connection:
             try:
-                query = (sa.select([Job.c.display_id, Job.c.status, Job.c.submitted])
+                output = []
+
+                if policy == SCHEDULING_POLICY_CHOICES.fifo:
+                    query = (sa.select([Job.c.display_id, Job.c.status, Job.c.submitted])
+                             .select_from(Job)
+                             .where(Job.c.status == JOB_STATUS_CHOICES.pending)
+                             .order_by(Job.c.submitted)
+                             .limit(limit))
+
+                    async for row in connection.execute(query):
+                        output.append((row.display_id, row.submitted))
+
+                    return output
+
+                query = sa.text('''
+                    SELECT j.display_id, j.submitted, COALESCE(d.name, '') AS name,
+                      COALESCE(j.estimated_hit_count, :default_cost) / (1 + :aging_factor * w.hours) AS cost
+                    FROM litscan_job j
+                    CROSS JOIN LATERAL (
+                      SELECT EXTRACT(EPOCH FROM LOCALTIMESTAMP - COALESCE(j.submitted, LOCALTIMESTAMP)) / 3600 AS hours
+                    ) w
+                    LEFT JOIN LATERAL (
+                      SELECT name FROM litscan_database WHERE job_id=j.job_id ORDER BY name LIMIT 1
+                    ) d ON TRUE
+                    WHERE j.status=:status
+                    ORDER BY cost, j.submitted
+                    LIMIT :window
+                ''')
+
+                # the fair_share policy needs more candidates than consumers to be able to take turns
+                window = limit if policy == SCHEDULING_POLICY_CHOICES.shortest_job_first else limit * 100
+                candidates = []
+                async for row in connection.execute(
+                        query,
+                        status=JOB_STATUS_CHOICES.pending,
+                        default_cost=default_cost,
+                        aging_factor=aging_factor,
+                        window=window
+                ):
+                    candidates.append((row.display_id, row.submitted, row.name, float(row.cost)))
+
+                if policy == SCHEDULING_POLICY_CHOICES.fair_share:
+                    # the n-th cheapest job of a database is scheduled at "virtual time" n / weight
+                    weights = weights if weights else {}
+                    turns = {}
+                    ranked = []
+                    for display_id, submitted, name, cost in candidates:
+                        turns[name] = turns.get(name, 0) + 1
+                        ranked.append((turns[name] / weights.get(name, 1), cost, display_id, submitted))
+                    ranked.sort(key=lambda item: (item[0], item[1]))
+                    output = [(display_id, submitted) for _, _, display_id, submitted in ranked[:limit]]
+                else:
+                    output = [(display_id, submitted) for display_id, submitted, _, _ in candidates[:limit]]
+
+                return output
+
+            except Exception as e:
+                raise SQLError("Failed to find jobs in find_job_to_run()") from e
+
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError(str(e)) from e
+
+
+async def find_jobs_without_estimate(engine, limit=50):
+    """
+    Find pending jobs whose cost has not been estimated yet
+    :param engine: params to connect to the db
+    :param limit: number of jobs to return
+    :return: list of dicts containing job_id, display_id and query
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                query = (sa.select([Job.c.job_id, Job.c.display_id, Job.c.query])
                          .select_from(Job)
-                         .where(Job.c.status == JOB_STATUS_CHOICES.pending)
+                         .where(Job.c.status == JOB_STATUS_CHOICES.pending, Job.c.estimated_hit_count.is_(None))
                          .order_by(Job.c.submitted)
-                         .limit(10))  # we have 10 consumers
+                         .limit(limit))
 
                 output = []
                 async for row in connection.execute(query):
-                    output.append((row.display_id, row.submitted))
+                    output.append({"job_id": row.job_id, "display_id": row.display_id, "query": row.query})
 
                 return output
 
             except Exception as e:
-                raise SQLError("Failed to find jobs in find_job_to_run()") from e
+                raise SQLError("Failed to find jobs in find_jobs_without_estimate()") from e
 
     except psycopg2.Error as e:
-        raise DatabaseConnectionError(str(e)) from e
+        raise DatabaseConnectionError("Failed to open DB connection in find_jobs_without_estimate()") from e
+
+
+async def save_estimated_hit_count(engine, job_id, estimated_hit_count):
+    """
+    Function to save the number of articles Europe PMC expects to find for a job.
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :param estimated_hit_count: hitCount returned by Europe PMC
+    :return: None
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                query = sa.text('''
+                    UPDATE litscan_job SET estimated_hit_count=:estimated_hit_count WHERE job_id=:job_id
+                ''')
+                await connection.execute(query, job_id=job_id, estimated_hit_count=estimated_hit_count)
+            except Exception as e:
+                raise SQLError("Failed to save_estimated_hit_count, job_id = %s and estimated_hit_count = %s"
+                               % (job_id, estimated_hit_count)) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in save_estimated_hit_count, "
+                                      "job_id = %s" % job_id) from e
 
 
 async def search_performed(engine, value):
@@ -67,7 +176,8 @@ async def search_performed(engine, value):
 
 async def delete_job_data(engine, job_id):
     """
-    Delete job_id data
+    Delete job_id data. Sentences and results are deleted with a filter on job_id (instead of
+    the cascade of each row), so that only the partition of the job is read when the tables are partitioned.
     :param engine: params to connect to the db
     :param job_id: job to be deleted
     :return: None
@@ -75,8 +185,17 @@ async def delete_job_data(engine, job_id):
     try:
         async with engine.acquire() as connection:
             try:
-                sql_query = sa.text('''DELETE FROM litscan_job WHERE job_id=:job_id''')
-                await connection.execute(sql_query, job_id=job_id.lower())
+                async with connection.begin():
+                    for table in ['litscan_abstract_sentence', 'litscan_body_sentence']:
+                        sql_query = sa.text('''
+                            DELETE FROM %s
+                            WHERE job_id=:job_id AND result_id IN (SELECT id FROM litscan_result WHERE job_id=:job_id)
+                        ''' % table)
+                        await connection.execute(sql_query, job_id=job_id.lower())
+                    sql_query = sa.text('''DELETE FROM litscan_result WHERE job_id=:job_id''')
+                    await connection.execute(sql_query, job_id=job_id.lower())
+                    sql_query = sa.text('''DELETE FROM litscan_job WHERE job_id=:job_id''')
+                    await connection.execute(sql_query, job_id=job_id.lower())
             except Exception as e:
                 raise SQLError("Failed to delete job_id = %s" % job_id) from e
     except psycopg2.Error as e:
@@ -198,6 +317,58 @@ async def get_jobs(engine):
         raise DatabaseConnectionError("Failed to open DB connection in get_jobs()") from e
 
 
+# the jobs of the list are read with the primary key, and the jobs of the database with the (name, ...) index of
+# litscan_database. An OR of both conditions would be run as a filter over all the rows of litscan_job
+JOBS_STATUS_QUERY = '''
+    SELECT job_id, display_id, status, hit_count, submitted, finished
+    FROM litscan_job
+    WHERE job_id = ANY(CAST(:job_ids AS TEXT[]))
+    UNION
+    SELECT j.job_id, j.display_id, j.status, j.hit_count, j.submitted, j.finished
+    FROM litscan_database d
+    JOIN litscan_job j ON j.job_id=d.job_id
+    WHERE d.name=:database
+    UNION
+    SELECT j.job_id, j.display_id, j.status, j.hit_count, j.submitted, j.finished
+    FROM litscan_database d
+    JOIN litscan_job j ON j.job_id=d.primary_id
+    WHERE d.name=:database
+    ORDER BY job_id
+'''
+
+
+async def get_jobs_status(engine, job_ids=None, database=None):
+    """
+    Function to get the status of many jobs at once (see JOBS_STATUS_QUERY)
+    :param engine: params to connect to the db
+    :param job_ids: list of ids
+    :param database: name of the Expert Database, to get all its jobs (job_id or primary_id)
+    :return: list of dicts with job_id, display_id, status, hit_count, submitted and finished
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                jobs = []
+                async for row in connection.execute(
+                        sa.text(JOBS_STATUS_QUERY),
+                        job_ids=[job_id.lower() for job_id in job_ids] if job_ids else None,
+                        database=database.lower() if database else None
+                ):
+                    jobs.append({
+                        "job_id": row.job_id,
+                        "display_id": row.display_id,
+                        "status": row.status,
+                        "hit_count": row.hit_count,
+                        "submitted": row.submitted.isoformat() if row.submitted else None,
+                        "finished": row.finished.isoformat() if row.finished else None,
+                    })
+                return jobs
+            except Exception as e:
+                raise SQLError("Failed to get the status of jobs, database = %s" % database) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in get_jobs_status()") from e
+
+
 async def get_search_date(engine, job_id):
     """
     Function to get the date of the search
@@ -258,3 +429,53 @@ async def get_query_and_limit(engine, job_id):
                 raise SQLError("Failed to get query") from e
     except psycopg2.Error as e:
         raise DatabaseConnectionError("Failed to open DB connection in get_query()") from e
+
+
+async def save_checkpoint(engine, job_id, cursor_mark, index, examined=None):
+    """
+    Save the progress of a job, so that it can be resumed if the consumer is restarted
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :param cursor_mark: Europe PMC page being processed (None clears the checkpoint)
+    :param index: index of the next article of this page
+    :param examined: number of articles of the previous pages, counted against the search_limit of the job
+    :return: None
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                query = sa.text('''
+                    UPDATE litscan_job SET cursor_mark=:cursor_mark, checkpoint=:index, examined=:examined
+                    WHERE job_id=:job_id
+                ''')
+                await connection.execute(query, job_id=job_id, cursor_mark=cursor_mark, index=index, examined=examined)
+            except Exception as e:
+                raise SQLError("Failed to save_checkpoint, job_id = %s" % job_id) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in save_checkpoint, job_id = %s" % job_id) from e
+
+
+async def get_checkpoint(engine, job_id):
+    """
+    Function to get the progress of a job
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :return: cursor_mark (or None if the job has not started yet), index of the next article
+    and number of articles of the previous pages
+    """
+    try:
+        async with engine.acquire() as connection:
+            query = (sa.select([Job.c.cursor_mark, Job.c.checkpoint, Job.c.examined])
+                     .select_from(Job)
+                     .where(Job.c.job_id == job_id))
+            try:
+                cursor_mark, index, examined = None, 0, 0
+                async for row in connection.execute(query):
+                    cursor_mark = row.cursor_mark
+                    index = row.checkpoint if row.checkpoint else 0
+                    examined = row.examined if row.examined else 0
+                return cursor_mark, index, examined
+            except Exception as e:
+                raise SQLError("Failed to get checkpoint") from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in get_checkpoint()") from e
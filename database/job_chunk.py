@@ -0,0 +1,234 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import datetime
+import json
+import psycopg2
+import sqlalchemy as sa
+
+from database import DatabaseConnectionError, SQLError
+from database.models import Job, JobChunk, JOB_STATUS_CHOICES
+
+
+async def save_job_chunks(engine, job_id, chunks):
+    """
+    Split a job into chunks that can be processed by any consumer
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :param chunks: list of lists of dicts containing pmcid and cited_by
+    :return: None
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                query = sa.text('''
+                    INSERT INTO litscan_job_chunk(job_id, chunk, articles, status)
+                    VALUES (:job_id, :chunk, CAST(:articles AS JSONB), :status)
+                    ON CONFLICT (job_id, chunk) DO NOTHING
+                ''')
+                for index, articles in enumerate(chunks):
+                    await connection.execute(
+                        query,
+                        job_id=job_id,
+                        chunk=index,
+                        articles=json.dumps(articles),
+                        status=JOB_STATUS_CHOICES.pending
+                    )
+            except Exception as e:
+                raise SQLError("Failed to save chunks for job_id = %s" % job_id) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in save_job_chunks, job_id = %s" % job_id) from e
+
+
+async def find_chunk_to_run(engine, limit=10):
+    """
+    Find chunks that need to be delivered to consumers for processing
+    :param engine: params to connect to the db
+    :param limit: number of chunks to return
+    :return: list of (display_id, chunk)
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                query = (sa.select([Job.c.display_id, JobChunk.c.chunk])
+                         .select_from(JobChunk.join(Job, Job.c.job_id == JobChunk.c.job_id))
+                         .where(JobChunk.c.status == JOB_STATUS_CHOICES.pending)
+                         .order_by(JobChunk.c.id)
+                         .limit(limit))
+
+                output = []
+                async for row in connection.execute(query):
+                    output.append((row.display_id, row.chunk))
+
+                return output
+
+            except Exception as e:
+                raise SQLError("Failed to find chunks in find_chunk_to_run()") from e
+
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in find_chunk_to_run()") from e
+
+
+async def get_job_chunk(engine, job_id, chunk):
+    """
+    Get the articles of a chunk
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :param chunk: number of the chunk
+    :return: list of dicts containing pmcid and cited_by
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                query = (sa.select([JobChunk.c.articles])
+                         .select_from(JobChunk)
+                         .where(JobChunk.c.job_id == job_id, JobChunk.c.chunk == chunk))
+
+                articles = []
+                async for row in connection.execute(query):
+                    articles = row.articles
+
+                return articles
+
+            except Exception as e:
+                raise SQLError("Failed to get chunk %s of job_id = %s" % (chunk, job_id)) from e
+
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in get_job_chunk, job_id = %s" % job_id) from e
+
+
+async def set_chunk_status(engine, job_id, chunk, status, consumer_ip=None):
+    """
+    Change the status of a chunk and register which consumer is running it
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :param chunk: number of the chunk
+    :param status: an option from JOB_STATUS_CHOICES
+    :param consumer_ip: consumer IP address
+    :return: None
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                query = sa.text('''
+                    UPDATE litscan_job_chunk
+                    SET status=:status, consumer=:consumer_ip
+                    WHERE job_id=:job_id AND chunk=:chunk
+                ''')
+                await connection.execute(query, job_id=job_id, chunk=chunk, status=status, consumer_ip=consumer_ip)
+            except Exception as e:
+                raise SQLError("Failed to set_chunk_status, job_id = %s, chunk = %s, status = %s"
+                               % (job_id, chunk, status)) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in set_chunk_status, job_id = %s" % job_id) from e
+
+
+async def finish_job_chunk(engine, job_id, chunk):
+    """
+    Mark a chunk as done. The consumer that finishes the last chunk of a job also finishes
+    the job: the chunks are deleted and the job gets its hit_count and status.
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :param chunk: number of the chunk
+    :return: True if this was the last chunk of the job
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                query = sa.text('''
+                    UPDATE litscan_job_chunk SET status=:status, consumer=NULL
+                    WHERE job_id=:job_id AND chunk=:chunk
+                ''')
+                await connection.execute(query, job_id=job_id, chunk=chunk, status=JOB_STATUS_CHOICES.success)
+
+                # when two chunks finish at the same time, only one of them is able to delete the rows
+                query = sa.text('''
+                    WITH done AS (
+                      DELETE FROM litscan_job_chunk
+                      WHERE job_id=:job_id AND NOT EXISTS (
+                        SELECT 1 FROM litscan_job_chunk WHERE job_id=:job_id AND status<>:status
+                      )
+                      RETURNING job_id
+                    )
+                    UPDATE litscan_job
+                    SET status=:status, finished=:finished,
+                      hit_count=(SELECT COUNT(*) FROM litscan_result WHERE job_id=:job_id)
+                    WHERE job_id=:job_id AND EXISTS (SELECT 1 FROM done)
+                    RETURNING job_id
+                ''')
+
+                async for row in connection.execute(
+                        query,
+                        job_id=job_id,
+                        status=JOB_STATUS_CHOICES.success,
+                        finished=datetime.datetime.now()
+                ):
+                    return True
+
+                return False
+
+            except Exception as e:
+                raise SQLError("Failed to finish chunk %s of job_id = %s" % (chunk, job_id)) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in finish_job_chunk, job_id = %s" % job_id) from e
+
+
+async def save_chunk_checkpoint(engine, job_id, chunk, index):
+    """
+    Save the progress of a chunk, so that it can be resumed if the consumer is restarted
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :param chunk: number of the chunk
+    :param index: index of the next article to process
+    :return: None
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                query = sa.text('''
+                    UPDATE litscan_job_chunk SET checkpoint=:index WHERE job_id=:job_id AND chunk=:chunk
+                ''')
+                await connection.execute(query, job_id=job_id, chunk=chunk, index=index)
+            except Exception as e:
+                raise SQLError("Failed to save checkpoint of chunk %s of job_id = %s" % (chunk, job_id)) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in save_chunk_checkpoint, "
+                                      "job_id = %s" % job_id) from e
+
+
+async def get_chunk_checkpoint(engine, job_id, chunk):
+    """
+    Get the progress of a chunk
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :param chunk: number of the chunk
+    :return: index of the next article to process
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                query = (sa.select([JobChunk.c.checkpoint])
+                         .select_from(JobChunk)
+                         .where(JobChunk.c.job_id == job_id, JobChunk.c.chunk == chunk))
+
+                index = 0
+                async for row in connection.execute(query):
+                    index = row.checkpoint if row.checkpoint else 0
+
+                return index
+
+            except Exception as e:
+                raise SQLError("Failed to get checkpoint of chunk %s of job_id = %s" % (chunk, job_id)) from e
+
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in get_chunk_checkpoint, "
+                                      "job_id = %s" % job_id) from e
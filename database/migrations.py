@@ -0,0 +1,326 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import logging
+import psycopg2
+import sqlalchemy as sa
+
+from collections import namedtuple
+
+from database import DatabaseConnectionError, SQLError
+
+# Versioned, non-destructive migrations. Each migration is applied once and recorded in litscan_schema_version.
+# Statements must be idempotent (IF NOT EXISTS), so that a migration interrupted halfway can be applied again.
+# Unlike database.models.migrate, these migrations never drop anything and can run on a production database.
+Migration = namedtuple('Migration', ['version', 'description', 'statements'])
+
+"""Index built by a migration, with CREATE INDEX CONCURRENTLY if requested"""
+Index = namedtuple('Index', ['name', 'table', 'columns', 'method'], defaults=['btree'])
+
+# lock used to avoid two producers applying the same migrations at the same time
+MIGRATION_LOCK = 20090101
+
+MIGRATIONS = [
+    # each feature that changes the schema adds its own migration, so that a database created before it
+    # can run its code. Columns and tables are also added to database/models.py and database/scripts/init.sh
+    Migration(1, 'Estimated number of articles of each job', [
+        'ALTER TABLE litscan_job ADD COLUMN IF NOT EXISTS estimated_hit_count INTEGER',
+    ]),
+    Migration(2, 'Chunks of jobs with many articles', [
+        '''
+        CREATE TABLE IF NOT EXISTS litscan_job_chunk (
+          id SERIAL PRIMARY KEY,
+          job_id VARCHAR(100),
+          chunk INTEGER,
+          articles JSONB,
+          status VARCHAR(10),
+          consumer VARCHAR(20),
+          FOREIGN KEY (job_id) REFERENCES litscan_job(job_id) ON UPDATE CASCADE ON DELETE CASCADE,
+          CONSTRAINT job_chunk UNIQUE (job_id, chunk))
+        ''',
+    ]),
+    Migration(3, 'Checkpoints of jobs and chunks', [
+        'ALTER TABLE litscan_job ADD COLUMN IF NOT EXISTS cursor_mark TEXT',
+        'ALTER TABLE litscan_job ADD COLUMN IF NOT EXISTS checkpoint INTEGER',
+        'ALTER TABLE litscan_job_chunk ADD COLUMN IF NOT EXISTS checkpoint INTEGER',
+    ]),
+    Migration(4, 'Consumer heartbeats', [
+        'ALTER TABLE litscan_consumer ADD COLUMN IF NOT EXISTS heartbeat TIMESTAMP',
+        'ALTER TABLE litscan_consumer ADD COLUMN IF NOT EXISTS progress INTEGER',
+    ]),
+    Migration(5, 'Text of the articles', [
+        '''
+        CREATE TABLE IF NOT EXISTS litscan_article_text (
+          pmcid VARCHAR(15) PRIMARY KEY,
+          content BYTEA)
+        ''',
+    ]),
+    Migration(6, 'Version of the classifier of each article', [
+        'ALTER TABLE litscan_article ADD COLUMN IF NOT EXISTS model_version VARCHAR(64)',
+    ]),
+    Migration(7, 'Tables missing from databases created with init.sh', [
+        '''
+        CREATE TABLE IF NOT EXISTS litscan_organism (
+          id SERIAL PRIMARY KEY,
+          pmcid VARCHAR(15),
+          organism INTEGER,
+          FOREIGN KEY (pmcid) REFERENCES litscan_article(pmcid) ON UPDATE CASCADE ON DELETE CASCADE,
+          CONSTRAINT pmcid_organism UNIQUE (pmcid, organism))
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS litscan_manually_annotated (
+          id SERIAL PRIMARY KEY,
+          pmcid VARCHAR(15),
+          urs VARCHAR(100),
+          FOREIGN KEY (pmcid) REFERENCES litscan_article(pmcid) ON UPDATE CASCADE ON DELETE CASCADE,
+          FOREIGN KEY (urs) REFERENCES litscan_job(job_id) ON UPDATE CASCADE ON DELETE CASCADE)
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS litscan_load_organism (
+          id SERIAL PRIMARY KEY,
+          pmid VARCHAR(100),
+          organism INTEGER,
+          CONSTRAINT pmid_organism UNIQUE (pmid, organism))
+        ''',
+    ]),
+    # litscan_result (pmcid, job_id), litscan_database (name, job_id, primary_id) and
+    # litscan_load_organism (pmid, organism) already have unique constraints that index the first column
+    Migration(8, 'Indexes used by the main queries', [
+        Index('litscan_result_job_id_idx', 'litscan_result', 'job_id'),
+        Index('litscan_abstract_sentence_result_id_idx', 'litscan_abstract_sentence', 'result_id'),
+        Index('litscan_body_sentence_result_id_idx', 'litscan_body_sentence', 'result_id'),
+        Index('litscan_database_job_id_idx', 'litscan_database', 'job_id'),
+        Index('litscan_database_primary_id_idx', 'litscan_database', 'primary_id'),
+        Index('litscan_job_status_submitted_idx', 'litscan_job', 'status, submitted'),
+        Index('litscan_job_chunk_status_idx', 'litscan_job_chunk', 'status'),
+        Index('litscan_manually_annotated_urs_idx', 'litscan_manually_annotated', 'urs'),
+        Index('litscan_manually_annotated_pmcid_idx', 'litscan_manually_annotated', 'pmcid'),
+    ]),
+    # sentences saved before this migration keep their text in litscan_abstract_sentence and litscan_body_sentence
+    # until they are moved with `python3 -m database.sentences`
+    Migration(9, 'Sentences shared by all jobs', [
+        '''
+        CREATE TABLE IF NOT EXISTS litscan_sentence (
+          id SERIAL PRIMARY KEY,
+          hash UUID NOT NULL,
+          sentence TEXT,
+          CONSTRAINT sentence_hash UNIQUE (hash))
+        ''',
+        '''ALTER TABLE litscan_abstract_sentence
+           ADD COLUMN IF NOT EXISTS sentence_id INTEGER REFERENCES litscan_sentence(id)''',
+        'ALTER TABLE litscan_abstract_sentence ADD COLUMN IF NOT EXISTS match_start INTEGER',
+        'ALTER TABLE litscan_abstract_sentence ADD COLUMN IF NOT EXISTS match_end INTEGER',
+        '''ALTER TABLE litscan_body_sentence
+           ADD COLUMN IF NOT EXISTS sentence_id INTEGER REFERENCES litscan_sentence(id)''',
+        'ALTER TABLE litscan_body_sentence ADD COLUMN IF NOT EXISTS match_start INTEGER',
+        'ALTER TABLE litscan_body_sentence ADD COLUMN IF NOT EXISTS match_end INTEGER',
+        Index('litscan_abstract_sentence_sentence_id_idx', 'litscan_abstract_sentence', 'sentence_id'),
+        Index('litscan_body_sentence_sentence_id_idx', 'litscan_body_sentence', 'sentence_id'),
+    ]),
+    # sentence tables also need the job_id to be partitioned like litscan_result (see database/partitions.py)
+    Migration(10, 'Job of each sentence', [
+        'ALTER TABLE litscan_abstract_sentence ADD COLUMN IF NOT EXISTS job_id VARCHAR(100)',
+        'ALTER TABLE litscan_body_sentence ADD COLUMN IF NOT EXISTS job_id VARCHAR(100)',
+        # sentences saved before this migration take the job_id of their result
+        '''
+        UPDATE litscan_abstract_sentence s SET job_id=r.job_id
+        FROM litscan_result r WHERE r.id=s.result_id AND s.job_id IS NULL
+        ''',
+        '''
+        UPDATE litscan_body_sentence s SET job_id=r.job_id
+        FROM litscan_result r WHERE r.id=s.result_id AND s.job_id IS NULL
+        ''',
+    ]),
+    # sentences saved before migration 9 are only searchable after `python3 -m database.sentences`
+    Migration(11, 'Full-text search of sentences', [
+        '''
+        ALTER TABLE litscan_sentence ADD COLUMN IF NOT EXISTS tsv TSVECTOR
+          GENERATED ALWAYS AS (to_tsvector('english', COALESCE(sentence, ''))) STORED
+        ''',
+        Index('litscan_sentence_tsv_idx', 'litscan_sentence', 'tsv', 'gin'),
+    ]),
+    # jobs that finished before this migration have no stats until `python3 -m database.stats`
+    Migration(12, 'Number of results of each job by year', [
+        '''
+        CREATE TABLE IF NOT EXISTS litscan_stats (
+          job_id VARCHAR(100),
+          year INTEGER,
+          hits INTEGER,
+          rna_related INTEGER,
+          retracted INTEGER,
+          PRIMARY KEY (job_id, year),
+          FOREIGN KEY (job_id) REFERENCES litscan_job(job_id) ON UPDATE CASCADE ON DELETE CASCADE)
+        ''',
+    ]),
+    Migration(13, 'Articles examined by each job before its checkpoint', [
+        'ALTER TABLE litscan_job ADD COLUMN IF NOT EXISTS examined INTEGER',
+    ]),
+]
+
+
+async def index_is_valid(connection, name):
+    """
+    Check if an index exists and can be used
+    :param connection: db connection
+    :param name: name of the index
+    :return: True if the index is valid, False if it is invalid (e.g. a CREATE INDEX CONCURRENTLY that failed)
+    and None if it does not exist
+    """
+    query = sa.text('''
+        SELECT pg_index.indisvalid FROM pg_index JOIN pg_class ON pg_class.oid=pg_index.indexrelid
+        WHERE pg_class.relname=:name
+    ''')
+    async for row in connection.execute(query, name=name):
+        return row.indisvalid
+    return None
+
+
+async def partitions_of(connection, table):
+    """
+    Partitions of a table (see database/partitions.py) or of a partitioned index
+    :param connection: db connection
+    :param table: name of the table or index
+    :return: list of names (empty if the table is not partitioned)
+    """
+    query = sa.text('''
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid=pg_inherits.inhparent
+        JOIN pg_class child ON child.oid=pg_inherits.inhrelid
+        WHERE parent.relname=:table AND parent.relkind IN ('p', 'I')
+        ORDER BY child.relname
+    ''')
+    return [row.relname async for row in connection.execute(query, table=table)]
+
+
+async def create_index(connection, index, concurrently):
+    """
+    Create an index. A CREATE INDEX CONCURRENTLY that failed leaves an invalid index
+    behind, which is dropped first so that IF NOT EXISTS does not skip it.
+    CREATE INDEX CONCURRENTLY cannot be used on a partitioned table, so the index is created on the
+    table only (ON ONLY, which is invalid until all partitions have their index), then concurrently
+    on each partition and attached to the index of the table.
+    :param connection: db connection
+    :param index: Index object
+    :param concurrently: whether to build the index without locking writes to the table
+    :return: None
+    """
+    partitions = await partitions_of(connection, index.table) if concurrently else []
+    if not partitions:
+        if await index_is_valid(connection, index.name) is False:
+            await connection.execute(
+                'DROP INDEX %s IF EXISTS %s' % ('CONCURRENTLY' if concurrently else '', index.name)
+            )
+
+        await connection.execute('CREATE INDEX %s IF NOT EXISTS %s ON %s USING %s (%s)' % (
+            'CONCURRENTLY' if concurrently else '', index.name, index.table, index.method, index.columns
+        ))
+        return
+
+    if await index_is_valid(connection, index.name):
+        return
+
+    await connection.execute('CREATE INDEX IF NOT EXISTS %s ON ONLY %s USING %s (%s)' % (
+        index.name, index.table, index.method, index.columns
+    ))
+    for partition in partitions:
+        # e.g. litscan_result_job_id_idx -> litscan_result_p0_job_id_idx
+        name = index.name.replace(index.table, partition, 1) if index.name.startswith(index.table) \
+            else '%s_%s' % (partition, index.name)
+        if await index_is_valid(connection, name) is False:
+            await connection.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % name)
+        await connection.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON %s USING %s (%s)' % (
+            name, partition, index.method, index.columns
+        ))
+
+        query = sa.text('''
+            SELECT 1 FROM pg_inherits JOIN pg_class ON pg_class.oid=pg_inherits.inhrelid WHERE pg_class.relname=:name
+        ''')
+        if not [row async for row in connection.execute(query, name=name)]:
+            await connection.execute('ALTER INDEX %s ATTACH PARTITION %s' % (index.name, name))
+
+
+async def upgrade(engine, concurrently=False):
+    """
+    Apply the migrations that are not recorded in litscan_schema_version yet.
+    Connections from aiopg are in autocommit mode, so CREATE INDEX CONCURRENTLY can be used.
+    :param engine: params to connect to the db
+    :param concurrently: build indexes with CREATE INDEX CONCURRENTLY (use it in production)
+    :return: list of versions applied
+    """
+    applied = []
+    try:
+        async with engine.acquire() as connection:
+            try:
+                # index builds can take longer than STATEMENT_TIMEOUT
+                await connection.execute('SET statement_timeout = 0')
+                await connection.execute(sa.text('SELECT pg_advisory_lock(:key)'), key=MIGRATION_LOCK)
+                try:
+                    await connection.execute('''
+                        CREATE TABLE IF NOT EXISTS litscan_schema_version (
+                          version INTEGER PRIMARY KEY,
+                          description TEXT,
+                          applied TIMESTAMP)
+                    ''')
+
+                    versions = set()
+                    async for row in connection.execute('SELECT version FROM litscan_schema_version'):
+                        versions.add(row.version)
+
+                    for migration in MIGRATIONS:
+                        if migration.version in versions:
+                            continue
+
+                        logging.info("Applying migration %s: %s" % (migration.version, migration.description))
+                        for statement in migration.statements:
+                            if isinstance(statement, Index):
+                                await create_index(connection, statement, concurrently)
+                            else:
+                                await connection.execute(statement)
+
+                        await connection.execute(
+                            sa.text('''
+                                INSERT INTO litscan_schema_version(version, description, applied)
+                                VALUES (:version, :description, LOCALTIMESTAMP)
+                            '''),
+                            version=migration.version,
+                            description=migration.description
+                        )
+                        applied.append(migration.version)
+                finally:
+                    await connection.execute(sa.text('SELECT pg_advisory_unlock(:key)'), key=MIGRATION_LOCK)
+                    await connection.execute('RESET statement_timeout')
+
+                return applied
+
+            except Exception as e:
+                raise SQLError("Failed to apply migrations, applied so far: %s" % applied) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in upgrade()") from e
+
+
+async def schema_version(engine):
+    """
+    Get the latest migration applied to the database
+    :param engine: params to connect to the db
+    :return: version number (0 if no migration was applied)
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                version = 0
+                async for row in connection.execute('SELECT MAX(version) AS version FROM litscan_schema_version'):
+                    version = row.version or 0
+                return version
+            except Exception as e:
+                raise SQLError("Failed to get the schema version") from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in schema_version()") from e
@@ -14,7 +14,9 @@ limitations under the License.
 import logging
 import sqlalchemy as sa
 from aiopg.sa import create_engine
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, UUID
 
+from .pool import InstrumentedEngine
 from .settings import get_postgres_credentials
 
 
@@ -28,14 +30,36 @@ async def init_pg(app):
     logger.debug("POSTGRES_HOST = %s" % app['settings'].POSTGRES_HOST)
     logger.debug("POSTGRES_PORT = %s" % app['settings'].POSTGRES_PORT)
 
-    app['engine'] = await create_engine(
+    # aiopg (default) or asyncpg, which keeps a cache of prepared statements on each connection
+    driver = getattr(app['settings'], 'DATABASE_DRIVER', 'aiopg')
+    minsize = getattr(app['settings'], 'POOL_MINSIZE', 1)
+    maxsize = getattr(app['settings'], 'POOL_MAXSIZE', 10)
+    statement_timeout = getattr(app['settings'], 'STATEMENT_TIMEOUT', 0)
+    logger.debug("DATABASE_DRIVER = %s" % driver)
+    logger.debug("POOL_MINSIZE = %s, POOL_MAXSIZE = %s" % (minsize, maxsize))
+
+    # statements running for longer than STATEMENT_TIMEOUT milliseconds are cancelled by the server (0 disables it)
+    if driver == 'asyncpg':
+        from .asyncpg_engine import create_engine as connect
+        connection_options = {'server_settings': {'statement_timeout': str(statement_timeout)}}
+    else:
+        connect = create_engine
+        connection_options = {'options': '-c statement_timeout=%d' % statement_timeout}
+
+    engine = await connect(
         user=app['settings'].POSTGRES_USER,
         password=app['settings'].POSTGRES_PASSWORD,
         database=app['settings'].POSTGRES_DATABASE,
         host=app['settings'].POSTGRES_HOST,
-        port=app['settings'].POSTGRES_PORT
+        port=app['settings'].POSTGRES_PORT,
+        minsize=minsize,
+        maxsize=maxsize,
+        **connection_options
     )
 
+    # callers waiting for more than ACQUIRE_TIMEOUT seconds get a DatabaseConnectionError instead of hanging
+    app['engine'] = InstrumentedEngine(engine, acquire_timeout=getattr(app['settings'], 'ACQUIRE_TIMEOUT', None))
+
 
 # Graceful shutdown
 # -----------------
@@ -59,6 +83,13 @@ class CONSUMER_STATUS_CHOICES(object):
     available = 'available'
     busy = 'busy'
     error = 'error'
+    dead = 'dead'  # stopped sending heartbeats
+
+
+class SCHEDULING_POLICY_CHOICES(object):
+    fifo = 'fifo'
+    shortest_job_first = 'sjf'
+    fair_share = 'fair_share'
 
 
 metadata = sa.MetaData()
@@ -70,7 +101,9 @@ Consumer = sa.Table(
     sa.Column('ip', sa.String(20), primary_key=True),
     sa.Column('status', sa.String(10)),  # choices=CONSUMER_STATUS_CHOICES, default='available'
     sa.Column('job_id', sa.ForeignKey('job.job_id')),
-    sa.Column('port', sa.String(5))
+    sa.Column('port', sa.String(5)),
+    sa.Column('heartbeat', sa.DateTime, nullable=True),  # last time the consumer reported it was alive
+    sa.Column('progress', sa.Integer, nullable=True),  # number of articles processed in the current job
 )
 
 """Metadata of a search job"""
@@ -85,6 +118,23 @@ Job = sa.Table(
     sa.Column('submitted', sa.DateTime),
     sa.Column('finished', sa.DateTime, nullable=True),
     sa.Column('hit_count', sa.Integer, nullable=True),
+    sa.Column('estimated_hit_count', sa.Integer, nullable=True),
+    sa.Column('cursor_mark', sa.Text, nullable=True),  # Europe PMC page being processed
+    sa.Column('checkpoint', sa.Integer, nullable=True),  # index of the next article of this page
+    sa.Column('examined', sa.Integer, nullable=True),  # number of articles of the previous pages
+)
+
+"""Part of a job that can be processed by any consumer (used to split jobs with many articles)"""
+JobChunk = sa.Table(
+    'litscan_job_chunk',
+    metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('job_id', sa.String(100), sa.ForeignKey('job.job_id')),
+    sa.Column('chunk', sa.Integer),
+    sa.Column('articles', JSONB),  # list of dicts containing pmcid and cited_by
+    sa.Column('status', sa.String(10)),  # choices=JOB_STATUS_CHOICES
+    sa.Column('consumer', sa.String(20), nullable=True),
+    sa.Column('checkpoint', sa.Integer, nullable=True),  # index of the next article to process
 )
 
 """Info about a specific article"""
@@ -105,6 +155,15 @@ Article = sa.Table(
     sa.Column('rna_related', sa.Boolean),
     sa.Column('probability', sa.Float),
     sa.Column('type', sa.String(100)),
+    sa.Column('model_version', sa.String(64)),  # version of the classifier that set rna_related and probability
+)
+
+"""Text of an article (zlib-compressed JSON with the text, title, abstract, paragraphs of each section and metadata)"""
+ArticleText = sa.Table(
+    'litscan_article_text',
+    metadata,
+    sa.Column('pmcid', sa.String(15), primary_key=True),
+    sa.Column('content', sa.LargeBinary),
 )
 
 """Organisms identified in the article"""
@@ -128,23 +187,41 @@ Result = sa.Table(
     sa.Column('id_in_body', sa.Boolean),
 )
 
-"""Sentences extracted from the abstract"""
+"""Text of the sentences, saved once no matter how many jobs find them (hash is the md5 of the sentence)"""
+Sentence = sa.Table(
+    'litscan_sentence',
+    metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('hash', UUID),
+    sa.Column('sentence', sa.Text),
+    sa.Column('tsv', TSVECTOR),  # generated from sentence, used by the full-text search
+)
+
+"""Sentences extracted from the abstract (sentence is only used by rows saved before litscan_sentence existed)"""
 AbstractSentence = sa.Table(
     'litscan_abstract_sentence',
     metadata,
     sa.Column('id', sa.Integer, primary_key=True),
     sa.Column('result_id', sa.Integer, sa.ForeignKey('result.id')),
+    sa.Column('job_id', sa.String(100)),  # same as the result, used to partition the table by job_id
     sa.Column('sentence', sa.Text),
+    sa.Column('sentence_id', sa.Integer, sa.ForeignKey('sentence.id')),
+    sa.Column('match_start', sa.Integer),  # position of the job_id in the sentence
+    sa.Column('match_end', sa.Integer),
 )
 
-"""Sentences extracted from the body"""
+"""Sentences extracted from the body (sentence is only used by rows saved before litscan_sentence existed)"""
 BodySentence = sa.Table(
     'litscan_body_sentence',
     metadata,
     sa.Column('id', sa.Integer, primary_key=True),
     sa.Column('result_id', sa.Integer, sa.ForeignKey('result.id')),
+    sa.Column('job_id', sa.String(100)),  # same as the result, used to partition the table by job_id
     sa.Column('sentence', sa.Text),
     sa.Column('location', sa.Text),
+    sa.Column('sentence_id', sa.Integer, sa.ForeignKey('sentence.id')),
+    sa.Column('match_start', sa.Integer),
+    sa.Column('match_end', sa.Integer),
 )
 
 """Job related to which DB"""
@@ -157,6 +234,17 @@ Database = sa.Table(
     sa.Column('primary_id', sa.String(100), sa.ForeignKey('job.job_id'), nullable=True),
 )
 
+"""Number of results of each job by year of publication, refreshed when the job finishes (year 0 if unknown)"""
+Stats = sa.Table(
+    'litscan_stats',
+    metadata,
+    sa.Column('job_id', sa.String(100), sa.ForeignKey('job.job_id'), primary_key=True),
+    sa.Column('year', sa.Integer, primary_key=True),
+    sa.Column('hits', sa.Integer),
+    sa.Column('rna_related', sa.Integer),
+    sa.Column('retracted', sa.Integer),
+)
+
 """Manually annotated articles"""
 ManuallyAnnotated = sa.Table(
     'litscan_manually_annotated',
@@ -205,14 +293,19 @@ async def migrate(env):
 
     async with engine:
         async with engine.acquire() as connection:
+            await connection.execute('DROP TABLE IF EXISTS litscan_schema_version')
+            await connection.execute('DROP TABLE IF EXISTS litscan_stats')
             await connection.execute('DROP TABLE IF EXISTS litscan_load_organism')
             await connection.execute('DROP TABLE IF EXISTS litscan_organism')
             await connection.execute('DROP TABLE IF EXISTS litscan_body_sentence')
             await connection.execute('DROP TABLE IF EXISTS litscan_abstract_sentence')
+            await connection.execute('DROP TABLE IF EXISTS litscan_sentence')
             await connection.execute('DROP TABLE IF EXISTS litscan_manually_annotated')
             await connection.execute('DROP TABLE IF EXISTS litscan_result')
+            await connection.execute('DROP TABLE IF EXISTS litscan_article_text')
             await connection.execute('DROP TABLE IF EXISTS litscan_article')
             await connection.execute('DROP TABLE IF EXISTS litscan_database')
+            await connection.execute('DROP TABLE IF EXISTS litscan_job_chunk')
             await connection.execute('DROP TABLE IF EXISTS litscan_job')
             await connection.execute('DROP TABLE IF EXISTS litscan_consumer')
 
@@ -221,7 +314,9 @@ async def migrate(env):
                   ip VARCHAR(20) PRIMARY KEY,
                   status VARCHAR(10) NOT NULL,
                   job_id VARCHAR(100),
-                  port VARCHAR(5))
+                  port VARCHAR(5),
+                  heartbeat TIMESTAMP,
+                  progress INTEGER)
             ''')
 
             await connection.execute('''
@@ -233,7 +328,24 @@ async def migrate(env):
                   submitted TIMESTAMP,
                   finished TIMESTAMP,
                   status VARCHAR(10),
-                  hit_count INTEGER)
+                  hit_count INTEGER,
+                  estimated_hit_count INTEGER,
+                  cursor_mark TEXT,
+                  checkpoint INTEGER,
+                  examined INTEGER)
+            ''')
+
+            await connection.execute('''
+                CREATE TABLE litscan_job_chunk (
+                  id SERIAL PRIMARY KEY,
+                  job_id VARCHAR(100),
+                  chunk INTEGER,
+                  articles JSONB,
+                  status VARCHAR(10),
+                  consumer VARCHAR(20),
+                  checkpoint INTEGER,
+                  FOREIGN KEY (job_id) REFERENCES litscan_job(job_id) ON UPDATE CASCADE ON DELETE CASCADE,
+                  CONSTRAINT job_chunk UNIQUE (job_id, chunk))
             ''')
 
             await connection.execute('''
@@ -251,7 +363,14 @@ async def migrate(env):
                   retracted BOOLEAN,
                   rna_related BOOLEAN,
                   probability FLOAT,
-                  type VARCHAR(100))
+                  type VARCHAR(100),
+                  model_version VARCHAR(64))
+            ''')
+
+            await connection.execute('''
+                CREATE TABLE litscan_article_text (
+                  pmcid VARCHAR(15) PRIMARY KEY,
+                  content BYTEA)
             ''')
 
             await connection.execute('''
@@ -276,21 +395,40 @@ async def migrate(env):
                   CONSTRAINT pmcid_job_id UNIQUE (pmcid, job_id))
             ''')
 
+            await connection.execute('''
+                CREATE TABLE litscan_sentence (
+                  id SERIAL PRIMARY KEY,
+                  hash UUID NOT NULL,
+                  sentence TEXT,
+                  tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', COALESCE(sentence, ''))) STORED,
+                  CONSTRAINT sentence_hash UNIQUE (hash))
+            ''')
+
             await connection.execute('''
                 CREATE TABLE litscan_abstract_sentence (
                   id SERIAL PRIMARY KEY,
                   result_id INTEGER,
+                  job_id VARCHAR(100),
                   sentence TEXT,
-                  FOREIGN KEY (result_id) REFERENCES litscan_result(id) ON UPDATE CASCADE ON DELETE CASCADE)
+                  sentence_id INTEGER,
+                  match_start INTEGER,
+                  match_end INTEGER,
+                  FOREIGN KEY (result_id) REFERENCES litscan_result(id) ON UPDATE CASCADE ON DELETE CASCADE,
+                  FOREIGN KEY (sentence_id) REFERENCES litscan_sentence(id))
             ''')
 
             await connection.execute('''
                 CREATE TABLE litscan_body_sentence (
                   id SERIAL PRIMARY KEY,
                   result_id INTEGER,
+                  job_id VARCHAR(100),
                   sentence TEXT,
                   location TEXT,
-                  FOREIGN KEY (result_id) REFERENCES litscan_result(id) ON UPDATE CASCADE ON DELETE CASCADE)
+                  sentence_id INTEGER,
+                  match_start INTEGER,
+                  match_end INTEGER,
+                  FOREIGN KEY (result_id) REFERENCES litscan_result(id) ON UPDATE CASCADE ON DELETE CASCADE,
+                  FOREIGN KEY (sentence_id) REFERENCES litscan_sentence(id))
             ''')
 
             await connection.execute('''
@@ -304,6 +442,17 @@ async def migrate(env):
                   CONSTRAINT name_job UNIQUE (name, job_id, primary_id))
             ''')
 
+            await connection.execute('''
+                CREATE TABLE litscan_stats (
+                  job_id VARCHAR(100),
+                  year INTEGER,
+                  hits INTEGER,
+                  rna_related INTEGER,
+                  retracted INTEGER,
+                  PRIMARY KEY (job_id, year),
+                  FOREIGN KEY (job_id) REFERENCES litscan_job(job_id) ON UPDATE CASCADE ON DELETE CASCADE)
+            ''')
+
             await connection.execute('''
                 CREATE TABLE litscan_manually_annotated (
                   id SERIAL PRIMARY KEY,
@@ -323,7 +472,14 @@ async def migrate(env):
 
             await connection.execute('''CREATE INDEX ON litscan_article (pmcid) WHERE retracted IS FALSE''')
             await connection.execute('''CREATE INDEX ON litscan_result (job_id)''')
+            await connection.execute('''CREATE INDEX ON litscan_job_chunk (status)''')
             await connection.execute('''CREATE INDEX ON litscan_database (job_id)''')
+            await connection.execute('''CREATE INDEX ON litscan_database (primary_id)''')
+            await connection.execute('''CREATE INDEX ON litscan_job (status, submitted)''')
             await connection.execute('''CREATE INDEX ON litscan_manually_annotated (urs)''')
+            await connection.execute('''CREATE INDEX ON litscan_manually_annotated (pmcid)''')
             await connection.execute('''CREATE INDEX ON litscan_abstract_sentence (result_id)''')
             await connection.execute('''CREATE INDEX ON litscan_body_sentence (result_id)''')
+            await connection.execute('''CREATE INDEX ON litscan_abstract_sentence (sentence_id)''')
+            await connection.execute('''CREATE INDEX ON litscan_body_sentence (sentence_id)''')
+            await connection.execute('''CREATE INDEX ON litscan_sentence USING GIN (tsv)''')
@@ -10,12 +10,15 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import argparse
 import logging
+import os
 import psycopg2
 import sqlalchemy as sa
 
-from database import DatabaseConnectionError
+from database import DatabaseConnectionError, SQLError
 from database.models import LoadOrganism, Organism
+from database.settings import get_postgres_credentials
 
 
 async def load_organism(engine, result):
@@ -53,6 +56,82 @@ async def find_pmid_organism(engine, pmid):
         raise DatabaseConnectionError("Failed to open DB connection in find_pmid_organism()") from e
 
 
+async def find_organisms(engine, pmids):
+    """
+    Function to find the organisms of a batch of articles with a single query
+    :param engine: params to connect to the db
+    :param pmids: list of PMIDs
+    :return: dict with the list of organisms of each pmid
+    """
+    query = sa.text('''
+        SELECT pmid, organism FROM litscan_load_organism WHERE pmid = ANY(CAST(:pmids AS VARCHAR[])) ORDER BY id
+    ''')
+    organisms = {pmid: [] for pmid in pmids}
+    try:
+        async with engine.acquire() as connection:
+            try:
+                async for row in connection.execute(query, pmids=list(pmids)):
+                    organisms[row.pmid].append(row.organism)
+                return organisms
+            except Exception as e:
+                raise SQLError("Failed to find organisms in find_organisms()") from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in find_organisms()") from e
+
+
+def copy_organisms(settings, tsv_file):
+    """
+    Bulk load of organisms (one "pmid<TAB>organism" per line) with COPY. The file is streamed into a
+    temporary table and then merged into litscan_load_organism, skipping pairs that are already there.
+    aiopg does not support COPY, so this function uses a regular psycopg2 connection.
+    :param settings: postgres credentials
+    :param tsv_file: file object of the TSV file
+    :return: number of rows inserted
+    """
+    try:
+        connection = psycopg2.connect(
+            user=settings.POSTGRES_USER,
+            password=settings.POSTGRES_PASSWORD,
+            dbname=settings.POSTGRES_DATABASE,
+            host=settings.POSTGRES_HOST,
+            port=settings.POSTGRES_PORT
+        )
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in copy_organisms()") from e
+
+    try:
+        with connection, connection.cursor() as cursor:
+            cursor.execute('''
+                CREATE TEMPORARY TABLE load_organism_copy (pmid VARCHAR(100), organism INTEGER) ON COMMIT DROP
+            ''')
+            cursor.copy_expert("COPY load_organism_copy (pmid, organism) FROM STDIN", tsv_file)
+
+            # lookups by pmid use the index of the (pmid, organism) unique constraint, which is also
+            # needed by ON CONFLICT (it is missing in databases created without the constraint)
+            cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS pmid_organism ON litscan_load_organism (pmid, organism)
+            ''')
+
+            # rows sorted by pmid are inserted close to each other in the (pmid, organism) index
+            cursor.execute('''
+                INSERT INTO litscan_load_organism (pmid, organism)
+                SELECT DISTINCT pmid, organism FROM load_organism_copy WHERE pmid IS NOT NULL ORDER BY pmid
+                ON CONFLICT (pmid, organism) DO NOTHING
+            ''')
+            inserted = cursor.rowcount
+
+        # refresh the statistics after a large load, so that the planner uses the index
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE litscan_load_organism")
+
+        return inserted
+    except psycopg2.Error as e:
+        raise SQLError("Failed to copy organisms in copy_organisms()") from e
+    finally:
+        connection.close()
+
+
 async def save_organism(engine, results):
     """
     Function to save organisms identified in an article
@@ -68,3 +147,13 @@ async def save_organism(engine, results):
                 logging.debug("Failed to save_organism in the database. Error: {}.".format(e))
     except psycopg2.Error as e:
         raise DatabaseConnectionError("Failed to open DB connection in save_organism") from e
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load a TSV file (pmid<TAB>organism) into litscan_load_organism")
+    parser.add_argument("file", help="TSV file without header")
+    args = parser.parse_args()
+
+    with open(args.file) as organism_file:
+        count = copy_organisms(get_postgres_credentials(os.getenv("ENVIRONMENT", "LOCAL")), organism_file)
+    print("{} organisms loaded".format(count))
@@ -0,0 +1,210 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import argparse
+import os
+import psycopg2
+
+from psycopg2 import sql
+
+from database import SQLError
+from database.sentences import connect
+from database.settings import get_postgres_credentials
+
+# Optional hash partitioning of the tables that grow with every job. Results and their sentences of the same
+# job_id are in partitions with the same number, so deleting or rescanning a job only touches one partition
+# of each table. Run `python3 -m database.partitions --partitions 16` while the producer and consumers are stopped.
+PARTITIONED_TABLES = ['litscan_result', 'litscan_abstract_sentence', 'litscan_body_sentence']
+
+COLUMNS = {
+    'litscan_result': '''
+        id INTEGER NOT NULL DEFAULT nextval('litscan_result_id_seq'),
+        pmcid VARCHAR(15),
+        job_id VARCHAR(100) NOT NULL,
+        id_in_title BOOLEAN,
+        id_in_abstract BOOLEAN,
+        id_in_body BOOLEAN,
+        CONSTRAINT litscan_result_partitioned_pkey PRIMARY KEY (id, job_id),
+        CONSTRAINT pmcid_job_id_partitioned UNIQUE (pmcid, job_id),
+        FOREIGN KEY (pmcid) REFERENCES litscan_article(pmcid) ON UPDATE CASCADE ON DELETE CASCADE,
+        FOREIGN KEY (job_id) REFERENCES litscan_job(job_id) ON UPDATE CASCADE ON DELETE CASCADE
+    ''',
+    'litscan_abstract_sentence': '''
+        id INTEGER NOT NULL DEFAULT nextval('litscan_abstract_sentence_id_seq'),
+        result_id INTEGER,
+        job_id VARCHAR(100) NOT NULL,
+        sentence TEXT,
+        sentence_id INTEGER REFERENCES litscan_sentence(id),
+        match_start INTEGER,
+        match_end INTEGER,
+        CONSTRAINT litscan_abstract_sentence_partitioned_pkey PRIMARY KEY (id, job_id),
+        FOREIGN KEY (result_id, job_id) REFERENCES litscan_result_partitioned(id, job_id)
+          ON UPDATE CASCADE ON DELETE CASCADE
+    ''',
+    'litscan_body_sentence': '''
+        id INTEGER NOT NULL DEFAULT nextval('litscan_body_sentence_id_seq'),
+        result_id INTEGER,
+        job_id VARCHAR(100) NOT NULL,
+        sentence TEXT,
+        location TEXT,
+        sentence_id INTEGER REFERENCES litscan_sentence(id),
+        match_start INTEGER,
+        match_end INTEGER,
+        CONSTRAINT litscan_body_sentence_partitioned_pkey PRIMARY KEY (id, job_id),
+        FOREIGN KEY (result_id, job_id) REFERENCES litscan_result_partitioned(id, job_id)
+          ON UPDATE CASCADE ON DELETE CASCADE
+    ''',
+}
+
+# rows of the old tables, with the job_id of the result (results without job_id are not used by any job)
+COPY = {
+    'litscan_result': '''
+        SELECT id, pmcid, job_id, id_in_title, id_in_abstract, id_in_body
+        FROM litscan_result WHERE job_id IS NOT NULL
+    ''',
+    'litscan_abstract_sentence': '''
+        SELECT s.id, s.result_id, r.job_id, s.sentence, s.sentence_id, s.match_start, s.match_end
+        FROM litscan_abstract_sentence s JOIN litscan_result r ON r.id=s.result_id WHERE r.job_id IS NOT NULL
+    ''',
+    'litscan_body_sentence': '''
+        SELECT s.id, s.result_id, r.job_id, s.sentence, s.location, s.sentence_id, s.match_start, s.match_end
+        FROM litscan_body_sentence s JOIN litscan_result r ON r.id=s.result_id WHERE r.job_id IS NOT NULL
+    ''',
+}
+
+INDEXES = [
+    'CREATE INDEX litscan_result_job_id_idx ON litscan_result (job_id)',
+    'CREATE INDEX litscan_abstract_sentence_result_id_idx ON litscan_abstract_sentence (result_id)',
+    'CREATE INDEX litscan_abstract_sentence_sentence_id_idx ON litscan_abstract_sentence (sentence_id)',
+    'CREATE INDEX litscan_body_sentence_result_id_idx ON litscan_body_sentence (result_id)',
+    'CREATE INDEX litscan_body_sentence_sentence_id_idx ON litscan_body_sentence (sentence_id)',
+]
+
+
+def is_partitioned(cursor, table):
+    """
+    Check if a table was already converted by partition_tables
+    :param cursor: psycopg2 cursor
+    :param table: name of the table
+    :return: True if the table is partitioned
+    """
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname=%s AND relkind IN ('r', 'p')", (table,))
+    row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def convert_tables(cursor, partitions):
+    """
+    Copy litscan_result and the sentence tables to tables partitioned by hash of job_id and replace them.
+    It must run in a transaction (see partition_tables)
+    :param cursor: psycopg2 cursor
+    :param partitions: number of partitions of each table
+    :return: None
+    """
+    cursor.execute('LOCK TABLE {} IN ACCESS EXCLUSIVE MODE'.format(', '.join(PARTITIONED_TABLES)))
+
+    for table in PARTITIONED_TABLES:
+        cursor.execute('CREATE TABLE {0}_partitioned ({1}) PARTITION BY HASH (job_id)'.format(table, COLUMNS[table]))
+        for remainder in range(partitions):
+            cursor.execute(
+                'CREATE TABLE {0}_p{1} PARTITION OF {0}_partitioned '
+                'FOR VALUES WITH (MODULUS {2}, REMAINDER {1})'.format(table, remainder, partitions)
+            )
+        cursor.execute('INSERT INTO {0}_partitioned {1}'.format(table, COPY[table]))
+
+    # the sequences of the ids are kept, so that new rows do not reuse ids
+    for table in PARTITIONED_TABLES:
+        cursor.execute('ALTER SEQUENCE {0}_id_seq OWNED BY NONE'.format(table))
+    cursor.execute('DROP TABLE litscan_abstract_sentence, litscan_body_sentence, litscan_result')
+
+    for table in PARTITIONED_TABLES:
+        cursor.execute('ALTER TABLE {0}_partitioned RENAME TO {0}'.format(table))
+        cursor.execute('ALTER TABLE {0} RENAME CONSTRAINT {0}_partitioned_pkey TO {0}_pkey'.format(table))
+        cursor.execute('ALTER SEQUENCE {0}_id_seq OWNED BY {0}.id'.format(table))
+    cursor.execute('ALTER TABLE litscan_result RENAME CONSTRAINT pmcid_job_id_partitioned TO pmcid_job_id')
+
+    for index in INDEXES:
+        cursor.execute(index)
+
+
+def partition_tables(settings, partitions=16):
+    """
+    Replace litscan_result and the sentence tables by tables partitioned by hash of job_id.
+    Everything runs in a single transaction: if anything fails, the old tables are kept.
+    :param settings: postgres credentials returned by get_postgres_credentials
+    :param partitions: number of partitions of each table
+    :return: False if the tables were already partitioned
+    """
+    connection = connect(settings)
+    try:
+        with connection, connection.cursor() as cursor:
+            if is_partitioned(cursor, 'litscan_result'):
+                return False
+            convert_tables(cursor, partitions)
+
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            for table in PARTITIONED_TABLES:
+                cursor.execute('ANALYZE {}'.format(table))
+
+        return True
+    except psycopg2.Error as e:
+        raise SQLError("Failed to partition tables") from e
+    finally:
+        connection.close()
+
+
+def vacuum_partitions(settings, min_dead_tuples=10000):
+    """
+    Vacuum the partitions with more dead rows than min_dead_tuples (e.g. after jobs were rescanned),
+    one partition at a time instead of the whole table
+    :param settings: postgres credentials returned by get_postgres_credentials
+    :param min_dead_tuples: partitions with fewer dead rows are skipped
+    :return: list of partitions vacuumed
+    """
+    connection = connect(settings)
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('''
+                SELECT relname FROM pg_stat_user_tables
+                WHERE relname ~ %s AND n_dead_tup >= %s
+                ORDER BY n_dead_tup DESC
+            ''', ('^({})_p[0-9]+$'.format('|'.join(PARTITIONED_TABLES)), min_dead_tuples))
+            partitions = [row[0] for row in cursor.fetchall()]
+
+            for partition in partitions:
+                cursor.execute(sql.SQL('VACUUM (ANALYZE) {}').format(sql.Identifier(partition)))
+
+        return partitions
+    except psycopg2.Error as e:
+        raise SQLError("Failed to vacuum partitions") from e
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partition litscan_result and the sentence tables by job_id")
+    parser.add_argument("--partitions", type=int, default=0, help="convert the tables to this number of partitions")
+    parser.add_argument("--vacuum", action="store_true", help="vacuum the partitions with many dead rows")
+    parser.add_argument("--min-dead-tuples", type=int, default=10000, help="dead rows needed to vacuum a partition")
+    args = parser.parse_args()
+
+    settings = get_postgres_credentials(os.getenv("ENVIRONMENT", "LOCAL"))
+    if args.partitions:
+        if partition_tables(settings, args.partitions):
+            print("Tables partitioned in {} partitions".format(args.partitions))
+        else:
+            print("Tables are already partitioned")
+    if args.vacuum:
+        for partition in vacuum_partitions(settings, args.min_dead_tuples):
+            print("{} vacuumed".format(partition))
@@ -0,0 +1,156 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import contextlib
+import time
+
+import psycopg2
+from aiohttp import web
+from aiojobs.aiohttp import atomic
+
+
+class _AcquireContext(object):
+    def __init__(self, engine):
+        self._engine = engine
+        self._context = None
+
+    async def __aenter__(self):
+        engine = self._engine
+        self._context = engine.engine.acquire()
+
+        engine.waiting += 1
+        start = time.perf_counter()
+        try:
+            connection = await asyncio.wait_for(self._context.__aenter__(), engine.acquire_timeout)
+        except asyncio.TimeoutError as e:
+            engine.timeouts += 1
+            raise psycopg2.OperationalError(
+                "Timed out after %s seconds waiting for a connection from the pool" % engine.acquire_timeout
+            ) from e
+        finally:
+            engine.waiting -= 1
+            waited = time.perf_counter() - start
+            engine.wait_seconds_total += waited
+            engine.wait_seconds_max = max(engine.wait_seconds_max, waited)
+
+        engine.acquired += 1
+        engine.in_use += 1
+        engine.peak_in_use = max(engine.peak_in_use, engine.in_use)
+        return connection
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._engine.in_use -= 1
+        await self._context.__aexit__(exc_type, exc, tb)
+
+
+class InstrumentedEngine(object):
+    """
+    Wrapper around an aiopg (or asyncpg_engine) engine that limits the time spent waiting
+    for a connection and keeps track of how the pool is used
+    """
+    def __init__(self, engine, acquire_timeout=None):
+        """
+        :param engine: engine returned by create_engine
+        :param acquire_timeout: seconds to wait for a connection before giving up (None waits forever)
+        """
+        self.engine = engine
+        self.acquire_timeout = acquire_timeout
+        self.acquired = 0
+        self.timeouts = 0
+        self.waiting = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def acquire(self):
+        return _AcquireContext(self)
+
+    def metrics(self):
+        """
+        Pool usage since the engine was created
+        :return: dict with the pool size, utilization, acquisitions, timeouts and wait times
+        """
+        maxsize = self.engine.maxsize
+        return {
+            "minsize": self.engine.minsize,
+            "maxsize": maxsize,
+            "size": self.engine.size,
+            "freesize": self.engine.freesize,
+            "in_use": self.in_use,
+            "peak_in_use": self.peak_in_use,
+            "utilization": round(self.in_use / maxsize, 3) if maxsize else 0.0,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "wait_seconds_mean": round(self.wait_seconds_total / self.acquired, 6) if self.acquired else 0.0,
+        }
+
+    def close(self):
+        self.engine.close()
+
+    async def wait_closed(self):
+        await self.engine.wait_closed()
+
+
+class _ConnectionContext(object):
+    def __init__(self, connection):
+        self._connection = connection
+
+    async def __aenter__(self):
+        return self._connection
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+class UnitOfWork(object):
+    """
+    Engine that always returns the same connection, so that the database functions called
+    with it do not go back to the pool. Calls must not run concurrently (e.g. asyncio.gather).
+    """
+    def __init__(self, connection):
+        self.connection = connection
+
+    def acquire(self):
+        return _ConnectionContext(self.connection)
+
+
+@contextlib.asynccontextmanager
+async def unit_of_work(engine):
+    """
+    Acquire a single connection for several calls to the database functions, e.g.
+    async with unit_of_work(engine) as uow:
+        await set_job_status(uow, job_id, status)
+        await save_hit_count(uow, job_id, hit_count)
+    :param engine: params to connect to the db
+    :return: UnitOfWork, used in place of the engine
+    """
+    if isinstance(engine, UnitOfWork):
+        yield engine
+    else:
+        async with engine.acquire() as connection:
+            yield UnitOfWork(connection)
+
+
+@atomic
+async def pool_metrics(request):
+    """
+    Function that returns the usage of the database connection pool (registered by the producer and the consumer)
+    :param request: used to get the engine
+    :return: json object with the pool size, utilization and time spent waiting for connections
+    """
+    return web.json_response(request.app['engine'].metrics())
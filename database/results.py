@@ -13,6 +13,7 @@ limitations under the License.
 import logging
 import psycopg2
 import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
 
 from database import DatabaseConnectionError, SQLError
 from database.models import Article, Result, AbstractSentence, BodySentence, Job, ManuallyAnnotated, Organism, Taxonomy
@@ -28,7 +29,9 @@ async def save_article(engine, result):
     try:
         async with engine.acquire() as connection:
             try:
-                await connection.execute(Article.insert().values(result))
+                # another consumer can save the same article at the same time. A failed insert would
+                # abort the transaction of save_hits, so the article is skipped instead
+                await connection.execute(postgresql.insert(Article).values(result).on_conflict_do_nothing())
             except Exception as e:
                 logging.debug("Failed to save_article in the database. Error: {}.".format(e))
     except psycopg2.Error as e:
@@ -43,10 +46,21 @@ async def save_result(engine, result):
     :param result: dict containing the result
     :return: id of the result
     """
+    # the result can already exist, e.g. when an article is listed twice. A failed insert would abort
+    # the transaction of save_hits, so the id of the existing result is returned instead
+    insert = (postgresql.insert(Result).values(result)
+              .on_conflict_do_nothing(index_elements=[Result.c.pmcid, Result.c.job_id])
+              .returning(Result.c.id))
+    existing = (sa.select([Result.c.id])
+                .select_from(Result)
+                .where(sa.and_(Result.c.pmcid == result["pmcid"], Result.c.job_id == result["job_id"])))
+
     try:
         async with engine.acquire() as connection:
             try:
-                async for row in connection.execute(Result.insert().values(result).returning(Result.c.id)):
+                async for row in connection.execute(insert):
+                    return row.id
+                async for row in connection.execute(existing):
                     return row.id
             except Exception as e:
                 logging.debug("Failed to save_result in the database. Error: {}.".format(e))
@@ -55,17 +69,53 @@ async def save_result(engine, result):
                                       "job_id = %s" % result["job_id"]) from e
 
 
+async def save_sentence_text(connection, sentences):
+    """
+    Function to save the text of the sentences that are not in litscan_sentence yet.
+    Sentences are inserted in the order of their hash, so that two consumers saving
+    the same sentences at the same time do not deadlock.
+    :param connection: db connection
+    :param sentences: list of sentences
+    :return: None
+    """
+    query = sa.text('''
+        INSERT INTO litscan_sentence(hash, sentence)
+        SELECT DISTINCT CAST(md5(sentence) AS UUID), sentence FROM unnest(CAST(:sentences AS TEXT[])) AS sentence
+        ORDER BY 1
+        ON CONFLICT (hash) DO NOTHING
+    ''')
+    await connection.execute(query, sentences=sentences)
+
+
 async def save_abstract_sentences(engine, sentences):
     """
     Function to save abstract sentences in the database
     :param engine: params to connect to the db
-    :param sentences: list of dicts containing the sentences
+    :param sentences: list of dicts containing result_id, sentence and optionally job_id, match_start and match_end
     :return: None
     """
     try:
         async with engine.acquire() as connection:
             try:
-                await connection.execute(AbstractSentence.insert().values(sentences))
+                await save_sentence_text(connection, [item["sentence"] for item in sentences])
+                query = sa.text('''
+                    INSERT INTO litscan_abstract_sentence(result_id, job_id, sentence_id, match_start, match_end)
+                    SELECT v.result_id, COALESCE(v.job_id, (SELECT job_id FROM litscan_result WHERE id=v.result_id)),
+                      s.id, v.match_start, v.match_end
+                    FROM unnest(CAST(:result_id AS INTEGER[]), CAST(:job_id AS TEXT[]), CAST(:sentence AS TEXT[]),
+                                CAST(:match_start AS INTEGER[]), CAST(:match_end AS INTEGER[]))
+                      WITH ORDINALITY AS v(result_id, job_id, sentence, match_start, match_end, position)
+                    JOIN litscan_sentence s ON s.hash = CAST(md5(v.sentence) AS UUID)
+                    ORDER BY v.position
+                ''')
+                await connection.execute(
+                    query,
+                    result_id=[item["result_id"] for item in sentences],
+                    job_id=[item.get("job_id") for item in sentences],
+                    sentence=[item["sentence"] for item in sentences],
+                    match_start=[item.get("match_start") for item in sentences],
+                    match_end=[item.get("match_end") for item in sentences]
+                )
             except Exception as e:
                 raise SQLError("Failed to save abstract sentences in the database") from e
     except psycopg2.Error as e:
@@ -76,13 +126,34 @@ async def save_body_sentences(engine, sentences):
     """
     Function to save body sentences in the database
     :param engine: params to connect to the db
-    :param sentences: list of dicts containing the sentences
+    :param sentences: list of dicts containing result_id, sentence, location and optionally job_id, match_start
+    and match_end
     :return: None
     """
     try:
         async with engine.acquire() as connection:
             try:
-                await connection.execute(BodySentence.insert().values(sentences))
+                await save_sentence_text(connection, [item["sentence"] for item in sentences])
+                query = sa.text('''
+                    INSERT INTO litscan_body_sentence(result_id, job_id, sentence_id, location, match_start, match_end)
+                    SELECT v.result_id, COALESCE(v.job_id, (SELECT job_id FROM litscan_result WHERE id=v.result_id)),
+                      s.id, v.location, v.match_start, v.match_end
+                    FROM unnest(CAST(:result_id AS INTEGER[]), CAST(:job_id AS TEXT[]), CAST(:sentence AS TEXT[]),
+                                CAST(:location AS TEXT[]), CAST(:match_start AS INTEGER[]),
+                                CAST(:match_end AS INTEGER[]))
+                      WITH ORDINALITY AS v(result_id, job_id, sentence, location, match_start, match_end, position)
+                    JOIN litscan_sentence s ON s.hash = CAST(md5(v.sentence) AS UUID)
+                    ORDER BY v.position
+                ''')
+                await connection.execute(
+                    query,
+                    result_id=[item["result_id"] for item in sentences],
+                    job_id=[item.get("job_id") for item in sentences],
+                    sentence=[item["sentence"] for item in sentences],
+                    location=[item.get("location") for item in sentences],
+                    match_start=[item.get("match_start") for item in sentences],
+                    match_end=[item.get("match_end") for item in sentences]
+                )
             except Exception as e:
                 raise SQLError("Failed to save body sentences in the database") from e
     except psycopg2.Error as e:
@@ -123,92 +194,254 @@ async def get_pmcid_in_result(engine, job_id):
         raise DatabaseConnectionError("Failed to open DB connection in get_pmcid_in_result()") from e
 
 
-async def get_job_results(engine, job_id):
+async def count_results(engine, job_id):
+    """
+    Function to count the articles saved for a given job_id
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :return: number of results
+    """
+    try:
+        async with engine.acquire() as connection:
+            query = (sa.select([sa.func.count(Result.c.id)]).select_from(Result).where(Result.c.job_id == job_id))
+            async for row in connection.execute(query):
+                return row[0]
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in count_results()") from e
+
+
+"""Fields returned by get_job_results, in this order"""
+RESULT_FIELDS = ['job_id', 'title', 'author', 'pmcid', 'pmid', 'doi', 'year', 'journal', 'score', 'cited_by',
+                 'retracted', 'id_in_title', 'id_in_abstract', 'id_in_body', 'abstract_sentence', 'body_sentence']
+
+"""Fields that are only returned when requested"""
+OPTIONAL_RESULT_FIELDS = ['rna_related', 'probability']
+
+"""Columns of the fields of get_job_results (job_id and the sentences are not read from litscan_result)"""
+RESULT_COLUMNS = {
+    'title': Article.c.title,
+    'author': Article.c.author,
+    'pmcid': Result.c.pmcid,
+    'pmid': Article.c.pmid,
+    'doi': Article.c.doi,
+    'year': Article.c.year,
+    'journal': Article.c.journal,
+    'score': Article.c.score,
+    'cited_by': Article.c.cited_by,
+    'retracted': Article.c.retracted,
+    'id_in_title': Result.c.id_in_title,
+    'id_in_abstract': Result.c.id_in_abstract,
+    'id_in_body': Result.c.id_in_body,
+    'rna_related': Article.c.rna_related,
+    'probability': Article.c.probability,
+}
+
+"""Sections used to filter results: abstract or the location of body sentences"""
+SECTIONS = ['abstract', 'intro', 'results', 'discussion', 'conclusion', 'method', 'other']
+
+
+async def get_job_results(engine, job_id, year_from=None, year_to=None, rna_related=None, min_probability=None,
+                          section=None, retracted=None, id_in_title=None, fields=None, page=1, page_size=100):
     """
-    Function to get job results
+    Function to get job results. Filters are applied in the query, only the columns of fields are read,
+    and sentences are only read if abstract_sentence or body_sentence are in fields.
     :param engine: params to connect to the db
     :param job_id: id of the job
+    :param year_from: only articles published in or after this year
+    :param year_to: only articles published in or before this year
+    :param rna_related: only articles classified as RNA-related (True) or not (False)
+    :param min_probability: only articles with at least this probability of being RNA-related
+    :param section: only results with sentences in this section (one of SECTIONS)
+    :param retracted: only retracted (True) or not retracted (False) articles
+    :param id_in_title: only results with the job_id in the title (True) or not (False)
+    :param fields: list of fields of each result (RESULT_FIELDS by default)
+    :param page: number of the page, starting at 1
+    :param page_size: number of results in each page
     :return: list of dicts containing the results
     """
-    results = []
+    fields = fields or RESULT_FIELDS
     output = []
 
+    columns = [RESULT_COLUMNS[field] for field in fields if field in RESULT_COLUMNS]
+    query = (sa.select([Result.c.id] + columns)
+             .select_from(Result.join(Article, Article.c.pmcid == Result.c.pmcid))
+             .where(Result.c.job_id == job_id))
+
+    if year_from is not None:
+        query = query.where(Article.c.year >= year_from)
+    if year_to is not None:
+        query = query.where(Article.c.year <= year_to)
+    if rna_related is not None:
+        query = query.where(Article.c.rna_related == rna_related)
+    if min_probability is not None:
+        query = query.where(Article.c.probability >= min_probability)
+    if retracted is not None:
+        query = query.where(Article.c.retracted == retracted)
+    if id_in_title is not None:
+        query = query.where(Result.c.id_in_title == id_in_title)
+    if section == 'abstract':
+        query = query.where(sa.exists().where(AbstractSentence.c.result_id == Result.c.id))
+    elif section:
+        query = query.where(sa.exists().where(
+            sa.and_(BodySentence.c.result_id == Result.c.id, BodySentence.c.location == section)
+        ))
+
+    query = query.order_by(Result.c.id).limit(page_size).offset((page - 1) * page_size)
+
     try:
         async with engine.acquire() as connection:
-            # get results
-            results_sql = (sa.select([Result.c.id, Result.c.pmcid, Result.c.id_in_title, Result.c.id_in_abstract,
-                                      Result.c.id_in_body])
-                           .select_from(Result)
-                           .where(Result.c.job_id == job_id)
-                           .limit(100))  # noqa
-
-            async for row in connection.execute(results_sql):
-                results.append({
-                    'id': row.id,
-                    'pmcid': row.pmcid,
-                    'id_in_title': row.id_in_title,
-                    'id_in_abstract': row.id_in_abstract,
-                    'id_in_body': row.id_in_body
-                })
-
-            for result in results:
-                # get article
-                article_sql = (sa.select([Article.c.title, Article.c.author, Article.c.pmid, Article.c.doi,
-                                          Article.c.year, Article.c.journal, Article.c.score, Article.c.cited_by,
-                                          Article.c.retracted])
-                               .select_from(Article)
-                               .where(Article.c.pmcid == result['pmcid']))  # noqa
-                async for row in connection.execute(article_sql):
-                    article = {
-                        'title': row.title,
-                        'author': row.author,
-                        'pmid': row.pmid,
-                        'doi': row.doi,
-                        'year': row.year,
-                        'journal': row.journal,
-                        'score': row.score,
-                        'cited_by': row.cited_by,
-                        'retracted': row.retracted,
-                    }
-
-                # get abstract sentence
-                abstract_sentence_list = []
+            results = {}
+            async for row in connection.execute(query):
+                results[row.id] = {column.name: row[column.name] for column in columns}
+                results[row.id].update({'job_id': job_id, 'abstract_sentence': [], 'body_sentence': []})
+
+            # get the sentences of all results at once
+            if results and 'abstract_sentence' in fields and section in (None, 'abstract'):
                 abstract_sql = sa.text(
-                    '''SELECT sentence FROM litscan_abstract_sentence
-                    WHERE result_id=:result_id'''
+                    '''SELECT a.result_id, COALESCE(s.sentence, a.sentence) AS sentence FROM litscan_abstract_sentence a
+                    LEFT JOIN litscan_sentence s ON s.id=a.sentence_id
+                    WHERE a.result_id = ANY(CAST(:result_ids AS INTEGER[])) ORDER BY a.result_id, a.id'''
                 )
-                async for row in connection.execute(abstract_sql, result_id=result['id']):
-                    abstract_sentence_list.append(row.sentence)
+                async for row in connection.execute(abstract_sql, result_ids=list(results)):
+                    results[row.result_id]['abstract_sentence'].append(row.sentence)
 
-                # get body sentence
-                body_sentence_list = []
+            if results and 'body_sentence' in fields and section != 'abstract':
                 body_sql = sa.text(
-                    '''SELECT location,sentence FROM litscan_body_sentence
-                    WHERE result_id=:result_id ORDER BY location'''
+                    '''SELECT b.result_id, b.location, COALESCE(s.sentence, b.sentence) AS sentence
+                    FROM litscan_body_sentence b
+                    LEFT JOIN litscan_sentence s ON s.id=b.sentence_id
+                    WHERE b.result_id = ANY(CAST(:result_ids AS INTEGER[]))
+                      AND (CAST(:section AS TEXT) IS NULL OR b.location=:section)
+                    ORDER BY b.result_id, b.location, b.id'''
                 )
-                async for row in connection.execute(body_sql, result_id=result['id']):
-                    body_sentence_list.append({"location": row.location, "sentence": row.sentence})
-
-                output.append({
-                    'job_id': job_id,
-                    'title': article['title'],
-                    'author': article['author'],
-                    'pmcid': result['pmcid'],
-                    'pmid': article['pmid'],
-                    'doi': article['doi'],
-                    'year': article['year'],
-                    'journal': article['journal'],
-                    'score': article['score'],
-                    'cited_by': article['cited_by'],
-                    'retracted': article['retracted'],
-                    'id_in_title': result['id_in_title'],
-                    'id_in_abstract': result['id_in_abstract'],
-                    'id_in_body': result['id_in_body'],
-                    'abstract_sentence': abstract_sentence_list,
-                    'body_sentence': body_sentence_list
-                })
+                async for row in connection.execute(body_sql, result_ids=list(results), section=section):
+                    results[row.result_id]['body_sentence'].append({"location": row.location, "sentence": row.sentence})
+
+            for result in results.values():
+                output.append({field: result[field] for field in fields})
 
             return output
 
     except psycopg2.Error as e:
         raise DatabaseConnectionError(str(e)) from e
+
+
+async def get_primary_id_results(engine, primary_id, page=1, page_size=20):
+    """
+    Function to get the results of a primary_id and all its synonyms (see litscan_database), merged by article.
+    As in export_results.py, when one of the ids found in an article has more than one word, the ids contained
+    in another id of the same article are discarded (e.g. "16s rrna" is kept and "16s" and "rrna" are discarded).
+    :param engine: params to connect to the db
+    :param primary_id: primary id of the synonyms
+    :param page: number of the page, starting at 1
+    :param page_size: number of articles in each page
+    :return: list of job_ids, total number of articles and list of dicts with the articles of this page
+    """
+    jobs_sql = sa.text('''
+        SELECT job_id FROM litscan_job WHERE job_id=:primary_id
+        UNION
+        SELECT job_id FROM litscan_database WHERE primary_id=:primary_id AND job_id IS NOT NULL
+        ORDER BY 1
+    ''')
+
+    articles_sql = sa.text('''
+        WITH results AS (
+          SELECT r.id, r.pmcid, r.job_id, r.id_in_title, r.id_in_abstract, r.id_in_body,
+            bool_or(r.job_id ~ '\\s') OVER article AS multi_word, array_agg(r.job_id) OVER article AS article_job_ids
+          FROM litscan_result r
+          WHERE r.job_id = ANY(CAST(:job_ids AS TEXT[]))
+          WINDOW article AS (PARTITION BY r.pmcid)
+        ),
+        kept AS (
+          SELECT r.id, r.pmcid, r.job_id, r.id_in_title, r.id_in_abstract, r.id_in_body
+          FROM results r
+          WHERE NOT (
+            r.multi_word AND EXISTS (
+              SELECT 1 FROM unnest(r.article_job_ids) AS o(job_id)
+              WHERE o.job_id<>r.job_id AND strpos(o.job_id, r.job_id) > 0
+            )
+          )
+        ),
+        merged AS (
+          SELECT pmcid, array_agg(job_id ORDER BY job_id) AS job_ids, array_agg(id ORDER BY job_id) AS result_ids,
+            bool_or(id_in_title) AS id_in_title, bool_or(id_in_abstract) AS id_in_abstract,
+            bool_or(id_in_body) AS id_in_body, COUNT(*) OVER () AS total
+          FROM kept
+          GROUP BY pmcid
+        )
+        SELECT m.*, a.title, a.author, a.pmid, a.doi, a.year, a.journal, a.score, a.cited_by, a.retracted
+        FROM merged m
+        JOIN litscan_article a ON a.pmcid=m.pmcid
+        ORDER BY m.pmcid
+        LIMIT :limit OFFSET :offset
+    ''')
+
+    try:
+        async with engine.acquire() as connection:
+            try:
+                job_ids = []
+                async for row in connection.execute(jobs_sql, primary_id=primary_id.lower()):
+                    job_ids.append(row.job_id)
+
+                total = 0
+                articles = []
+                results = {}
+                if job_ids:
+                    async for row in connection.execute(
+                            articles_sql,
+                            job_ids=job_ids,
+                            limit=page_size,
+                            offset=(page - 1) * page_size
+                    ):
+                        total = row.total
+                        articles.append({
+                            'job_ids': row.job_ids,
+                            'title': row.title,
+                            'author': row.author,
+                            'pmcid': row.pmcid,
+                            'pmid': row.pmid,
+                            'doi': row.doi,
+                            'year': row.year,
+                            'journal': row.journal,
+                            'score': row.score,
+                            'cited_by': row.cited_by,
+                            'retracted': row.retracted,
+                            'id_in_title': row.id_in_title,
+                            'id_in_abstract': row.id_in_abstract,
+                            'id_in_body': row.id_in_body,
+                            'abstract_sentence': [],
+                            'body_sentence': []
+                        })
+                        for result_id in row.result_ids:
+                            results[result_id] = articles[-1]
+
+                # get the sentences of all results at once. A sentence found by several ids is added once
+                if results:
+                    sentences_sql = sa.text('''
+                        SELECT a.result_id, a.id, 'abstract' AS location, COALESCE(s.sentence, a.sentence) AS sentence
+                        FROM litscan_abstract_sentence a
+                        LEFT JOIN litscan_sentence s ON s.id=a.sentence_id
+                        WHERE a.result_id = ANY(CAST(:result_ids AS INTEGER[]))
+                        UNION ALL
+                        SELECT b.result_id, b.id, b.location, COALESCE(s.sentence, b.sentence) AS sentence
+                        FROM litscan_body_sentence b
+                        LEFT JOIN litscan_sentence s ON s.id=b.sentence_id
+                        WHERE b.result_id = ANY(CAST(:result_ids AS INTEGER[]))
+                        ORDER BY result_id, location, id
+                    ''')
+                    async for row in connection.execute(sentences_sql, result_ids=list(results)):
+                        article = results[row.result_id]
+                        if row.location == 'abstract':
+                            if row.sentence not in article['abstract_sentence']:
+                                article['abstract_sentence'].append(row.sentence)
+                        else:
+                            sentence = {"location": row.location, "sentence": row.sentence}
+                            if sentence not in article['body_sentence']:
+                                article['body_sentence'].append(sentence)
+
+                return job_ids, total, articles
+
+            except Exception as e:
+                raise SQLError("Failed to get the results of primary_id = %s" % primary_id) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in get_primary_id_results()") from e
@@ -11,7 +11,11 @@ psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-E
       CREATE TABLE public.litscan_abstract_sentence (
           id integer NOT NULL,
           result_id integer,
-          sentence text
+          job_id character varying(100),
+          sentence text,
+          sentence_id integer,
+          match_start integer,
+          match_end integer
       );
       ALTER TABLE public.litscan_abstract_sentence OWNER TO $LITSCAN_USER;
 
@@ -39,15 +43,26 @@ psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-E
           retracted boolean,
           rna_related boolean,
           probability float,
-          type character varying(100)
+          type character varying(100),
+          model_version character varying(64)
       );
       ALTER TABLE public.litscan_article OWNER TO $LITSCAN_USER;
 
+      CREATE TABLE public.litscan_article_text (
+          pmcid character varying(15) NOT NULL,
+          content bytea
+      );
+      ALTER TABLE public.litscan_article_text OWNER TO $LITSCAN_USER;
+
       CREATE TABLE public.litscan_body_sentence (
           id integer NOT NULL,
           result_id integer,
+          job_id character varying(100),
           sentence text,
-          location text
+          location text,
+          sentence_id integer,
+          match_start integer,
+          match_end integer
       );
       ALTER TABLE public.litscan_body_sentence OWNER TO $LITSCAN_USER;
 
@@ -61,11 +76,31 @@ psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-E
       ALTER TABLE public.litscan_body_sentence_id_seq OWNER TO $LITSCAN_USER;
       ALTER SEQUENCE public.litscan_body_sentence_id_seq OWNED BY public.litscan_body_sentence.id;
 
+      CREATE TABLE public.litscan_sentence (
+          id integer NOT NULL,
+          hash uuid NOT NULL,
+          sentence text,
+          tsv tsvector GENERATED ALWAYS AS (to_tsvector('english'::regconfig, COALESCE(sentence, ''::text))) STORED
+      );
+      ALTER TABLE public.litscan_sentence OWNER TO $LITSCAN_USER;
+
+      CREATE SEQUENCE public.litscan_sentence_id_seq
+          AS integer
+          START WITH 1
+          INCREMENT BY 1
+          NO MINVALUE
+          NO MAXVALUE
+          CACHE 1;
+      ALTER TABLE public.litscan_sentence_id_seq OWNER TO $LITSCAN_USER;
+      ALTER SEQUENCE public.litscan_sentence_id_seq OWNED BY public.litscan_sentence.id;
+
       CREATE TABLE public.litscan_consumer (
           ip character varying(20) NOT NULL,
           status character varying(10) NOT NULL,
           job_id character varying(100),
-          port character varying(5)
+          port character varying(5),
+          heartbeat timestamp without time zone,
+          progress integer
       );
       ALTER TABLE public.litscan_consumer OWNER TO $LITSCAN_USER;
 
@@ -95,10 +130,44 @@ psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-E
           submitted timestamp without time zone,
           finished timestamp without time zone,
           status character varying(10),
-          hit_count integer
+          hit_count integer,
+          estimated_hit_count integer,
+          cursor_mark text,
+          checkpoint integer,
+          examined integer
       );
       ALTER TABLE public.litscan_job OWNER TO $LITSCAN_USER;
 
+      CREATE TABLE public.litscan_job_chunk (
+          id integer NOT NULL,
+          job_id character varying(100),
+          chunk integer,
+          articles jsonb,
+          status character varying(10),
+          consumer character varying(20),
+          checkpoint integer
+      );
+      ALTER TABLE public.litscan_job_chunk OWNER TO $LITSCAN_USER;
+
+      CREATE SEQUENCE public.litscan_job_chunk_id_seq
+          AS integer
+          START WITH 1
+          INCREMENT BY 1
+          NO MINVALUE
+          NO MAXVALUE
+          CACHE 1;
+      ALTER TABLE public.litscan_job_chunk_id_seq OWNER TO $LITSCAN_USER;
+      ALTER SEQUENCE public.litscan_job_chunk_id_seq OWNED BY public.litscan_job_chunk.id;
+
+      CREATE TABLE public.litscan_stats (
+          job_id character varying(100) NOT NULL,
+          year integer NOT NULL,
+          hits integer,
+          rna_related integer,
+          retracted integer
+      );
+      ALTER TABLE public.litscan_stats OWNER TO $LITSCAN_USER;
+
       CREATE TABLE public.litscan_result (
           id integer NOT NULL,
           pmcid character varying(15),
@@ -122,34 +191,54 @@ psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-E
       ALTER TABLE ONLY public.litscan_abstract_sentence ALTER COLUMN id SET DEFAULT nextval('public.litscan_abstract_sentence_id_seq'::regclass);
       ALTER TABLE ONLY public.litscan_body_sentence ALTER COLUMN id SET DEFAULT nextval('public.litscan_body_sentence_id_seq'::regclass);
       ALTER TABLE ONLY public.litscan_database ALTER COLUMN id SET DEFAULT nextval('public.litscan_database_id_seq'::regclass);
+      ALTER TABLE ONLY public.litscan_job_chunk ALTER COLUMN id SET DEFAULT nextval('public.litscan_job_chunk_id_seq'::regclass);
       ALTER TABLE ONLY public.litscan_result ALTER COLUMN id SET DEFAULT nextval('public.litscan_result_id_seq'::regclass);
+      ALTER TABLE ONLY public.litscan_sentence ALTER COLUMN id SET DEFAULT nextval('public.litscan_sentence_id_seq'::regclass);
 
       SELECT pg_catalog.setval('public.litscan_abstract_sentence_id_seq', 1, false);
       SELECT pg_catalog.setval('public.litscan_body_sentence_id_seq', 1, false);
       SELECT pg_catalog.setval('public.litscan_database_id_seq', 1, false);
+      SELECT pg_catalog.setval('public.litscan_job_chunk_id_seq', 1, false);
       SELECT pg_catalog.setval('public.litscan_result_id_seq', 1, false);
+      SELECT pg_catalog.setval('public.litscan_sentence_id_seq', 1, false);
 
       ALTER TABLE ONLY public.litscan_abstract_sentence ADD CONSTRAINT litscan_abstract_sentence_pkey PRIMARY KEY (id);
       ALTER TABLE ONLY public.litscan_article ADD CONSTRAINT litscan_article_pkey PRIMARY KEY (pmcid);
+      ALTER TABLE ONLY public.litscan_article_text ADD CONSTRAINT litscan_article_text_pkey PRIMARY KEY (pmcid);
       ALTER TABLE ONLY public.litscan_body_sentence ADD CONSTRAINT litscan_body_sentence_pkey PRIMARY KEY (id);
       ALTER TABLE ONLY public.litscan_consumer ADD CONSTRAINT litscan_consumer_pkey PRIMARY KEY (ip);
       ALTER TABLE ONLY public.litscan_database ADD CONSTRAINT litscan_database_pkey PRIMARY KEY (id);
       ALTER TABLE ONLY public.litscan_job ADD CONSTRAINT litscan_job_pkey PRIMARY KEY (job_id);
+      ALTER TABLE ONLY public.litscan_job_chunk ADD CONSTRAINT litscan_job_chunk_pkey PRIMARY KEY (id);
+      ALTER TABLE ONLY public.litscan_job_chunk ADD CONSTRAINT job_chunk UNIQUE (job_id, chunk);
       ALTER TABLE ONLY public.litscan_result ADD CONSTRAINT litscan_result_pkey PRIMARY KEY (id);
       ALTER TABLE ONLY public.litscan_result ADD CONSTRAINT pmcid_job_id UNIQUE (pmcid, job_id);
       ALTER TABLE ONLY public.litscan_database ADD CONSTRAINT name_job UNIQUE (name, job_id, primary_id);
+      ALTER TABLE ONLY public.litscan_sentence ADD CONSTRAINT litscan_sentence_pkey PRIMARY KEY (id);
+      ALTER TABLE ONLY public.litscan_sentence ADD CONSTRAINT sentence_hash UNIQUE (hash);
+      ALTER TABLE ONLY public.litscan_stats ADD CONSTRAINT litscan_stats_pkey PRIMARY KEY (job_id, year);
 
       CREATE INDEX litscan_abstract_sentence_result_id_idx ON public.litscan_abstract_sentence USING btree (result_id);
       CREATE INDEX litscan_article_pmcid_idx ON public.litscan_article USING btree (pmcid) WHERE (retracted IS FALSE);
       CREATE INDEX litscan_body_sentence_result_id_idx ON public.litscan_body_sentence USING btree (result_id);
       CREATE INDEX litscan_database_job_id_idx ON public.litscan_database USING btree (job_id);
+      CREATE INDEX litscan_database_primary_id_idx ON public.litscan_database USING btree (primary_id);
+      CREATE INDEX litscan_job_status_submitted_idx ON public.litscan_job USING btree (status, submitted);
+      CREATE INDEX litscan_job_chunk_status_idx ON public.litscan_job_chunk USING btree (status);
       CREATE INDEX litscan_result_job_id_idx ON public.litscan_result USING btree (job_id);
+      CREATE INDEX litscan_abstract_sentence_sentence_id_idx ON public.litscan_abstract_sentence USING btree (sentence_id);
+      CREATE INDEX litscan_body_sentence_sentence_id_idx ON public.litscan_body_sentence USING btree (sentence_id);
+      CREATE INDEX litscan_sentence_tsv_idx ON public.litscan_sentence USING gin (tsv);
 
       ALTER TABLE ONLY public.litscan_abstract_sentence ADD CONSTRAINT litscan_abstract_sentence_result_id_fkey FOREIGN KEY (result_id) REFERENCES public.litscan_result(id) ON UPDATE CASCADE ON DELETE CASCADE;
       ALTER TABLE ONLY public.litscan_body_sentence ADD CONSTRAINT litscan_body_sentence_result_id_fkey FOREIGN KEY (result_id) REFERENCES public.litscan_result(id) ON UPDATE CASCADE ON DELETE CASCADE;
       ALTER TABLE ONLY public.litscan_database ADD CONSTRAINT litscan_database_job_id_fkey FOREIGN KEY (job_id) REFERENCES public.litscan_job(job_id) ON UPDATE CASCADE ON DELETE CASCADE;
       ALTER TABLE ONLY public.litscan_database ADD CONSTRAINT litscan_database_primary_id_fkey FOREIGN KEY (primary_id) REFERENCES public.litscan_job(job_id) ON UPDATE CASCADE ON DELETE CASCADE;
+      ALTER TABLE ONLY public.litscan_job_chunk ADD CONSTRAINT litscan_job_chunk_job_id_fkey FOREIGN KEY (job_id) REFERENCES public.litscan_job(job_id) ON UPDATE CASCADE ON DELETE CASCADE;
       ALTER TABLE ONLY public.litscan_result ADD CONSTRAINT litscan_result_job_id_fkey FOREIGN KEY (job_id) REFERENCES public.litscan_job(job_id) ON UPDATE CASCADE ON DELETE CASCADE;
+      ALTER TABLE ONLY public.litscan_abstract_sentence ADD CONSTRAINT litscan_abstract_sentence_sentence_id_fkey FOREIGN KEY (sentence_id) REFERENCES public.litscan_sentence(id);
+      ALTER TABLE ONLY public.litscan_body_sentence ADD CONSTRAINT litscan_body_sentence_sentence_id_fkey FOREIGN KEY (sentence_id) REFERENCES public.litscan_sentence(id);
+      ALTER TABLE ONLY public.litscan_stats ADD CONSTRAINT litscan_stats_job_id_fkey FOREIGN KEY (job_id) REFERENCES public.litscan_job(job_id) ON UPDATE CASCADE ON DELETE CASCADE;
       ALTER TABLE ONLY public.litscan_result ADD CONSTRAINT litscan_result_pmcid_fkey FOREIGN KEY (pmcid) REFERENCES public.litscan_article(pmcid) ON UPDATE CASCADE ON DELETE CASCADE;
 	COMMIT;
 EOSQL
\ No newline at end of file
@@ -0,0 +1,153 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import psycopg2
+import sqlalchemy as sa
+
+from database import DatabaseConnectionError, SQLError
+
+
+# the total number of sentences found is counted up to MAX_TOTAL
+MAX_TOTAL = 10000
+
+# sentence_id and location of the sentences of each result
+RESULT_SENTENCES = '''
+          SELECT result_id, sentence_id, 'abstract' AS location, match_start, match_end
+          FROM litscan_abstract_sentence
+          UNION ALL
+          SELECT result_id, sentence_id, location, match_start, match_end
+          FROM litscan_body_sentence
+'''
+
+# sentences that match the query, found with the GIN index of litscan_sentence. Only the first MAX_TOTAL sentences
+# returned by the index are ranked, so a common word does not rank (and read) every sentence of the table
+ALL_MATCHES = '''
+      SELECT r.job_id, r.pmcid, x.sentence_id, x.location, x.match_start, x.match_end,
+        ts_rank(s.tsv, q.tsquery) AS rank
+      FROM q
+      CROSS JOIN LATERAL (
+        SELECT id, tsv FROM litscan_sentence WHERE tsv @@ q.tsquery LIMIT :max_total
+      ) s
+      JOIN ({sentences}) x ON x.sentence_id=s.id
+      JOIN litscan_result r ON r.id=x.result_id
+      LIMIT :max_total
+'''.format(sentences=RESULT_SENTENCES)
+
+# sentences of the results of some jobs (found with the job_id index of litscan_result) that match the query.
+# The sentences of the jobs are read first (MATERIALIZED), so the GIN match is not run on the whole table
+JOB_MATCHES = '''
+      SELECT x.job_id, x.pmcid, x.sentence_id, x.location, x.match_start, x.match_end,
+        ts_rank(s.tsv, q.tsquery) AS rank
+      FROM job_sentences x
+      JOIN litscan_sentence s ON s.id=x.sentence_id
+      CROSS JOIN q
+      WHERE s.tsv @@ q.tsquery
+'''
+
+JOB_SENTENCES = '''
+    job_sentences AS MATERIALIZED (
+      SELECT r.job_id, r.pmcid, x.sentence_id, x.location, x.match_start, x.match_end
+      FROM litscan_result r
+      JOIN ({sentences}) x ON x.result_id=r.id
+      WHERE {{where}}
+    ),
+'''.format(sentences=RESULT_SENTENCES)
+
+# the metadata of the article and the text of the sentence are only read for the sentences of the page
+SEARCH_QUERY = '''
+    WITH q AS (SELECT websearch_to_tsquery('english', :search) AS tsquery),
+    {job_sentences}
+    matches AS MATERIALIZED ({matches})
+    SELECT m.job_id, m.pmcid, a.pmid, a.doi, a.title, a.year, a.journal, a.cited_by, a.retracted,
+      m.location, m.match_start, m.match_end, s.sentence, m.rank,
+      (SELECT COUNT(*) FROM (SELECT 1 FROM matches LIMIT :max_total) AS c) AS total
+    FROM (SELECT * FROM matches ORDER BY rank DESC, pmcid, sentence_id LIMIT :limit OFFSET :offset) m
+    JOIN litscan_sentence s ON s.id=m.sentence_id
+    JOIN litscan_article a ON a.pmcid=m.pmcid
+    ORDER BY m.rank DESC, m.pmcid, m.sentence_id
+'''
+
+
+def search_query(job_id=None, database=None):
+    """
+    SQL of search_sentences. When a filter is given, only the sentences of the jobs are matched
+    :param job_id: only search the sentences of this job
+    :param database: only search the sentences of jobs of this database
+    :return: string
+    """
+    where = []
+    if job_id:
+        where.append('r.job_id=:job_id')
+    if database:
+        where.append('''r.job_id IN (
+            SELECT job_id FROM litscan_database WHERE name=:database
+            UNION
+            SELECT primary_id FROM litscan_database WHERE name=:database
+          )''')
+
+    if not where:
+        return SEARCH_QUERY.format(job_sentences='', matches=ALL_MATCHES)
+    return SEARCH_QUERY.format(job_sentences=JOB_SENTENCES.format(where=' AND '.join(where)), matches=JOB_MATCHES)
+
+
+async def search_sentences(engine, query, job_id=None, database=None, page=1, page_size=20):
+    """
+    Full-text search of the sentences found by the jobs, using the GIN index of litscan_sentence.
+    The query accepts the syntax of websearch_to_tsquery, e.g. "knockdown -mouse" or '"gene expression"'
+    :param engine: params to connect to the db
+    :param query: text to search for
+    :param job_id: only search the sentences of this job
+    :param database: only search the sentences of jobs of this database (see litscan_database)
+    :param page: number of the page, starting at 1
+    :param page_size: number of sentences in each page
+    :return: total number of sentences found (at most MAX_TOTAL) and list of dicts with the sentences of this page
+    """
+    sql_query = sa.text(search_query(job_id, database))
+
+    try:
+        async with engine.acquire() as connection:
+            try:
+                total = 0
+                sentences = []
+                async for row in connection.execute(
+                        sql_query,
+                        search=query,
+                        job_id=job_id.lower() if job_id else None,
+                        database=database.lower() if database else None,
+                        limit=page_size,
+                        offset=(page - 1) * page_size,
+                        max_total=MAX_TOTAL
+                ):
+                    total = row.total
+                    sentences.append({
+                        'job_id': row.job_id,
+                        'pmcid': row.pmcid,
+                        'pmid': row.pmid,
+                        'doi': row.doi,
+                        'title': row.title,
+                        'year': row.year,
+                        'journal': row.journal,
+                        'cited_by': row.cited_by,
+                        'retracted': row.retracted,
+                        'location': row.location,
+                        'sentence': row.sentence,
+                        'match_start': row.match_start,
+                        'match_end': row.match_end,
+                        'rank': round(float(row.rank), 4),
+                    })
+
+                return total, sentences
+
+            except Exception as e:
+                raise SQLError("Failed to search sentences, query = %s" % query) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in search_sentences()") from e
@@ -0,0 +1,115 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import argparse
+import os
+import psycopg2
+
+from database import DatabaseConnectionError, SQLError
+from database.settings import get_postgres_credentials
+
+SENTENCE_TABLES = ['litscan_abstract_sentence', 'litscan_body_sentence']
+
+
+def connect(settings):
+    """
+    Open a connection with psycopg2, used by the maintenance tasks of this module
+    :param settings: postgres credentials returned by get_postgres_credentials
+    :return: psycopg2 connection
+    """
+    try:
+        return psycopg2.connect(
+            user=settings.POSTGRES_USER,
+            password=settings.POSTGRES_PASSWORD,
+            dbname=settings.POSTGRES_DATABASE,
+            host=settings.POSTGRES_HOST,
+            port=settings.POSTGRES_PORT
+        )
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in database.sentences") from e
+
+
+def move_legacy_sentences(settings, table, batch_size=10000):
+    """
+    Move the text of the sentences saved before litscan_sentence existed. Each batch of ids
+    is committed on its own, so the task can be interrupted and started again.
+    :param settings: postgres credentials returned by get_postgres_credentials
+    :param table: litscan_abstract_sentence or litscan_body_sentence
+    :param batch_size: number of ids moved in each transaction
+    :return: number of sentences moved
+    """
+    connection = connect(settings)
+    moved = 0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT MIN(id), MAX(id) FROM {} WHERE sentence_id IS NULL".format(table))
+            first, last = cursor.fetchone()
+        connection.commit()
+
+        for start in range(first or 0, (last or 0) + 1, batch_size):
+            params = {"start": start, "end": start + batch_size}
+            with connection, connection.cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO litscan_sentence(hash, sentence)
+                    SELECT DISTINCT CAST(md5(sentence) AS UUID), sentence FROM {}
+                    WHERE id >= %(start)s AND id < %(end)s AND sentence_id IS NULL AND sentence IS NOT NULL
+                    ORDER BY 1
+                    ON CONFLICT (hash) DO NOTHING
+                '''.format(table), params)
+                cursor.execute('''
+                    UPDATE {} t SET sentence_id=s.id, sentence=NULL
+                    FROM litscan_sentence s
+                    WHERE t.id >= %(start)s AND t.id < %(end)s AND t.sentence_id IS NULL
+                      AND s.hash = CAST(md5(t.sentence) AS UUID)
+                '''.format(table), params)
+                moved += cursor.rowcount
+
+        return moved
+    except psycopg2.Error as e:
+        raise SQLError("Failed to move the sentences of {}".format(table)) from e
+    finally:
+        connection.close()
+
+
+def delete_orphan_sentences(settings):
+    """
+    Delete the text of sentences that are no longer used by any result (e.g. after jobs are deleted).
+    Run it when consumers are stopped: a consumer may be about to use a sentence that has no results yet.
+    :param settings: postgres credentials returned by get_postgres_credentials
+    :return: number of sentences deleted
+    """
+    connection = connect(settings)
+    try:
+        with connection, connection.cursor() as cursor:
+            cursor.execute('''
+                DELETE FROM litscan_sentence s
+                WHERE NOT EXISTS (SELECT 1 FROM litscan_abstract_sentence WHERE sentence_id=s.id)
+                  AND NOT EXISTS (SELECT 1 FROM litscan_body_sentence WHERE sentence_id=s.id)
+            ''')
+            return cursor.rowcount
+    except psycopg2.Error as e:
+        raise SQLError("Failed to delete orphan sentences") from e
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move sentences to litscan_sentence, where each text is saved once")
+    parser.add_argument("--batch-size", type=int, default=10000, help="number of ids moved in each transaction")
+    parser.add_argument("--delete-orphans", action="store_true", help="delete sentences not used by any result")
+    args = parser.parse_args()
+
+    settings = get_postgres_credentials(os.getenv("ENVIRONMENT", "LOCAL"))
+    for table in SENTENCE_TABLES:
+        print("{} sentences of {} moved".format(move_legacy_sentences(settings, table, args.batch_size), table))
+    if args.delete_orphans:
+        print("{} orphan sentences deleted".format(delete_orphan_sentences(settings)))
@@ -0,0 +1,199 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import argparse
+import os
+import psycopg2
+import sqlalchemy as sa
+
+from database import DatabaseConnectionError, SQLError
+from database.sentences import connect
+from database.settings import get_postgres_credentials
+
+# Summary of litscan_result, one row per job and year of publication. The consumer refreshes the rows of a job
+# when it finishes, and training/update_rna_related_and_probability_fields.py updates rna_related when it classifies
+# the articles again, so the stats endpoints only read this small table and never scan the results.
+STATS_QUERY = '''
+    INSERT INTO litscan_stats(job_id, year, hits, rna_related, retracted)
+    SELECT r.job_id, COALESCE(a.year, 0), COUNT(*),
+      COUNT(*) FILTER (WHERE a.rna_related), COUNT(*) FILTER (WHERE a.retracted)
+    FROM litscan_result r
+    JOIN litscan_article a ON a.pmcid=r.pmcid
+    {where}
+    GROUP BY 1, 2
+'''
+
+# jobs of each database, either as job_id or as primary_id
+DATABASE_JOBS = '''
+    SELECT name, job_id FROM litscan_database WHERE job_id IS NOT NULL
+    UNION
+    SELECT name, primary_id FROM litscan_database WHERE primary_id IS NOT NULL
+'''
+
+
+async def refresh_job_stats(engine, job_id):
+    """
+    Recalculate the stats of a job. Called when the job finishes, it only reads the results of this job
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :return: None
+    """
+    try:
+        async with engine.acquire() as connection:
+            try:
+                async with connection.begin():
+                    await connection.execute(
+                        sa.text('''DELETE FROM litscan_stats WHERE job_id=:job_id'''), job_id=job_id.lower()
+                    )
+                    await connection.execute(
+                        sa.text(STATS_QUERY.format(where='WHERE r.job_id=:job_id')), job_id=job_id.lower()
+                    )
+            except Exception as e:
+                raise SQLError("Failed to refresh the stats of job_id = %s" % job_id) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in refresh_job_stats, job_id = %s" % job_id) from e
+
+
+async def get_job_stats(engine, job_id):
+    """
+    Get the stats of a job
+    :param engine: params to connect to the db
+    :param job_id: id of the job
+    :return: dict with the totals of the job and the number of hits of each year (None if the job does not exist)
+    """
+    # a job without hits (or that has not finished yet) has no stats, and has zero totals
+    sql_query = sa.text('''
+        SELECT s.year, s.hits, s.rna_related, s.retracted
+        FROM litscan_job j
+        LEFT JOIN litscan_stats s ON s.job_id=j.job_id
+        WHERE j.job_id=:job_id
+        ORDER BY s.year
+    ''')
+
+    try:
+        async with engine.acquire() as connection:
+            try:
+                stats = None
+                async for row in connection.execute(sql_query, job_id=job_id.lower()):
+                    if stats is None:
+                        stats = {'job_id': job_id.lower(), 'hits': 0, 'rna_related': 0, 'retracted': 0, 'years': []}
+                    if row.year is None:
+                        continue
+                    stats['hits'] += row.hits
+                    stats['rna_related'] += row.rna_related
+                    stats['retracted'] += row.retracted
+                    stats['years'].append({'year': row.year or None, 'hits': row.hits})
+
+                return stats
+
+            except Exception as e:
+                raise SQLError("Failed to get the stats of job_id = %s" % job_id) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in get_job_stats, job_id = %s" % job_id) from e
+
+
+async def get_database_stats(engine):
+    """
+    Get the stats of each Expert Database. Articles found by more than one job of a database are counted once per job
+    :param engine: params to connect to the db
+    :return: list of dicts with the number of jobs, hits, rna_related and retracted of each database
+    """
+    sql_query = sa.text('''
+        SELECT d.name, COUNT(DISTINCT s.job_id) AS jobs, SUM(s.hits) AS hits,
+          SUM(s.rna_related) AS rna_related, SUM(s.retracted) AS retracted
+        FROM (%s) d
+        JOIN litscan_stats s ON s.job_id=d.job_id
+        GROUP BY d.name
+        ORDER BY d.name
+    ''' % DATABASE_JOBS)
+
+    try:
+        async with engine.acquire() as connection:
+            try:
+                stats = []
+                async for row in connection.execute(sql_query):
+                    stats.append({
+                        'database': row.name,
+                        'jobs': row.jobs,
+                        'hits': int(row.hits),
+                        'rna_related': int(row.rna_related),
+                        'retracted': int(row.retracted),
+                    })
+
+                return stats
+
+            except Exception as e:
+                raise SQLError("Failed to get the stats of the databases") from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in get_database_stats()") from e
+
+
+async def get_year_stats(engine, database=None):
+    """
+    Get the number of hits of each year of publication
+    :param engine: params to connect to the db
+    :param database: only count the jobs of this database (see litscan_database)
+    :return: list of dicts with the number of hits, rna_related and retracted of each year
+    """
+    sql_query = sa.text('''
+        SELECT s.year, SUM(s.hits) AS hits, SUM(s.rna_related) AS rna_related, SUM(s.retracted) AS retracted
+        FROM litscan_stats s
+        WHERE CAST(:database AS TEXT) IS NULL OR s.job_id IN (SELECT job_id FROM (%s) d WHERE d.name=:database)
+        GROUP BY s.year
+        ORDER BY s.year
+    ''' % DATABASE_JOBS)
+
+    try:
+        async with engine.acquire() as connection:
+            try:
+                stats = []
+                async for row in connection.execute(sql_query, database=database.lower() if database else None):
+                    stats.append({
+                        'year': row.year or None,
+                        'hits': int(row.hits),
+                        'rna_related': int(row.rna_related),
+                        'retracted': int(row.retracted),
+                    })
+
+                return stats
+
+            except Exception as e:
+                raise SQLError("Failed to get the stats of each year, database = %s" % database) from e
+    except psycopg2.Error as e:
+        raise DatabaseConnectionError("Failed to open DB connection in get_year_stats()") from e
+
+
+def rebuild_stats(settings):
+    """
+    Recalculate the stats of all jobs, e.g. after the migration that created litscan_stats
+    or after articles are updated outside LitScan (e.g. marked as retracted)
+    :param settings: postgres credentials returned by get_postgres_credentials
+    :return: number of rows saved in litscan_stats
+    """
+    connection = connect(settings)
+    try:
+        with connection, connection.cursor() as cursor:
+            cursor.execute('DELETE FROM litscan_stats')
+            cursor.execute(STATS_QUERY.format(where=''))
+            return cursor.rowcount
+    except psycopg2.Error as e:
+        raise SQLError("Failed to rebuild litscan_stats") from e
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalculate the stats of all jobs")
+    parser.parse_args()
+
+    settings = get_postgres_credentials(os.getenv("ENVIRONMENT", "LOCAL"))
+    print("{} rows saved in litscan_stats".format(rebuild_stats(settings)))
@@ -0,0 +1,42 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from aiohttp.test_utils import unittest_run_loop
+from database.article_text import get_article_text, get_pmcid_with_text, save_article_text
+from database.tests.test_base import DBTestCase
+
+
+class ArticleTextTestCase(DBTestCase):
+    """
+    Run this test with the following command:
+    ENVIRONMENT=TEST python -m unittest database.tests.test_article_text
+    """
+    async def setUpAsync(self):
+        await super().setUpAsync()
+        self.content = {
+            "text": "Title URS0001 abstract body",
+            "translated": False,
+            "title": "Title",
+            "abstract": "Abstract",
+            "sections": [["intro0", ["First paragraph with URS0001.", "Second paragraph."]]],
+            "metadata": {"type": "Research article", "author": "", "doi": "", "pmid": "", "year": 2022, "journal": ""},
+        }
+        await save_article_text(self.app['engine'], 'PMC1', self.content)
+
+    @unittest_run_loop
+    async def test_get_article_text(self):
+        assert await get_article_text(self.app['engine'], 'PMC1') == self.content
+        assert await get_article_text(self.app['engine'], 'PMC2') is None
+
+    @unittest_run_loop
+    async def test_get_pmcid_with_text(self):
+        assert await get_pmcid_with_text(self.app['engine'], ['PMC1', 'PMC2']) == {'PMC1'}
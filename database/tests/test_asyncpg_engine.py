@@ -0,0 +1,87 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import sqlalchemy as sa
+
+from aiohttp.test_utils import unittest_run_loop
+from sqlalchemy.dialects import postgresql
+
+from database import asyncpg_engine
+from database.models import Database, Job
+from database.tests.test_base import DBTestCase
+
+
+class AsyncpgEngineTestCase(DBTestCase):
+    """
+    Run this test with the following command:
+    ENVIRONMENT=TEST python -m unittest database.tests.test_asyncpg_engine
+    """
+    async def setUpAsync(self):
+        await super().setUpAsync()
+
+        settings = self.app['settings']
+        self.engine = await asyncpg_engine.create_engine(
+            user=settings.POSTGRES_USER,
+            password=settings.POSTGRES_PASSWORD,
+            database=settings.POSTGRES_DATABASE,
+            host=settings.POSTGRES_HOST,
+            port=settings.POSTGRES_PORT
+        )
+        async with self.engine.acquire() as connection:
+            for job_id in ['urs0001', 'urs0002']:
+                await connection.execute(Job.insert().values(job_id=job_id))
+
+    async def tearDownAsync(self):
+        self.engine.close()
+        await self.engine.wait_closed()
+        await super().tearDownAsync()
+
+    async def get_databases(self):
+        async with self.engine.acquire() as connection:
+            query = (sa.select([Database.c.name, Database.c.job_id, Database.c.primary_id])
+                     .select_from(Database)
+                     .order_by(Database.c.name))
+            return [(row.name, row.job_id, row.primary_id) async for row in connection.execute(query)]
+
+    @unittest_run_loop
+    async def test_insert_many_columns(self):
+        # the keys are not in the order of the columns of the table (name, job_id, primary_id)
+        rows = [
+            {"job_id": "urs0001", "name": "rfam", "primary_id": "urs0002"},
+            {"job_id": "urs0002", "name": "mirbase", "primary_id": None},
+        ]
+        async with self.engine.acquire() as connection:
+            await connection.execute(Database.insert().values(rows))
+
+        assert await self.get_databases() == [("mirbase", "urs0002", None), ("rfam", "urs0001", "urs0002")]
+
+    @unittest_run_loop
+    async def test_insert_many_on_conflict(self):
+        # above COPY_THRESHOLD, ON CONFLICT must still be applied
+        rows = [{"job_id": "urs0001", "name": "rfam", "primary_id": "urs0002"}] * asyncpg_engine.COPY_THRESHOLD
+        query = postgresql.insert(Database).values(rows).on_conflict_do_nothing()
+        async with self.engine.acquire() as connection:
+            await connection.execute(query)
+
+        assert await self.get_databases() == [("rfam", "urs0001", "urs0002")]
+
+    @unittest_run_loop
+    async def test_execute_string_with_params(self):
+        # statements other than SELECT must not lose their parameters
+        async with self.engine.acquire() as connection:
+            await connection.execute(
+                'INSERT INTO litscan_database(name, job_id, primary_id) VALUES (:name, :job_id, :primary_id)',
+                name='rfam', job_id='urs0001', primary_id=None
+            )
+            await connection.execute('UPDATE litscan_database SET primary_id=:primary_id', primary_id='urs0002')
+
+        assert await self.get_databases() == [("rfam", "urs0001", "urs0002")]
@@ -38,7 +38,9 @@ class DBTestCase(AioHTTPTestCase):
             await connection.execute('DELETE FROM litscan_load_organism')
             await connection.execute('DELETE FROM litscan_organism')
             await connection.execute('DELETE FROM litscan_result')
+            await connection.execute('DELETE FROM litscan_sentence')
             await connection.execute('DELETE FROM litscan_article')
+            await connection.execute('DELETE FROM litscan_article_text')
             await connection.execute('DELETE FROM litscan_database')
             await connection.execute('DELETE FROM litscan_job')
             await connection.execute('DELETE FROM litscan_consumer')
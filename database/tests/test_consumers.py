@@ -10,11 +10,15 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import datetime
+import sqlalchemy as sa
+
 from aiohttp.test_utils import unittest_run_loop
 
 from database.consumers import find_available_consumers, get_ip, get_consumer_status, set_consumer_status_and_job_id,\
-    register_consumer_in_the_database
-from database.models import Consumer, CONSUMER_STATUS_CHOICES
+    reclaim_dead_consumers, register_consumer_in_the_database, register_corpus_scan, requeue_consumer_work, \
+    send_corpus_scan_heartbeat, send_heartbeat, unregister_consumers
+from database.models import Consumer, Job, CONSUMER_STATUS_CHOICES, JOB_STATUS_CHOICES
 from database.tests.test_base import DBTestCase
 
 
@@ -105,3 +109,117 @@ class SetConsumerStatusAndJobIdTestCase(DBTestCase):
         async with self.app['engine'].acquire() as connection:
             consumer_status = await get_consumer_status(self.app['engine'], self.consumer_ip)
             assert consumer_status == CONSUMER_STATUS_CHOICES.busy
+
+
+class RequeueConsumerWorkTestCase(DBTestCase):
+    """
+    Run this test with the following command:
+
+    ENVIRONMENT=TEST python -m unittest database.tests.test_consumers.RequeueConsumerWorkTestCase
+    """
+    async def setUpAsync(self):
+        await super().setUpAsync()
+
+        async with self.app['engine'].acquire() as connection:
+            self.consumer_ip = '192.168.1.1'
+            await connection.execute(
+                Job.insert().values(job_id='urs0001', display_id='URS0001', status=JOB_STATUS_CHOICES.started)
+            )
+            await connection.execute(
+                Consumer.insert().values(
+                    ip=self.consumer_ip,
+                    status=CONSUMER_STATUS_CHOICES.busy,
+                    job_id='urs0001'
+                )
+            )
+
+    @unittest_run_loop
+    async def test_requeue_consumer_work(self):
+        await requeue_consumer_work(self.app['engine'], self.consumer_ip)
+
+        async with self.app['engine'].acquire() as connection:
+            query = (sa.select([Job.c.status]).select_from(Job).where(Job.c.job_id == 'urs0001'))
+            async for row in connection.execute(query):
+                assert row.status == JOB_STATUS_CHOICES.pending
+
+
+class HeartbeatTestCase(DBTestCase):
+    """
+    Run this test with the following command:
+
+    ENVIRONMENT=TEST python -m unittest database.tests.test_consumers.HeartbeatTestCase
+    """
+    async def setUpAsync(self):
+        await super().setUpAsync()
+
+        async with self.app['engine'].acquire() as connection:
+            await connection.execute(
+                Job.insert().values(job_id='urs0001', display_id='URS0001', status=JOB_STATUS_CHOICES.started)
+            )
+            await connection.execute(
+                Consumer.insert().values(
+                    ip='192.168.0.2',
+                    status=CONSUMER_STATUS_CHOICES.busy,
+                    job_id='urs0001',
+                    heartbeat=datetime.datetime.now() - datetime.timedelta(minutes=10)
+                )
+            )
+            await connection.execute(
+                Consumer.insert().values(
+                    ip='192.168.0.3',
+                    status=CONSUMER_STATUS_CHOICES.available,
+                    heartbeat=datetime.datetime.now()
+                )
+            )
+
+    @unittest_run_loop
+    async def test_reclaim_dead_consumers(self):
+        dead_consumers = await reclaim_dead_consumers(self.app['engine'], 60)
+        assert dead_consumers == ['192.168.0.2']
+
+        consumer_status = await get_consumer_status(self.app['engine'], '192.168.0.2')
+        assert consumer_status == CONSUMER_STATUS_CHOICES.dead
+
+        async with self.app['engine'].acquire() as connection:
+            query = (sa.select([Job.c.status]).select_from(Job).where(Job.c.job_id == 'urs0001'))
+            async for row in connection.execute(query):
+                assert row.status == JOB_STATUS_CHOICES.pending
+
+    @unittest_run_loop
+    async def test_send_heartbeat(self):
+        await reclaim_dead_consumers(self.app['engine'], 60)
+        await send_heartbeat(self.app['engine'], '192.168.0.2', CONSUMER_STATUS_CHOICES.available, 0)
+
+        consumer_status = await get_consumer_status(self.app['engine'], '192.168.0.2')
+        assert consumer_status == CONSUMER_STATUS_CHOICES.available
+        assert await reclaim_dead_consumers(self.app['engine'], 60) == []
+
+    @unittest_run_loop
+    async def test_send_heartbeat_of_reclaimed_job(self):
+        # the job of this consumer was requeued, so it stays dead while it reports the job as running
+        await reclaim_dead_consumers(self.app['engine'], 60)
+        await send_heartbeat(self.app['engine'], '192.168.0.2', CONSUMER_STATUS_CHOICES.busy, 10)
+
+        consumer_status = await get_consumer_status(self.app['engine'], '192.168.0.2')
+        assert consumer_status == CONSUMER_STATUS_CHOICES.dead
+
+    @unittest_run_loop
+    async def test_corpus_scan(self):
+        async with self.app['engine'].acquire() as connection:
+            await connection.execute(
+                Job.insert().values(job_id='urs0002', display_id='URS0002', status=JOB_STATUS_CHOICES.started)
+            )
+
+        consumers = await register_corpus_scan(self.app['engine'], 'scan-test', ['URS0002'])
+        assert consumers == ['scan-test-1']
+        await send_corpus_scan_heartbeat(self.app['engine'], consumers, 100)
+
+        # the job of the scan is not requeued
+        assert await reclaim_dead_consumers(self.app['engine'], 60) == ['192.168.0.2']
+        async with self.app['engine'].acquire() as connection:
+            query = (sa.select([Job.c.status]).select_from(Job).where(Job.c.job_id == 'urs0002'))
+            async for row in connection.execute(query):
+                assert row.status == JOB_STATUS_CHOICES.started
+
+        await unregister_consumers(self.app['engine'], consumers)
+        assert await get_consumer_status(self.app['engine'], 'scan-test-1') is None
@@ -0,0 +1,75 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import sqlalchemy as sa
+
+from aiohttp.test_utils import unittest_run_loop
+from database.models import Job, JobChunk, JOB_STATUS_CHOICES
+from database.job_chunk import find_chunk_to_run, finish_job_chunk, get_chunk_checkpoint, get_job_chunk, \
+    save_chunk_checkpoint, save_job_chunks, set_chunk_status
+from database.tests.test_base import DBTestCase
+
+
+class JobChunkTestCase(DBTestCase):
+    """
+    Run this test with the following command:
+    ENVIRONMENT=TEST python -m unittest database.tests.test_job_chunk
+    """
+    async def setUpAsync(self):
+        await super().setUpAsync()
+
+        async with self.app['engine'].acquire() as connection:
+            self.job_id = 'urs0003'
+            self.display_id = 'URS0003'
+            await connection.execute(Job.insert().values(
+                job_id=self.job_id, display_id=self.display_id, status=JOB_STATUS_CHOICES.started)
+            )
+
+        self.chunks = [
+            [{"pmcid": "PMC1", "cited_by": "1"}, {"pmcid": "PMC2", "cited_by": "0"}],
+            [{"pmcid": "PMC3", "cited_by": "5"}]
+        ]
+        await save_job_chunks(self.app['engine'], self.job_id, self.chunks)
+
+    @unittest_run_loop
+    async def test_get_job_chunk(self):
+        articles = await get_job_chunk(self.app['engine'], self.job_id, 1)
+        assert articles == self.chunks[1]
+
+    @unittest_run_loop
+    async def test_find_chunk_to_run(self):
+        await set_chunk_status(self.app['engine'], self.job_id, 0, JOB_STATUS_CHOICES.started, '192.168.0.2')
+        chunks = await find_chunk_to_run(self.app['engine'])
+        assert chunks == [(self.display_id, 1)]
+
+    @unittest_run_loop
+    async def test_finish_job_chunk(self):
+        assert await finish_job_chunk(self.app['engine'], self.job_id, 0) is False
+        assert await finish_job_chunk(self.app['engine'], self.job_id, 1) is True
+
+        async with self.app['engine'].acquire() as connection:
+            query = (sa.select([Job.c.status, Job.c.hit_count]).select_from(Job).where(Job.c.job_id == self.job_id))
+            async for row in connection.execute(query):
+                assert row.status == JOB_STATUS_CHOICES.success
+                assert row.hit_count == 0
+
+            query = (sa.select([sa.func.count(JobChunk.c.id)]).select_from(JobChunk))
+            async for row in connection.execute(query):
+                assert row[0] == 0
+
+    @unittest_run_loop
+    async def test_save_and_get_chunk_checkpoint(self):
+        assert await get_chunk_checkpoint(self.app['engine'], self.job_id, 0) == 0
+
+        await save_chunk_checkpoint(self.app['engine'], self.job_id, 0, 1)
+        assert await get_chunk_checkpoint(self.app['engine'], self.job_id, 0) == 1
+        assert await get_chunk_checkpoint(self.app['engine'], self.job_id, 1) == 0
@@ -14,9 +14,12 @@ import datetime
 import sqlalchemy as sa
 
 from aiohttp.test_utils import unittest_run_loop
-from database.models import Job, JOB_STATUS_CHOICES
-from database.job import delete_job_data, find_job_to_run, get_hit_count, get_jobs, get_search_date, save_job, \
-    save_hit_count, search_performed, set_job_status
+from database.models import BodySentence, Job, JOB_STATUS_CHOICES, Result, SCHEDULING_POLICY_CHOICES
+from database.job import delete_job_data, find_job_to_run, find_jobs_without_estimate, get_checkpoint, \
+    get_hit_count, get_jobs, get_jobs_status, get_search_date, save_checkpoint, save_estimated_hit_count, save_job, save_hit_count, \
+    search_performed, set_job_status
+from database.metadata import metadata
+from database.results import save_article, save_body_sentences, save_result
 from database.tests.test_base import DBTestCase
 
 
@@ -58,6 +61,21 @@ class JobTestCase(DBTestCase):
 
         assert result == 1  # 1 from setUpAsync (urs0001)
 
+    @unittest_run_loop
+    async def test_delete_job_data_with_results(self):
+        await save_article(self.app['engine'], {"pmcid": "PMC1"})
+        result_id = await save_result(self.app['engine'], {"pmcid": "PMC1", "job_id": self.job_id})
+        await save_body_sentences(self.app['engine'], [
+            {"result_id": result_id, "job_id": self.job_id, "sentence": "urs0001 is expressed", "location": "other"}
+        ])
+        await delete_job_data(self.app['engine'], job_id=self.job_id)
+
+        async with self.app['engine'].acquire() as connection:
+            for table in [Result, BodySentence]:
+                query = (sa.select([sa.func.count()]).select_from(table))
+                async for row in connection.execute(query):
+                    assert row[0] == 0
+
     @unittest_run_loop
     async def test_find_job_to_run(self):
         find_job = await find_job_to_run(self.app['engine'])
@@ -79,6 +97,20 @@ class JobTestCase(DBTestCase):
         # return urs0001 only
         assert jobs == [{'job_id': self.job_id, 'display_id': self.display_id}]
 
+    @unittest_run_loop
+    async def test_get_jobs_status(self):
+        await save_job(self.app['engine'], job_id="FOO", query="", search_limit=None)
+        await save_hit_count(self.app['engine'], "foo", 3)
+        await metadata(self.app['engine'], [{"job_id": "foo", "name": "rfam", "primary_id": None}])
+
+        jobs = await get_jobs_status(self.app['engine'], job_ids=['URS0001', 'bar'])
+        assert [(job['job_id'], job['status'], job['hit_count']) for job in jobs] == [(self.job_id, self.status, None)]
+
+        jobs = await get_jobs_status(self.app['engine'], job_ids=[self.job_id], database='Rfam')
+        assert [job['job_id'] for job in jobs] == ['foo', self.job_id]
+        assert jobs[0]['hit_count'] == 3
+        assert jobs[0]['submitted'] is not None
+
     @unittest_run_loop
     async def test_check_date(self):
         await set_job_status(self.app['engine'], self.job_id, JOB_STATUS_CHOICES.success)
@@ -101,3 +133,39 @@ class JobTestCase(DBTestCase):
     async def test_no_hit_count(self):
         hit_count = await get_hit_count(self.app['engine'], self.job_id)
         assert hit_count == 0
+
+    @unittest_run_loop
+    async def test_find_jobs_without_estimate(self):
+        jobs = await find_jobs_without_estimate(self.app['engine'])
+        assert [job["job_id"] for job in jobs] == [self.job_id]
+
+        await save_estimated_hit_count(self.app['engine'], self.job_id, 3)
+        jobs = await find_jobs_without_estimate(self.app['engine'])
+        assert jobs == []
+
+    @unittest_run_loop
+    async def test_find_job_to_run_shortest_job_first(self):
+        # urs0001 is a big job, FOO is a small one submitted later
+        async with self.app['engine'].acquire() as connection:
+            await connection.execute(Job.update().where(Job.c.job_id == self.job_id).values(
+                submitted=datetime.datetime.now() - datetime.timedelta(hours=1))
+            )
+        await save_estimated_hit_count(self.app['engine'], self.job_id, 200000)
+        await save_job(self.app['engine'], job_id="FOO", query="", search_limit=None)
+        await save_estimated_hit_count(self.app['engine'], "foo", 3)
+
+        fifo = await find_job_to_run(self.app['engine'])
+        assert [job[0] for job in fifo] == [self.display_id, "FOO"]
+
+        sjf = await find_job_to_run(self.app['engine'], policy=SCHEDULING_POLICY_CHOICES.shortest_job_first)
+        assert [job[0] for job in sjf] == ["FOO", self.display_id]
+
+    @unittest_run_loop
+    async def test_save_and_get_checkpoint(self):
+        assert await get_checkpoint(self.app['engine'], self.job_id) == (None, 0, 0)
+
+        await save_checkpoint(self.app['engine'], self.job_id, 'AoIIQ', 40, examined=1000)
+        assert await get_checkpoint(self.app['engine'], self.job_id) == ('AoIIQ', 40, 1000)
+
+        await save_checkpoint(self.app['engine'], self.job_id, None, None)
+        assert await get_checkpoint(self.app['engine'], self.job_id) == (None, 0, 0)
@@ -0,0 +1,265 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import contextlib
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from aiohttp.test_utils import unittest_run_loop
+from database.job import find_job_to_run, get_jobs_status
+from database.metadata import search_metadata
+from database.migrations import Index, MIGRATIONS, create_index, index_is_valid, partitions_of, schema_version, \
+    upgrade
+from database.models import SCHEDULING_POLICY_CHOICES
+from database.results import get_job_results, get_pmcid_in_result, get_primary_id_results, save_result
+from database.search import search_sentences
+from database.tests.test_base import DBTestCase
+
+
+class MigrationsTestCase(DBTestCase):
+    """
+    Run this test with the following command:
+    ENVIRONMENT=TEST python -m unittest database.tests.test_migrations
+    """
+    @unittest_run_loop
+    async def test_upgrade(self):
+        await upgrade(self.app['engine'])
+        assert await schema_version(self.app['engine']) == MIGRATIONS[-1].version
+
+        # nothing else to apply
+        assert await upgrade(self.app['engine']) == []
+
+    @unittest_run_loop
+    async def test_upgrade_concurrently(self):
+        # migration that builds the indexes of the main queries
+        version = [
+            migration.version for migration in MIGRATIONS
+            if any(getattr(statement, 'name', None) == 'litscan_job_status_submitted_idx'
+                   for statement in migration.statements)
+        ][0]
+        async with self.app['engine'].acquire() as connection:
+            await connection.execute(
+                sa.text('DELETE FROM litscan_schema_version WHERE version=:version'), version=version
+            )
+            await connection.execute('DROP INDEX IF EXISTS litscan_job_status_submitted_idx')
+
+        assert await upgrade(self.app['engine'], concurrently=True) == [version]
+
+        async with self.app['engine'].acquire() as connection:
+            query = sa.text('''SELECT indexname FROM pg_indexes WHERE indexname=:name''')
+            indexes = []
+            async for row in connection.execute(query, name='litscan_job_status_submitted_idx'):
+                indexes.append(row.indexname)
+            assert indexes == ['litscan_job_status_submitted_idx']
+
+    @unittest_run_loop
+    async def test_create_index_concurrently_on_partitioned_table(self):
+        index = Index('litscan_partitioned_job_id_idx', 'litscan_partitioned', 'job_id')
+        async with self.app['engine'].acquire() as connection:
+            await connection.execute('CREATE TABLE litscan_partitioned (job_id VARCHAR(100)) PARTITION BY HASH (job_id)')
+            try:
+                for remainder in range(2):
+                    await connection.execute(
+                        'CREATE TABLE litscan_partitioned_p%s PARTITION OF litscan_partitioned '
+                        'FOR VALUES WITH (MODULUS 2, REMAINDER %s)' % (remainder, remainder)
+                    )
+
+                await create_index(connection, index, concurrently=True)
+                assert await index_is_valid(connection, index.name)
+                assert await partitions_of(connection, index.name) == [
+                    'litscan_partitioned_p0_job_id_idx', 'litscan_partitioned_p1_job_id_idx'
+                ]
+
+                # nothing to do the second time
+                await create_index(connection, index, concurrently=True)
+                assert await index_is_valid(connection, index.name)
+            finally:
+                await connection.execute('DROP TABLE litscan_partitioned')
+
+
+class ExplainedQuery(object):
+    """Statement run by ExplainEngine: it is explained and then run, so it can be awaited or iterated as usual"""
+    def __init__(self, engine, connection, query, multiparams, params):
+        self._engine = engine
+        self._connection = connection
+        self._query = query
+        self._multiparams = multiparams
+        self._params = params
+
+    async def _execute(self):
+        await self._engine.explain(self._connection, self._query, self._multiparams, self._params)
+        return await self._connection.execute(self._query, *self._multiparams, **self._params)
+
+    def __await__(self):
+        return self._execute().__await__()
+
+    async def __aiter__(self):
+        async for row in await self._execute():
+            yield row
+
+
+class ExplainConnection(object):
+    """Connection of ExplainEngine"""
+    def __init__(self, engine, connection):
+        self._engine = engine
+        self._connection = connection
+
+    def execute(self, query, *multiparams, **params):
+        return ExplainedQuery(self._engine, self._connection, query, multiparams, params)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class ExplainEngine(object):
+    """
+    Engine that saves the plan of every statement before running it, so that the tests
+    check the queries of the database functions instead of copies of them
+    """
+    def __init__(self, engine):
+        self._engine = engine
+        self.plans = []
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        async with self._engine.acquire() as connection:
+            yield ExplainConnection(self, connection)
+
+    async def explain(self, connection, query, multiparams, params):
+        compiled = query.compile(dialect=postgresql.dialect())
+        values = compiled.construct_params(multiparams[0] if multiparams else params)
+        async for row in connection.execute('EXPLAIN (FORMAT JSON) ' + str(compiled), values):
+            plan = row[0][0]['Plan']
+
+        nodes = []
+        pending = [plan]
+        while pending:
+            node = pending.pop()
+            nodes.append(node)
+            pending.extend(node.get('Plans', []))
+        self.plans.append((str(compiled), nodes))
+
+
+class QueryPlanTestCase(DBTestCase):
+    """
+    Check that the main queries use indexes on a seeded database.
+    Run this test with the following command:
+    ENVIRONMENT=TEST python -m unittest database.tests.test_migrations
+    """
+    async def setUpAsync(self):
+        await super().setUpAsync()
+        await upgrade(self.app['engine'])
+
+        async with self.app['engine'].acquire() as connection:
+            await connection.execute(sa.text('''
+                INSERT INTO litscan_job(job_id, display_id, status, submitted)
+                SELECT 'job' || i, 'JOB' || i, CASE WHEN i % 1000 = 0 THEN 'pending' ELSE 'success' END,
+                  LOCALTIMESTAMP - i * INTERVAL '1 minute'
+                FROM generate_series(0, 4999) AS i
+            '''))
+            await connection.execute(sa.text('''
+                INSERT INTO litscan_article(pmcid, pmid, retracted)
+                SELECT 'PMC' || i, i::TEXT, FALSE FROM generate_series(0, 4999) AS i
+            '''))
+            await connection.execute(sa.text('''
+                INSERT INTO litscan_result(pmcid, job_id)
+                SELECT 'PMC' || i, 'job' || (i % 500) FROM generate_series(0, 4999) AS i
+            '''))
+            await connection.execute(sa.text('''
+                INSERT INTO litscan_abstract_sentence(result_id, job_id, sentence)
+                SELECT id, job_id, 'abstract sentence' FROM litscan_result, generate_series(1, 2)
+            '''))
+            await connection.execute(sa.text('''
+                INSERT INTO litscan_body_sentence(result_id, job_id, sentence, location)
+                SELECT id, job_id, 'body sentence', 'intro' FROM litscan_result, generate_series(1, 2)
+            '''))
+            await connection.execute(sa.text('''
+                INSERT INTO litscan_database(name, job_id, primary_id)
+                SELECT 'db' || (i % 10), 'job' || i, 'job' || ((i + 1) % 5000) FROM generate_series(0, 4999) AS i
+            '''))
+            for table in ['litscan_job', 'litscan_article', 'litscan_result', 'litscan_abstract_sentence',
+                          'litscan_body_sentence', 'litscan_database']:
+                await connection.execute('ANALYZE %s' % table)
+
+        self.engine = ExplainEngine(self.app['engine'])
+
+    def assert_index_scan(self, *tables):
+        """
+        Check that the statements run with self.engine read these tables and never scan the whole table
+        :param tables: names of the tables
+        :return: None
+        """
+        for table in tables:
+            scans = [
+                (sql, node) for sql, nodes in self.engine.plans for node in nodes
+                if node.get('Relation Name') == table
+            ]
+            assert scans, (table, self.engine.plans)
+            assert not [(sql, node) for sql, node in scans if node['Node Type'] == 'Seq Scan'], (table, scans)
+
+    @unittest_run_loop
+    async def test_find_job_to_run(self):
+        policies = [SCHEDULING_POLICY_CHOICES.fifo, SCHEDULING_POLICY_CHOICES.shortest_job_first,
+                    SCHEDULING_POLICY_CHOICES.fair_share]
+        for policy in policies:
+            self.engine.plans = []
+            jobs = await find_job_to_run(self.engine, policy=policy)
+            assert len(jobs) == 5
+            self.assert_index_scan('litscan_job')
+
+        # the database of each job is read by the fair_share policy
+        self.assert_index_scan('litscan_database')
+
+    @unittest_run_loop
+    async def test_get_pmcid_in_result(self):
+        assert len(await get_pmcid_in_result(self.engine, 'job1')) == 10
+        self.assert_index_scan('litscan_result')
+
+    @unittest_run_loop
+    async def test_get_job_results(self):
+        results = await get_job_results(self.engine, 'job1')
+        assert len(results) == 10
+        assert all(len(result['abstract_sentence']) == 2 for result in results)
+        self.assert_index_scan('litscan_result', 'litscan_article', 'litscan_abstract_sentence',
+                               'litscan_body_sentence')
+
+    @unittest_run_loop
+    async def test_get_primary_id_results(self):
+        job_ids, total, articles = await get_primary_id_results(self.engine, 'job2')
+        assert job_ids == ['job1', 'job2']
+        assert total == 20
+        self.assert_index_scan('litscan_database', 'litscan_result', 'litscan_abstract_sentence',
+                               'litscan_body_sentence')
+
+    @unittest_run_loop
+    async def test_save_existing_result(self):
+        assert await save_result(self.engine, {'pmcid': 'PMC1', 'job_id': 'job1'}) is not None
+        self.assert_index_scan('litscan_result')
+
+    @unittest_run_loop
+    async def test_search_metadata(self):
+        assert await search_metadata(self.engine, 'job1', 'db1', 'job2') is not None
+        self.assert_index_scan('litscan_database')
+
+    @unittest_run_loop
+    async def test_get_jobs_status(self):
+        await get_jobs_status(self.engine, job_ids=['job1', 'job2'])
+        self.assert_index_scan('litscan_job')
+
+        self.engine.plans = []
+        await get_jobs_status(self.engine, database='db1')
+        self.assert_index_scan('litscan_database')
+
+    @unittest_run_loop
+    async def test_search_by_job_id(self):
+        await search_sentences(self.engine, 'sentence', job_id='job1')
+        self.assert_index_scan('litscan_result')
@@ -10,10 +10,12 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import asyncio
+import io
 import sqlalchemy as sa
 
 from aiohttp.test_utils import unittest_run_loop
-from database.organism import load_organism, find_pmid_organism, save_organism
+from database.organism import copy_organisms, find_organisms, find_pmid_organism, load_organism, save_organism
 from database.models import Article, LoadOrganism, Organism
 from database.tests.test_base import DBTestCase
 
@@ -64,6 +66,21 @@ class OrganismTestCase(DBTestCase):
         organisms = await find_pmid_organism(self.app['engine'], self.pmid)
         assert organisms == []
 
+    @unittest_run_loop
+    async def test_find_organisms(self):
+        organisms = await find_organisms(self.app['engine'], ["1234567", "7654321", self.pmid])
+        assert organisms == {"1234567": [9606, 559292], "7654321": [9606], self.pmid: []}
+
+    @unittest_run_loop
+    async def test_copy_organisms(self):
+        tsv_file = io.StringIO("1234567\t9606\n{0}\t10090\n{0}\t10090\n{0}\t9606\n".format(self.pmid))
+        loop = asyncio.get_running_loop()
+        inserted = await loop.run_in_executor(None, copy_organisms, self.app['settings'], tsv_file)
+        assert inserted == 2  # 1234567-9606 was already loaded and the duplicated line is skipped
+
+        organisms = await find_organisms(self.app['engine'], [self.pmid])
+        assert sorted(organisms[self.pmid]) == [9606, 10090]
+
     @unittest_run_loop
     async def test_save_organism(self):
         await save_organism(self.app['engine'], {"pmcid": "123456701", "organism": 9606})
@@ -0,0 +1,145 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from psycopg2.errors import ForeignKeyViolation
+
+from aiohttp.test_utils import unittest_run_loop
+from database.partitions import PARTITIONED_TABLES, convert_tables, is_partitioned, vacuum_partitions
+from database.sentences import connect
+from database.tests.test_base import DBTestCase
+
+
+class PartitionsTestCase(DBTestCase):
+    """
+    The tables are converted in a transaction that is rolled back, so the test database is not partitioned.
+    Run this test with the following command:
+    ENVIRONMENT=TEST python -m unittest database.tests.test_partitions
+    """
+    async def setUpAsync(self):
+        await super().setUpAsync()
+        self.connection = connect(self.app['settings'])
+        self.cursor = self.connection.cursor()
+
+        self.cursor.execute("INSERT INTO litscan_job(job_id) VALUES ('urs0001'), ('urs0002')")
+        self.cursor.execute("INSERT INTO litscan_article(pmcid) SELECT 'PMC' || i FROM generate_series(1, 4) AS i")
+        self.cursor.execute('''
+            INSERT INTO litscan_result(pmcid, job_id)
+            SELECT 'PMC' || i, job_id FROM generate_series(1, 4) AS i, litscan_job
+        ''')
+        self.cursor.execute('''
+            INSERT INTO litscan_sentence(hash, sentence)
+            VALUES (CAST(md5('urs0001 and urs0002') AS UUID), 'urs0001 and urs0002')
+            RETURNING id
+        ''')
+        sentence_id = self.cursor.fetchone()[0]
+        self.cursor.execute('''
+            INSERT INTO litscan_abstract_sentence(result_id, job_id, sentence_id)
+            SELECT id, job_id, %s FROM litscan_result
+        ''', (sentence_id,))
+        # a sentence saved before litscan_sentence and before the sentences had a job_id
+        self.cursor.execute('''
+            INSERT INTO litscan_body_sentence(result_id, sentence, location)
+            SELECT id, 'urs0001 and urs0002', 'intro' FROM litscan_result
+        ''')
+        self.counts = self.count_rows()
+
+        convert_tables(self.cursor, partitions=4)
+
+    async def tearDownAsync(self):
+        self.connection.rollback()
+        self.connection.close()
+        await super().tearDownAsync()
+
+    def count_rows(self, job_id=None):
+        counts = {}
+        for table in PARTITIONED_TABLES:
+            self.cursor.execute(
+                'SELECT COUNT(*) FROM {} WHERE %(job_id)s IS NULL OR job_id=%(job_id)s'.format(table)
+                if table == 'litscan_result' else
+                'SELECT COUNT(*) FROM {} s JOIN litscan_result r ON r.id=s.result_id '
+                'WHERE %(job_id)s IS NULL OR r.job_id=%(job_id)s'.format(table),
+                {'job_id': job_id}
+            )
+            counts[table] = self.cursor.fetchone()[0]
+        return counts
+
+    @unittest_run_loop
+    async def test_rows_copied(self):
+        assert self.count_rows() == self.counts == {
+            'litscan_result': 8, 'litscan_abstract_sentence': 8, 'litscan_body_sentence': 8
+        }
+
+        for table in PARTITIONED_TABLES:
+            assert is_partitioned(self.cursor, table)
+            self.cursor.execute('''
+                SELECT COUNT(*) FROM pg_inherits JOIN pg_class ON pg_class.oid=pg_inherits.inhparent
+                WHERE pg_class.relname=%s
+            ''', (table,))
+            assert self.cursor.fetchone()[0] == 4
+
+        # sentences are in the partition of the job of their result
+        self.cursor.execute('''
+            SELECT COUNT(*) FROM litscan_body_sentence s JOIN litscan_result r ON r.id=s.result_id
+            WHERE s.job_id IS DISTINCT FROM r.job_id
+        ''')
+        assert self.cursor.fetchone()[0] == 0
+
+    @unittest_run_loop
+    async def test_new_rows(self):
+        self.cursor.execute("INSERT INTO litscan_article(pmcid) VALUES ('PMC5')")
+        self.cursor.execute('''
+            INSERT INTO litscan_result(pmcid, job_id) VALUES ('PMC5', 'urs0001') RETURNING id
+        ''')
+        result_id = self.cursor.fetchone()[0]
+
+        # ids continue the sequences of the old tables
+        self.cursor.execute("SELECT MAX(id) FROM litscan_result WHERE pmcid <> 'PMC5'")
+        assert result_id > self.cursor.fetchone()[0]
+
+        self.cursor.execute('''
+            INSERT INTO litscan_body_sentence(result_id, job_id, sentence, location) VALUES (%s, 'urs0001', 'a', 'b')
+        ''', (result_id,))
+
+    @unittest_run_loop
+    async def test_foreign_keys(self):
+        self.cursor.execute('SAVEPOINT foreign_keys')
+        with self.assertRaises(ForeignKeyViolation):
+            self.cursor.execute('''
+                INSERT INTO litscan_body_sentence(result_id, job_id, sentence) VALUES (-1, 'urs0001', 'a')
+            ''')
+        self.cursor.execute('ROLLBACK TO SAVEPOINT foreign_keys')
+
+        with self.assertRaises(ForeignKeyViolation):
+            self.cursor.execute("INSERT INTO litscan_result(pmcid, job_id) VALUES ('PMC1', 'unknown')")
+        self.cursor.execute('ROLLBACK TO SAVEPOINT foreign_keys')
+
+    @unittest_run_loop
+    async def test_cascades(self):
+        # deleting a job deletes its results and their sentences, and nothing else
+        self.cursor.execute("DELETE FROM litscan_job WHERE job_id='urs0001'")
+        assert self.count_rows('urs0001') == {
+            'litscan_result': 0, 'litscan_abstract_sentence': 0, 'litscan_body_sentence': 0
+        }
+        assert self.count_rows('urs0002') == {
+            'litscan_result': 4, 'litscan_abstract_sentence': 4, 'litscan_body_sentence': 4
+        }
+
+        # deleting an article deletes its results
+        self.cursor.execute("DELETE FROM litscan_article WHERE pmcid='PMC1'")
+        assert self.count_rows('urs0002') == {
+            'litscan_result': 3, 'litscan_abstract_sentence': 3, 'litscan_body_sentence': 3
+        }
+
+    @unittest_run_loop
+    async def test_vacuum_partitions(self):
+        # the partitions only exist in the transaction of the test, so nothing is vacuumed
+        assert vacuum_partitions(self.app['settings'], min_dead_tuples=0) == []
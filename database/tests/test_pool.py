@@ -0,0 +1,60 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+
+import psycopg2
+
+from aiohttp.test_utils import unittest_run_loop
+from database.job import get_query_and_limit, save_job, set_job_status
+from database.models import JOB_STATUS_CHOICES
+from database.pool import InstrumentedEngine, unit_of_work
+from database.tests.test_base import DBTestCase
+
+
+class PoolTestCase(DBTestCase):
+    """
+    Run this test with the following command:
+    ENVIRONMENT=TEST python -m unittest database.tests.test_pool
+    """
+    @unittest_run_loop
+    async def test_unit_of_work_uses_one_connection(self):
+        engine = self.app['engine']
+        acquired = engine.metrics()["acquired"]
+
+        async with unit_of_work(engine) as uow:
+            await save_job(uow, 'urs0001', '', 100)
+            await set_job_status(uow, 'urs0001', JOB_STATUS_CHOICES.started)
+            assert await get_query_and_limit(uow, 'urs0001') == ('', 100)
+
+        metrics = engine.metrics()
+        assert metrics["acquired"] == acquired + 1
+        assert metrics["in_use"] == 0
+
+    @unittest_run_loop
+    async def test_acquire_timeout(self):
+        engine = InstrumentedEngine(self.app['engine'].engine, acquire_timeout=0.1)
+        connections = [engine.acquire() for _ in range(engine.engine.maxsize)]
+        for context in connections:
+            await context.__aenter__()
+
+        try:
+            with self.assertRaises(psycopg2.OperationalError):
+                async with engine.acquire():
+                    pass
+        finally:
+            await asyncio.gather(*[context.__aexit__(None, None, None) for context in connections])
+
+        metrics = engine.metrics()
+        assert metrics["timeouts"] == 1
+        assert metrics["peak_in_use"] == engine.engine.maxsize
+        assert metrics["utilization"] == 0.0
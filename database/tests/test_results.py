@@ -13,9 +13,11 @@ limitations under the License.
 import sqlalchemy as sa
 
 from aiohttp.test_utils import unittest_run_loop
-from database.models import Article, Job, JOB_STATUS_CHOICES, Result, AbstractSentence, BodySentence
-from database.results import get_pmcid, get_pmcid_in_result, save_article, save_result, save_abstract_sentences, \
-    save_body_sentences
+from database.models import Article, Job, JOB_STATUS_CHOICES, Result, AbstractSentence, BodySentence, Sentence
+from database.pool import unit_of_work
+from database.metadata import metadata
+from database.results import get_pmcid, get_pmcid_in_result, get_primary_id_results, save_article, save_result, \
+    save_abstract_sentences, save_body_sentences
 from database.tests.test_base import DBTestCase
 
 
@@ -55,6 +57,29 @@ class ResultsTestCase(DBTestCase):
                 result.append(row.pmcid)
         assert new_pmcid in result
 
+    @unittest_run_loop
+    async def test_save_existing_article_in_transaction(self):
+        async with unit_of_work(self.app['engine']) as uow:
+            async with uow.connection.begin():
+                await save_article(uow, {"pmcid": self.pmcid})
+                new_result = await save_result(uow, {"pmcid": self.pmcid, "job_id": self.job_id})
+        assert new_result is not None
+        result = await get_pmcid_in_result(self.app['engine'], self.job_id)
+        assert result.count(self.pmcid) == 1
+
+    @unittest_run_loop
+    async def test_save_existing_result(self):
+        new_pmcid = "PMC123456"
+        await save_article(self.app['engine'], {"pmcid": new_pmcid})
+        async with unit_of_work(self.app['engine']) as uow:
+            async with uow.connection.begin():
+                result_id = await save_result(uow, {"pmcid": new_pmcid, "job_id": self.job_id})
+                # the same article listed twice does not abort the transaction
+                assert await save_result(uow, {"pmcid": new_pmcid, "job_id": self.job_id}) == result_id
+                await save_abstract_sentences(uow, [{"result_id": result_id, "sentence": "urs0002 in a sentence"}])
+        result = await get_pmcid_in_result(self.app['engine'], self.job_id)
+        assert result.count(new_pmcid) == 1
+
     @unittest_run_loop
     async def test_result_saved(self):
         result = await get_pmcid_in_result(self.app['engine'], self.job_id)
@@ -80,8 +105,8 @@ class ResultsTestCase(DBTestCase):
             await save_abstract_sentences(self.app['engine'], sentences)
 
             # get sentence
-            query = (sa.select([AbstractSentence.c.sentence])
-                     .select_from(AbstractSentence)
+            query = (sa.select([Sentence.c.sentence])
+                     .select_from(AbstractSentence.join(Sentence, Sentence.c.id == AbstractSentence.c.sentence_id))
                      .where(AbstractSentence.c.result_id == result_id))
             result = []
             async for row in await connection.execute(query):
@@ -102,11 +127,69 @@ class ResultsTestCase(DBTestCase):
             await save_body_sentences(self.app['engine'], sentences)
 
             # get sentence
-            query = (sa.select([BodySentence.c.sentence])
-                     .select_from(BodySentence)
+            query = (sa.select([Sentence.c.sentence])
+                     .select_from(BodySentence.join(Sentence, Sentence.c.id == BodySentence.c.sentence_id))
                      .where(BodySentence.c.result_id == result_id))
             result = []
             async for row in await connection.execute(query):
                 result.append(row.sentence)
 
             assert self.job_id in result[0]
+
+    @unittest_run_loop
+    async def test_sentences_shared_by_jobs(self):
+        # the same sentence found in two articles
+        await save_article(self.app['engine'], {"pmcid": "PMC3456789"})
+        result_ids = [await save_result(self.app['engine'], {"pmcid": "PMC3456789", "job_id": self.job_id})]
+        async with self.app['engine'].acquire() as connection:
+            query = (sa.select([Result.c.id]).select_from(Result).where(Result.c.pmcid == self.pmcid))
+            async for row in connection.execute(query):
+                result_ids.append(row.id)
+
+        sentence = "The expression of urs0002 was measured in all samples."
+        for result_id in result_ids:
+            await save_body_sentences(self.app['engine'], [
+                {"result_id": result_id, "sentence": sentence, "location": "results", "match_start": 18,
+                 "match_end": 25}
+            ])
+
+        async with self.app['engine'].acquire() as connection:
+            query = (sa.select([sa.func.count(Sentence.c.id)]).select_from(Sentence))
+            async for row in connection.execute(query):
+                assert row[0] == 1
+
+            query = (sa.select([Sentence.c.sentence, BodySentence.c.match_start, BodySentence.c.match_end])
+                     .select_from(BodySentence.join(Sentence, Sentence.c.id == BodySentence.c.sentence_id)))
+            rows = [row async for row in await connection.execute(query)]
+            assert len(rows) == 2
+            assert all(row.sentence[row.match_start:row.match_end] == self.job_id for row in rows)
+
+    @unittest_run_loop
+    async def test_get_primary_id_results(self):
+        async with self.app['engine'].acquire() as connection:
+            for job_id in ['16s rrna', '16s']:
+                await connection.execute(Job.insert().values(job_id=job_id, display_id=job_id))
+        await metadata(self.app['engine'], [
+            {"job_id": "16s rrna", "name": "rnacentral", "primary_id": self.job_id},
+            {"job_id": "16s", "name": "rnacentral", "primary_id": self.job_id},
+        ])
+        await save_article(self.app['engine'], {"pmcid": "PMC3456789"})
+
+        sentence = "The 16s rrna of urs0002 was sequenced."
+        for job_id in ['16s rrna', '16s']:
+            result_id = await save_result(self.app['engine'], {"pmcid": self.pmcid, "job_id": job_id})
+            await save_abstract_sentences(self.app['engine'], [{"result_id": result_id, "sentence": sentence}])
+        await save_result(self.app['engine'], {"pmcid": "PMC3456789", "job_id": "16s"})
+
+        job_ids, total, articles = await get_primary_id_results(self.app['engine'], 'URS0002')
+        assert job_ids == ['16s', '16s rrna', self.job_id]
+        assert total == 2
+        assert [item['pmcid'] for item in articles] == [self.pmcid, "PMC3456789"]
+        # "16s" is contained in "16s rrna", so it is only kept in the article where "16s rrna" was not found
+        assert articles[0]['job_ids'] == ['16s rrna', self.job_id]
+        assert articles[0]['abstract_sentence'] == [sentence]
+        assert articles[1]['job_ids'] == ['16s']
+
+        job_ids, total, articles = await get_primary_id_results(self.app['engine'], self.job_id, page=2, page_size=1)
+        assert total == 2
+        assert [item['pmcid'] for item in articles] == ["PMC3456789"]
@@ -0,0 +1,79 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from aiohttp.test_utils import unittest_run_loop
+from database.metadata import metadata
+from database.models import Article, Job, JOB_STATUS_CHOICES
+from database.results import save_abstract_sentences, save_body_sentences, save_result
+from database.search import search_sentences
+from database.tests.test_base import DBTestCase
+
+
+class SearchTestCase(DBTestCase):
+    """
+    Run this test with the following command:
+    ENVIRONMENT=TEST python -m unittest database.tests.test_search
+    """
+    async def setUpAsync(self):
+        await super().setUpAsync()
+
+        async with self.app['engine'].acquire() as connection:
+            for job_id in ['mir-21', 'hotair']:
+                await connection.execute(Job.insert().values(
+                    job_id=job_id, display_id=job_id.upper(), status=JOB_STATUS_CHOICES.success)
+                )
+            for pmcid in ['PMC1', 'PMC2']:
+                await connection.execute(Article.insert().values(pmcid=pmcid, title='Title of %s' % pmcid))
+
+        await metadata(self.app['engine'], [{"job_id": "mir-21", "name": "mirbase", "primary_id": None}])
+
+        result_id = await save_result(self.app['engine'], {"pmcid": "PMC1", "job_id": "mir-21"})
+        await save_abstract_sentences(self.app['engine'], [
+            {"result_id": result_id, "sentence": "Knockdown of mir-21 reduced the growth of the cells."}
+        ])
+        await save_body_sentences(self.app['engine'], [
+            {"result_id": result_id, "sentence": "mir-21 knockdown knockdown in vivo.", "location": "results"},
+            {"result_id": result_id, "sentence": "mir-21 is expressed in the liver.", "location": "intro"},
+        ])
+
+        result_id = await save_result(self.app['engine'], {"pmcid": "PMC2", "job_id": "hotair"})
+        await save_body_sentences(self.app['engine'], [
+            {"result_id": result_id, "sentence": "The knockdown of hotair was efficient.", "location": "method"}
+        ])
+
+    @unittest_run_loop
+    async def test_search_ranked(self):
+        total, sentences = await search_sentences(self.app['engine'], 'knockdown')
+        assert total == 3
+        assert sentences[0]['sentence'] == "mir-21 knockdown knockdown in vivo."
+        assert sentences[0]['title'] == 'Title of PMC1'
+        assert sentences[0]['location'] == 'results'
+
+    @unittest_run_loop
+    async def test_search_by_job_id_and_database(self):
+        total, sentences = await search_sentences(self.app['engine'], 'knockdown', job_id='HOTAIR')
+        assert total == 1
+        assert sentences[0]['pmcid'] == 'PMC2'
+
+        total, sentences = await search_sentences(self.app['engine'], 'knockdown', database='mirbase')
+        assert total == 2
+        assert {item['job_id'] for item in sentences} == {'mir-21'}
+
+    @unittest_run_loop
+    async def test_search_pagination(self):
+        total, sentences = await search_sentences(self.app['engine'], 'knockdown', page=2, page_size=2)
+        assert total == 3
+        assert len(sentences) == 1
+
+        total, sentences = await search_sentences(self.app['engine'], 'liver -mir')
+        assert total == 0
+        assert sentences == []
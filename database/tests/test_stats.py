@@ -0,0 +1,87 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from aiohttp.test_utils import unittest_run_loop
+from database.metadata import metadata
+from database.models import Article, Job, JOB_STATUS_CHOICES
+from database.results import save_result
+from database.stats import get_database_stats, get_job_stats, get_year_stats, refresh_job_stats
+from database.tests.test_base import DBTestCase
+
+
+class StatsTestCase(DBTestCase):
+    """
+    Run this test with the following command:
+    ENVIRONMENT=TEST python -m unittest database.tests.test_stats
+    """
+    async def setUpAsync(self):
+        await super().setUpAsync()
+
+        async with self.app['engine'].acquire() as connection:
+            for job_id in ['mir-21', 'hsa-mir-21']:
+                await connection.execute(Job.insert().values(
+                    job_id=job_id, display_id=job_id.upper(), status=JOB_STATUS_CHOICES.success)
+                )
+            await connection.execute(Article.insert().values(pmcid='PMC1', year=2020, rna_related=True))
+            await connection.execute(Article.insert().values(pmcid='PMC2', year=2021, rna_related=False))
+            await connection.execute(Article.insert().values(pmcid='PMC3', year=None, retracted=True))
+
+        await metadata(self.app['engine'], [{"job_id": "mir-21", "name": "mirbase", "primary_id": "hsa-mir-21"}])
+
+        for pmcid in ['PMC1', 'PMC2', 'PMC3']:
+            await save_result(self.app['engine'], {"pmcid": pmcid, "job_id": "mir-21"})
+        await save_result(self.app['engine'], {"pmcid": "PMC1", "job_id": "hsa-mir-21"})
+
+        await refresh_job_stats(self.app['engine'], 'MIR-21')
+        await refresh_job_stats(self.app['engine'], 'hsa-mir-21')
+
+    @unittest_run_loop
+    async def test_get_job_stats(self):
+        stats = await get_job_stats(self.app['engine'], 'mir-21')
+        assert stats == {
+            'job_id': 'mir-21',
+            'hits': 3,
+            'rna_related': 1,
+            'retracted': 1,
+            'years': [{'year': None, 'hits': 1}, {'year': 2020, 'hits': 1}, {'year': 2021, 'hits': 1}]
+        }
+        assert await get_job_stats(self.app['engine'], 'urs0001') is None
+
+    @unittest_run_loop
+    async def test_get_job_stats_without_hits(self):
+        async with self.app['engine'].acquire() as connection:
+            await connection.execute(Job.insert().values(
+                job_id='urs0001', display_id='URS0001', status=JOB_STATUS_CHOICES.success)
+            )
+        await refresh_job_stats(self.app['engine'], 'urs0001')
+
+        stats = await get_job_stats(self.app['engine'], 'URS0001')
+        assert stats == {'job_id': 'urs0001', 'hits': 0, 'rna_related': 0, 'retracted': 0, 'years': []}
+
+    @unittest_run_loop
+    async def test_refresh_job_stats(self):
+        await save_result(self.app['engine'], {"pmcid": "PMC2", "job_id": "hsa-mir-21"})
+        assert (await get_job_stats(self.app['engine'], 'hsa-mir-21'))['hits'] == 1
+
+        await refresh_job_stats(self.app['engine'], 'hsa-mir-21')
+        assert (await get_job_stats(self.app['engine'], 'hsa-mir-21'))['hits'] == 2
+
+    @unittest_run_loop
+    async def test_get_database_stats(self):
+        stats = await get_database_stats(self.app['engine'])
+        assert stats == [{'database': 'mirbase', 'jobs': 2, 'hits': 4, 'rna_related': 2, 'retracted': 1}]
+
+    @unittest_run_loop
+    async def test_get_year_stats(self):
+        stats = await get_year_stats(self.app['engine'], database='mirbase')
+        assert [(item['year'], item['hits']) for item in stats] == [(None, 1), (2020, 2), (2021, 1)]
+        assert await get_year_stats(self.app['engine'], database='rfam') == []
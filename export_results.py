@@ -132,7 +132,7 @@ async def export_results():
                 for result in results:
                     # get urs
                     urs_sql = sa.text(
-                        '''SELECT primary_id FROM database
+                        '''SELECT primary_id FROM litscan_database
                         WHERE job_id=:job_id AND primary_id LIKE 'urs%' LIMIT 1'''
                     )
                     async for row in connection.execute(urs_sql, job_id=result["job_id"]):
@@ -146,8 +146,10 @@ async def export_results():
                     if "urs" in result and result["id_in_abstract"]:
                         # get sentence in abstract
                         abstract_sql = sa.text(
-                            '''SELECT sentence FROM abstract_sentence
-                            WHERE result_id=:result_id ORDER BY length(sentence) DESC LIMIT 1'''
+                            '''SELECT COALESCE(s.sentence, a.sentence) AS sentence FROM litscan_abstract_sentence a
+                            LEFT JOIN litscan_sentence s ON s.id=a.sentence_id
+                            WHERE a.result_id=:result_id
+                            ORDER BY length(COALESCE(s.sentence, a.sentence)) DESC LIMIT 1'''
                         )
                         async for row in connection.execute(abstract_sql, result_id=result["id"]):
                             abs_sentence = row.sentence
@@ -159,8 +161,10 @@ async def export_results():
                     if "urs" in result and result["id_in_body"]:
                         # get sentence in body
                         body_sql = sa.text(
-                            '''SELECT sentence FROM body_sentence
-                            WHERE result_id=:result_id ORDER BY length(sentence) DESC LIMIT 1'''
+                            '''SELECT COALESCE(s.sentence, b.sentence) AS sentence FROM litscan_body_sentence b
+                            LEFT JOIN litscan_sentence s ON s.id=b.sentence_id
+                            WHERE b.result_id=:result_id
+                            ORDER BY length(COALESCE(s.sentence, b.sentence)) DESC LIMIT 1'''
                         )
                         async for row in connection.execute(body_sql, result_id=result["id"]):
                             body_sentence = row.sentence
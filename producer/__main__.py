@@ -12,6 +12,7 @@ limitations under the License.
 """
 
 import argparse
+import itertools
 import logging
 import asyncio
 
@@ -21,10 +22,14 @@ from aiohttp import ClientSession, web
 
 from . import settings
 from database.job import find_job_to_run
-from database.consumers import find_available_consumers
+from database.job_chunk import find_chunk_to_run
+from database.consumers import find_available_consumers, reclaim_dead_consumers
+from database.migrations import upgrade
 from database.models import close_pg, init_pg, migrate
+from database.pool import unit_of_work
 from database.settings import get_postgres_credentials
 from producer.consumer_jobs import delegate_job_to_consumer
+from producer.job_cost import estimate_job_costs, fair_share_weights
 from .urls import setup_routes
 
 
@@ -36,19 +41,29 @@ async def on_startup(app):
         # create initial migrations in the database
         await migrate(app["settings"].ENVIRONMENT)
 
+    # apply versioned migrations (new columns, tables and indexes) that never drop any data
+    concurrently = hasattr(app["settings"], "MIGRATE_CONCURRENTLY") and app["settings"].MIGRATE_CONCURRENTLY
+    applied = await upgrade(app["engine"], concurrently=concurrently)
+    if applied:
+        logging.info(f"Applied migrations {applied}")
+
     # initialize scheduling tasks to consumers in background
     app["check_jobs_task"] = asyncio.create_task(check_jobs_and_consumers(app))
 
+    # estimate the cost of pending jobs in background
+    app["estimate_jobs_task"] = asyncio.create_task(estimate_job_costs(app))
+
 
 async def on_cleanup(app):
-    # proper cleanup for background task on app shutdown
-    task = app.get("check_jobs_task")
-    if task:
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            logging.info("Background task check_jobs_and_consumers was cancelled")
+    # proper cleanup for background tasks on app shutdown
+    for name in ["check_jobs_task", "estimate_jobs_task"]:
+        task = app.get(name)
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                logging.info(f"Background task {name} was cancelled")
 
     # close the database connection
     await close_pg(app)
@@ -61,21 +76,46 @@ async def check_jobs_and_consumers(app):
     :param app: app object
     :return: None
     """
+    weights = fair_share_weights(settings.FAIR_SHARE_WEIGHTS)
+
     async with ClientSession() as session:
         while True:
             try:
-                # fetch jobs and available consumers
-                unfinished_jobs = await find_job_to_run(app["engine"])
-                available_consumers = await find_available_consumers(app["engine"])
-
-                while unfinished_jobs and available_consumers:
+                # the queries of each round use a single connection
+                async with unit_of_work(app["engine"]) as uow:
+                    # requeue the work of consumers that stopped sending heartbeats
+                    dead_consumers = await reclaim_dead_consumers(uow, settings.HEARTBEAT_TIMEOUT)
+                    if dead_consumers:
+                        logging.warning(f"Consumers marked as dead: {', '.join(dead_consumers)}")
+
+                    # fetch jobs and available consumers
+                    unfinished_jobs = await find_job_to_run(
+                        uow,
+                        policy=settings.SCHEDULING_POLICY,
+                        aging_factor=settings.AGING_FACTOR,
+                        default_cost=settings.DEFAULT_JOB_COST,
+                        weights=weights
+                    )
+                    pending_chunks = await find_chunk_to_run(uow)
+                    available_consumers = await find_available_consumers(uow)
+
+                # take turns between chunks of big jobs and new jobs, so that neither of them has to wait
+                work = []
+                for chunk, job in itertools.zip_longest(pending_chunks, unfinished_jobs):
+                    if chunk:
+                        work.append(chunk)
+                    if job:
+                        work.append((job[0], None))
+
+                while work and available_consumers:
                     consumer = available_consumers.pop(0)
-                    job = unfinished_jobs.pop(0)
+                    job_id, chunk = work.pop(0)
                     await delegate_job_to_consumer(
                         consumer_ip=consumer.ip,
                         consumer_port=consumer.port,
-                        job_id=job[0],
-                        session=session
+                        job_id=job_id,
+                        session=session,
+                        chunk=chunk
                     )
             except Exception as e:
                 logging.error(f"Unexpected error in check_jobs_and_consumers: {str(e)}", exc_info=True)
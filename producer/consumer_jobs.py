@@ -28,19 +28,20 @@ class ConsumerConnectionError(Exception):
         return self.text
 
 
-async def delegate_job_to_consumer(consumer_ip, consumer_port, job_id, session):
+async def delegate_job_to_consumer(consumer_ip, consumer_port, job_id, session, chunk=None):
     """
-    Function for submitting a job to a consumer
+    Function for submitting a job (or a chunk of a job) to a consumer
 
     :param consumer_ip: consumer IP address
     :param consumer_port: consumer port
     :param job_id: id of the job
     :param session: aiohttp session
+    :param chunk: number of the chunk, if the job was split
     :return: nothing is returned here unless something goes wrong :|
     """
     # prepare the data for the request
     url = f"http://{consumer_ip}:{consumer_port}/submit-job"
-    json_data = json.dumps({"job_id": job_id})
+    json_data = json.dumps({"job_id": job_id} if chunk is None else {"job_id": job_id, "chunk": chunk})
     headers = {"content-type": "application/json"}
 
     try:
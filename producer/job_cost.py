@@ -0,0 +1,93 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+import logging
+
+from aiohttp import ClientError, ClientSession
+
+from database.job import find_jobs_without_estimate, save_estimated_hit_count
+from .settings import ENVIRONMENT, EUROPE_PMC
+
+# wait between two requests to respect the Europe PMC rate limit (consumers also use the API)
+PROBE_INTERVAL = 0.5
+
+
+def fair_share_weights(value):
+    """
+    Parse the FAIR_SHARE_WEIGHTS setting
+    :param value: string like "rnacentral:2,rfam:1"
+    :return: dict with the weight of each database
+    """
+    weights = {}
+    for item in value.split(","):
+        if ":" in item:
+            name, weight = item.split(":", 1)
+            weights[name.strip().lower()] = float(weight)
+    return weights
+
+
+async def fetch_hit_count(session, job_id, query_filter):
+    """
+    Ask Europe PMC how many articles a job will have to search. This is a cheap
+    request (pageSize=1) that uses the same query as the consumer.
+    :param session: aiohttp session
+    :param job_id: id of the job (display_id)
+    :param query_filter: query used to filter results
+    :return: hitCount or None if Europe PMC could not be reached
+    """
+    # same changes the consumer makes to the query
+    query_filter = query_filter.lower().replace(job_id.lower(), "") if query_filter else None
+    query_filter = f' AND {query_filter}' if query_filter else ''
+    params = {
+        "query": f'("{job_id}"{query_filter} AND IN_EPMC:Y AND OPEN_ACCESS:Y AND NOT SRC:PPR)',
+        "resultType": "idlist",
+        "pageSize": 1,
+        "format": "json",
+    }
+
+    try:
+        async with session.get(EUROPE_PMC + "search", params=params, timeout=10) as response:
+            data = await response.json(content_type=None)
+    except (ClientError, asyncio.TimeoutError, ValueError) as e:
+        logging.debug(f"Failed to estimate hit_count for job_id {job_id}. Error message: {e}")
+        return None
+
+    try:
+        return int(data["hitCount"])
+    except (KeyError, TypeError, ValueError):
+        # invalid queries are not going to find anything, so the job is cheap
+        logging.debug(f"Europe PMC did not return hitCount for job_id {job_id}: {data}")
+        return 0
+
+
+async def estimate_job_costs(app):
+    """
+    Periodically estimate the cost of pending jobs, so that they can be scheduled by size
+
+    :param app: app object
+    :return: None
+    """
+    async with ClientSession() as session:
+        while True:
+            try:
+                if ENVIRONMENT != "TEST":
+                    for job in await find_jobs_without_estimate(app["engine"]):
+                        hit_count = await fetch_hit_count(session, job["display_id"], job["query"])
+                        if hit_count is not None:
+                            await save_estimated_hit_count(app["engine"], job["job_id"], hit_count)
+                        await asyncio.sleep(PROBE_INTERVAL)
+            except Exception as e:
+                logging.error(f"Unexpected error in estimate_job_costs: {str(e)}", exc_info=True)
+            finally:
+                await asyncio.sleep(3)
@@ -0,0 +1,33 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+# maximum number of items (e.g. sentences or articles) in each page
+MAX_PAGE_SIZE = 100
+
+
+def parse_page(query, default_page_size=20):
+    """
+    Get the pagination params from the query string
+    :param query: request.query
+    :param default_page_size: page_size used when it is not in the query string
+    :return: page and page_size
+    """
+    try:
+        page = int(query.get("page", 1))
+        page_size = int(query.get("page_size", default_page_size))
+    except ValueError:
+        raise ValueError("page and page_size must be integers")
+
+    if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise ValueError("page must be positive and page_size between 1 and %s" % MAX_PAGE_SIZE)
+
+    return page, page_size
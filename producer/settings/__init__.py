@@ -44,6 +44,40 @@ elif ENVIRONMENT == "TEST":
 elif ENVIRONMENT == "PRODUCTION":
     from .production import *
 
+# Europe PMC API, used to estimate the number of articles of each job
+EUROPE_PMC = "https://www.ebi.ac.uk/europepmc/webservices/rest/"
+
+# how pending jobs are delivered to consumers: fifo, sjf (shortest job first) or fair_share
+SCHEDULING_POLICY = 'sjf'
+
+# jobs waiting in the queue get cheaper by this factor per hour, so that big jobs still make progress
+AGING_FACTOR = 1.0
+
+# cost used for jobs whose hit_count has not been estimated yet
+DEFAULT_JOB_COST = 1000
+
+# weights used by the fair_share policy, e.g. "rnacentral:2,rfam:1" (databases not listed have weight 1)
+FAIR_SHARE_WEIGHTS = ''
+
+# build the indexes of versioned migrations with CREATE INDEX CONCURRENTLY, so that tables are not locked
+MIGRATE_CONCURRENTLY = ENVIRONMENT == "PRODUCTION"
+
+# database driver used by the database functions: aiopg or asyncpg (prepared statements cached per connection)
+DATABASE_DRIVER = 'aiopg'
+
+# number of connections kept open (POOL_MINSIZE) and maximum number of connections of the pool
+POOL_MINSIZE = 1
+POOL_MAXSIZE = 10
+
+# statements running for longer than this number of milliseconds are cancelled (0 disables it)
+STATEMENT_TIMEOUT = 60000
+
+# seconds to wait for a free connection of the pool before giving up
+ACQUIRE_TIMEOUT = 30.0
+
+# consumers that do not send a heartbeat for this number of seconds are marked as dead and their jobs are requeued
+HEARTBEAT_TIMEOUT = 60
+
 
 def substitute_environment_variables():
     """
@@ -86,3 +86,54 @@ class JobResultsTestCase(AioHTTPTestCase):
         async with self.client.get(path='/api/results/foo') as response:
             text = await response.text()
             assert json.loads(text) == []
+
+    @unittest_run_loop
+    async def test_job_result_fields(self):
+        async with self.client.get(path='/api/results/urs0005?fields=pmcid,rna_related') as response:
+            assert response.status == 200
+            text = await response.text()
+            assert json.loads(text) == [{'pmcid': self.pmcid, 'rna_related': None}]
+
+    @unittest_run_loop
+    async def test_job_result_filters(self):
+        async with self.client.get(path='/api/results/urs0005?year_from=2000&retracted=false') as response:
+            assert response.status == 200
+            text = await response.text()
+            assert json.loads(text) == []
+
+    @unittest_run_loop
+    async def test_job_result_pages(self):
+        async with self.app['engine'].acquire() as connection:
+            for pmcid in ['PMC1', 'PMC2']:
+                await connection.execute(Article.insert().values(pmcid=pmcid))
+                await connection.execute(Result.insert().values(job_id=self.job_id, pmcid=pmcid))
+
+        pages = []
+        for page in [1, 2, 3]:
+            path = '/api/results/urs0005?fields=pmcid&page_size=2&page=%s' % page
+            async with self.client.get(path=path) as response:
+                assert response.status == 200
+                pages.append([item['pmcid'] for item in json.loads(await response.text())])
+        assert pages == [[self.pmcid, 'PMC1'], ['PMC2'], []]
+
+    @unittest_run_loop
+    async def test_job_result_invalid_filters(self):
+        for query in ['rna_related=yes', 'year_from=recent', 'section=figures', 'fields=pmcid,password',
+                      'page=0', 'page_size=1000']:
+            async with self.client.get(path='/api/results/urs0005?' + query) as response:
+                assert response.status == 400
+
+    @unittest_run_loop
+    async def test_primary_id_result(self):
+        async with self.client.get(path='/api/primary-id-results/URS0005') as response:
+            assert response.status == 200
+            data = json.loads(await response.text())
+            assert data['job_ids'] == [self.job_id]
+            assert data['total'] == 1
+            assert [item['pmcid'] for item in data['results']] == [self.pmcid]
+
+        async with self.client.get(path='/api/primary-id-results/urs0005?page_size=1000') as response:
+            assert response.status == 400
+
+        async with self.client.get(path='/api/primary-id-results/foo') as response:
+            assert response.status == 404
@@ -0,0 +1,78 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+import logging
+
+from aiohttp.test_utils import unittest_run_loop
+from aiohttp.test_utils import AioHTTPTestCase
+
+from producer.__main__ import create_app
+from database.models import Job, JOB_STATUS_CHOICES
+from database.settings import get_postgres_credentials
+
+
+class JobStatusTestCase(AioHTTPTestCase):
+    """
+    Recreate the test database by running:
+    ENVIRONMENT=TEST python3 -m database
+
+    Run these tests with:
+    ENVIRONMENT=TEST python3 -m unittest producer.tests.test_job_status
+    """
+    async def get_application(self):
+        logging.basicConfig(level=logging.ERROR)  # subdue messages like 'DEBUG:asyncio:Using selector: KqueueSelector'
+        app = create_app()
+        settings = get_postgres_credentials(ENVIRONMENT='TEST')
+        app.update(name='test', settings=settings)
+        return app
+
+    async def setUpAsync(self):
+        await super().setUpAsync()
+
+        async with self.app['engine'].acquire() as connection:
+            await connection.execute(Job.insert().values(job_id='urs0006', status=JOB_STATUS_CHOICES.success))
+            await connection.execute(Job.insert().values(job_id='urs0007', status=JOB_STATUS_CHOICES.error))
+
+    async def tearDownAsync(self):
+        async with self.app['engine'].acquire() as connection:
+            await connection.execute('DELETE FROM litscan_job')
+
+        await super().tearDownAsync()
+
+    @unittest_run_loop
+    async def test_job_status_missing_params(self):
+        async with self.client.post(path='/api/job-status', data=json.dumps({"job_ids": "urs0006"})) as response:
+            assert response.status == 400
+
+        async with self.client.get(path='/api/job-status') as response:
+            assert response.status == 400
+
+    @unittest_run_loop
+    async def test_job_status_success(self):
+        data = json.dumps({"job_ids": ["URS0006", "urs0007", "urs0008"]})
+        async with self.client.post(path='/api/job-status', data=data) as response:
+            assert response.status == 200
+            data = json.loads(await response.text())
+            assert [job['job_id'] for job in data['jobs']] == ['urs0006', 'urs0007']
+            assert data['summary'] == {'success': 1, 'error': 1}
+            assert data['not_found'] == ['urs0008']
+
+    @unittest_run_loop
+    async def test_job_status_stream(self):
+        # all jobs are finished, so the stream ends right after the first event
+        async with self.client.get(path='/api/job-status?job_ids=urs0006,urs0007&stream=true') as response:
+            assert response.status == 200
+            assert response.headers['Content-Type'] == 'text/event-stream'
+            text = await response.text()
+            assert text.startswith('event: status\n')
+            assert 'event: done\ndata: {"summary": {"success": 1, "error": 1}}' in text
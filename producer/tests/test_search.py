@@ -0,0 +1,59 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+import logging
+
+from aiohttp.test_utils import unittest_run_loop
+from aiohttp.test_utils import AioHTTPTestCase
+
+from producer.__main__ import create_app
+from database.settings import get_postgres_credentials
+
+
+class SearchTestCase(AioHTTPTestCase):
+    """
+    Recreate the test database by running:
+    ENVIRONMENT=TEST python3 -m database
+
+    Run these tests with:
+    ENVIRONMENT=TEST python3 -m unittest producer.tests.test_search
+    """
+    async def get_application(self):
+        logging.basicConfig(level=logging.ERROR)  # subdue messages like 'DEBUG:asyncio:Using selector: KqueueSelector'
+        app = create_app()
+        settings = get_postgres_credentials(ENVIRONMENT='TEST')
+        app.update(name='test', settings=settings)
+        return app
+
+    @unittest_run_loop
+    async def test_search_without_query(self):
+        async with self.client.get(path='/api/search?job_id=urs0005') as response:
+            assert response.status == 400
+
+    @unittest_run_loop
+    async def test_search_invalid_page_size(self):
+        async with self.client.get(path='/api/search?query=knockdown&page_size=1000') as response:
+            assert response.status == 400
+
+    @unittest_run_loop
+    async def test_search_success(self):
+        async with self.client.get(path='/api/search?query=knockdown&job_id=urs0005') as response:
+            assert response.status == 200
+            text = await response.text()
+            assert json.loads(text) == {"query": "knockdown", "total": 0, "page": 1, "page_size": 20, "results": []}
+
+    @unittest_run_loop
+    async def test_search_invalid_query(self):
+        async with self.client.get(path='/api/search?query=knock%00down') as response:
+            assert response.status == 400
+            assert "Error" in json.loads(await response.text())
@@ -0,0 +1,66 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import json
+import logging
+
+from aiohttp.test_utils import unittest_run_loop
+from aiohttp.test_utils import AioHTTPTestCase
+
+from producer.__main__ import create_app
+from database.models import Job
+from database.settings import get_postgres_credentials
+
+
+class StatsTestCase(AioHTTPTestCase):
+    """
+    Recreate the test database by running:
+    ENVIRONMENT=TEST python3 -m database
+
+    Run these tests with:
+    ENVIRONMENT=TEST python3 -m unittest producer.tests.test_stats
+    """
+    async def get_application(self):
+        logging.basicConfig(level=logging.ERROR)  # subdue messages like 'DEBUG:asyncio:Using selector: KqueueSelector'
+        app = create_app()
+        settings = get_postgres_credentials(ENVIRONMENT='TEST')
+        app.update(name='test', settings=settings)
+        return app
+
+    @unittest_run_loop
+    async def test_job_stats_not_found(self):
+        async with self.client.get(path='/api/stats/jobs/urs0005') as response:
+            assert response.status == 404
+
+    @unittest_run_loop
+    async def test_job_stats_without_hits(self):
+        async with self.app['engine'].acquire() as connection:
+            await connection.execute(Job.insert().values(job_id='urs0005', display_id='URS0005'))
+        try:
+            async with self.client.get(path='/api/stats/jobs/URS0005') as response:
+                assert response.status == 200
+                assert json.loads(await response.text())['hits'] == 0
+        finally:
+            async with self.app['engine'].acquire() as connection:
+                await connection.execute('DELETE FROM litscan_job')
+
+    @unittest_run_loop
+    async def test_database_stats(self):
+        async with self.client.get(path='/api/stats/databases') as response:
+            assert response.status == 200
+            assert json.loads(await response.text()) == []
+
+    @unittest_run_loop
+    async def test_year_stats(self):
+        async with self.client.get(path='/api/stats/years?database=rfam') as response:
+            assert response.status == 200
+            assert json.loads(await response.text()) == []
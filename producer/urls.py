@@ -13,7 +13,9 @@ limitations under the License.
 from aiohttp import web
 from aiohttp_swagger import setup_swagger
 
-from producer.views import index, job_result, submit_job, submit_multiple_jobs
+from producer.views import index, job_result, job_status, primary_id_result, search, stats, submit_job, \
+    submit_multiple_jobs
+from database.pool import pool_metrics
 
 
 def setup_routes(app):
@@ -21,6 +23,14 @@ def setup_routes(app):
     app.add_routes([web.post('/api/submit-job', submit_job.submit_job)])
     app.add_routes([web.post('/api/multiple-jobs', submit_multiple_jobs.submit_multiple_jobs)])
     app.add_routes([web.get('/api/results/{job_id:.*}', job_result.job_result)])
+    app.add_routes([web.get('/api/primary-id-results/{primary_id:.*}', primary_id_result.primary_id_result)])
+    app.add_routes([web.get('/api/job-status', job_status.job_status)])
+    app.add_routes([web.post('/api/job-status', job_status.job_status)])
+    app.add_routes([web.get('/api/pool-metrics', pool_metrics)])
+    app.add_routes([web.get('/api/search', search.search)])
+    app.add_routes([web.get('/api/stats/jobs/{job_id:.*}', stats.job_stats)])
+    app.add_routes([web.get('/api/stats/databases', stats.database_stats)])
+    app.add_routes([web.get('/api/stats/years', stats.year_stats)])
 
     # setup swagger documentation
     setup_swagger(app, swagger_url="api/doc", title="RNAcentral references", description="")
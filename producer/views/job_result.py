@@ -14,22 +14,72 @@ limitations under the License.
 from aiohttp import web
 from aiojobs.aiohttp import atomic
 
-from database.results import get_job_results
+from database.results import get_job_results, OPTIONAL_RESULT_FIELDS, RESULT_FIELDS, SECTIONS
 from database import DatabaseConnectionError
+from producer.pagination import MAX_PAGE_SIZE, parse_page
+
+
+def parse_bool(value):
+    """
+    Convert a query param to bool
+    :param value: true or false
+    :return: bool
+    """
+    if value.lower() not in ("true", "false"):
+        raise ValueError("%s is not true or false" % value)
+    return value.lower() == "true"
+
+
+def parse_filters(query):
+    """
+    Get the filters and fields of job_result from the query string
+    :param query: request.query
+    :return: dict with the params of get_job_results
+    """
+    converters = {
+        "year_from": int,
+        "year_to": int,
+        "rna_related": parse_bool,
+        "min_probability": float,
+        "section": str,
+        "retracted": parse_bool,
+        "id_in_title": parse_bool,
+    }
+    params = {name: convert(query[name]) for name, convert in converters.items() if name in query}
+
+    if "section" in params and params["section"] not in SECTIONS:
+        raise ValueError("section must be one of %s" % ", ".join(SECTIONS))
+
+    if "fields" in query:
+        params["fields"] = [field.strip() for field in query["fields"].split(",") if field.strip()]
+        unknown = [field for field in params["fields"] if field not in RESULT_FIELDS + OPTIONAL_RESULT_FIELDS]
+        if unknown:
+            raise ValueError("Unknown fields: %s" % ", ".join(unknown))
+
+    return params
 
 
 @atomic
 async def job_result(request):
     """
-    Function that returns job results
-    :param request: used to get job_id and params to connect to the db
+    Function that returns job results. Results can be filtered with the params year_from, year_to, rna_related,
+    min_probability, section, retracted and id_in_title, fields selects the fields of each result, and page and
+    page_size select the page (MAX_PAGE_SIZE results by default), e.g.
+    curl "localhost:8080/api/results/RF00001?year_from=2015&retracted=false&fields=pmcid,title&page=2"
+    :param request: used to get job_id, filters, pagination and params to connect to the db
     :return: list of json object
     """
     job_id = request.match_info['job_id'].lower()
     engine = request.app['engine']
 
     try:
-        results = await get_job_results(engine, job_id)
+        filters = parse_filters(request.query)
+        filters["page"], filters["page_size"] = parse_page(request.query, default_page_size=MAX_PAGE_SIZE)
+    except ValueError as e:
+        return web.json_response({"Error": str(e)}, status=400)
+
+    try:
+        results = await get_job_results(engine, job_id, **filters)
     except DatabaseConnectionError as e:
         raise web.HTTPNotFound() from e
 
@@ -0,0 +1,168 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import json
+
+from aiohttp import web
+
+from database import DatabaseConnectionError
+from database.job import get_jobs_status
+from database.models import JOB_STATUS_CHOICES
+
+# seconds between two reads of the status in stream mode
+STREAM_INTERVAL = 5
+
+# the stream is closed after this number of seconds, even if some jobs are still running
+STREAM_TIMEOUT = 3600
+
+# maximum number of streams open at the same time (each one reads the database every STREAM_INTERVAL seconds)
+MAX_STREAMS = 20
+
+# ids of the requests with an open stream in this process (requests are not hashable in recent versions of aiohttp)
+open_streams = set()
+
+
+def summary(jobs):
+    """
+    Count the jobs of each status
+    :param jobs: list of dicts returned by get_jobs_status
+    :return: dict with the number of jobs of each status
+    """
+    output = {}
+    for job in jobs:
+        output[job["status"]] = output.get(job["status"], 0) + 1
+    return output
+
+
+async def parse_params(request):
+    """
+    Get the ids, the database and the stream option from the json body (POST) or from the query string (GET)
+    :param request: used to get the params
+    :return: job_ids, database and stream
+    """
+    if request.method == "POST":
+        try:
+            data = await request.json()
+        except ValueError:
+            raise ValueError("Please check the parameters used in the search")
+        if not isinstance(data, dict):
+            raise ValueError("Please check the parameters used in the search")
+        job_ids = data.get("job_ids", [])
+        database = data.get("database")
+        stream = data.get("stream", False)
+    else:
+        job_ids = [item.strip() for item in request.query.get("job_ids", "").split(",") if item.strip()]
+        database = request.query.get("database")
+        stream = request.query.get("stream", "false").lower() == "true"
+
+    if not isinstance(job_ids, list) or not all(isinstance(item, str) for item in job_ids):
+        raise ValueError("You must submit a list of ids in the job_ids param")
+    if database is not None and not isinstance(database, str):
+        raise ValueError("You must submit a single database in string format")
+    if not job_ids and not database:
+        raise ValueError("You must submit job_ids and/or database as a parameter")
+    if type(stream) is not bool:
+        raise ValueError("You must pass true or false in the stream param")
+
+    return job_ids, database, stream
+
+
+async def send_event(response, event, data):
+    """
+    Write a server-sent event
+    :param response: StreamResponse
+    :param event: name of the event
+    :param data: json serializable object
+    :return: None
+    """
+    await response.write(("event: %s\ndata: %s\n\n" % (event, json.dumps(data))).encode("utf-8"))
+
+
+async def stream_status(request, job_ids, database, jobs):
+    """
+    Send the status of the jobs as server-sent events. The first event (status) has all the jobs,
+    the next ones (change) only the jobs whose status or hit_count changed. The stream ends with
+    the event done when all jobs are finished (success or error), or after STREAM_TIMEOUT seconds.
+    :param request: used to connect to the db
+    :param job_ids: list of ids
+    :param database: name of the Expert Database
+    :param jobs: status of the jobs when the stream starts
+    :return: StreamResponse
+    """
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await response.prepare(request)
+
+    finished = (JOB_STATUS_CHOICES.success, JOB_STATUS_CHOICES.error)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_TIMEOUT
+
+    try:
+        await send_event(response, "status", {"jobs": jobs, "summary": summary(jobs)})
+        previous = {job["job_id"]: job for job in jobs}
+
+        while not all(job["status"] in finished for job in previous.values()) and loop.time() < deadline:
+            await asyncio.sleep(STREAM_INTERVAL)
+            jobs = await get_jobs_status(request.app["engine"], job_ids, database)
+            changed = [job for job in jobs if previous.get(job["job_id"]) != job]
+            if changed:
+                await send_event(response, "change", {"jobs": changed, "summary": summary(jobs)})
+            else:
+                # comment line, so that proxies do not close an idle connection
+                await response.write(b": keep-alive\n\n")
+            previous = {job["job_id"]: job for job in jobs}
+
+        await send_event(response, "done", {"summary": summary(previous.values())})
+    except (ConnectionResetError, DatabaseConnectionError):
+        # the client went away or the database is not available, there is nobody to report it to
+        pass
+
+    return response
+
+
+async def job_status(request):
+    """
+    Function that returns the status of a list of jobs and/or of all jobs of an Expert Database. Run this command to test:
+    curl -H "Content-Type:application/json" -d "{\"job_ids\": [\"RF00001\", \"RF00002\"]}" localhost:8080/api/job-status
+    Use stream=true to receive the changes as server-sent events until all jobs are finished, e.g.
+    curl -N "localhost:8080/api/job-status?database=rfam&stream=true"
+    :param request: used to get the params (job_ids, database, stream) and to connect to the db
+    :return: json with the status, hit_count, submitted and finished of each job and the number of jobs of each status
+    """
+    # not @atomic like the other views: a stream would hold a slot of the aiojobs scheduler for up to STREAM_TIMEOUT
+    # seconds, and this view only reads from the database, so it can be cancelled when the client goes away
+    try:
+        job_ids, database, stream = await parse_params(request)
+    except ValueError as e:
+        return web.json_response({"Error": str(e)}, status=400)
+
+    try:
+        jobs = await get_jobs_status(request.app["engine"], job_ids, database)
+    except DatabaseConnectionError as e:
+        raise web.HTTPNotFound() from e
+
+    if stream:
+        if len(open_streams) >= MAX_STREAMS:
+            return web.json_response({"Error": "Too many open streams, please try again later"}, status=503)
+
+        open_streams.add(id(request))
+        try:
+            return await stream_status(request, job_ids, database, jobs)
+        finally:
+            open_streams.discard(id(request))
+
+    found = {job["job_id"] for job in jobs}
+    return web.json_response({
+        "jobs": jobs,
+        "summary": summary(jobs),
+        "not_found": [job_id for job_id in job_ids if job_id.lower() not in found]
+    })
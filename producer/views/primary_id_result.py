@@ -0,0 +1,53 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from aiohttp import web
+from aiojobs.aiohttp import atomic
+
+from database import DatabaseConnectionError
+from database.results import get_primary_id_results
+from producer.pagination import parse_page
+
+
+@atomic
+async def primary_id_result(request):
+    """
+    Function that returns the results of a primary_id and all its synonyms, merged by article. Run this command to test:
+    curl "localhost:8080/api/primary-id-results/URS000075A546_9606?page=1&page_size=20"
+    :param request: used to get primary_id, the params (page, page_size) and to connect to the db
+    :return: json with the ids searched, the total number of articles and the articles of the page
+    """
+    primary_id = request.match_info['primary_id'].lower()
+
+    try:
+        page, page_size = parse_page(request.query)
+    except ValueError as e:
+        return web.json_response({"Error": str(e)}, status=400)
+
+    try:
+        job_ids, total, results = await get_primary_id_results(
+            request.app['engine'], primary_id, page=page, page_size=page_size
+        )
+    except DatabaseConnectionError as e:
+        raise web.HTTPNotFound() from e
+
+    if not job_ids:
+        raise web.HTTPNotFound()
+
+    return web.json_response({
+        "primary_id": primary_id,
+        "job_ids": job_ids,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "results": results
+    })
@@ -0,0 +1,65 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import logging
+import psycopg2
+
+from aiohttp import web
+from aiojobs.aiohttp import atomic
+
+from database import DatabaseConnectionError, SQLError
+from database.search import search_sentences
+from producer.pagination import parse_page
+
+
+@atomic
+async def search(request):
+    """
+    Function to search the sentences found by the jobs. Run this command to test:
+    curl "localhost:8080/api/search?query=knockdown&job_id=RF00001&page=1&page_size=20"
+    :param request: used to get the params (query, job_id, database, page, page_size) and to connect to the db
+    :return: json with the total number of sentences found and the sentences of the page, best matches first
+    """
+    query = request.query.get("query", "").strip()
+    if not query:
+        return web.json_response({"Error": "You must submit the text to search for in the query param"}, status=400)
+
+    try:
+        page, page_size = parse_page(request.query)
+    except ValueError as e:
+        return web.json_response({"Error": str(e)}, status=400)
+
+    try:
+        total, sentences = await search_sentences(
+            request.app['engine'],
+            query,
+            job_id=request.query.get("job_id"),
+            database=request.query.get("database"),
+            page=page,
+            page_size=page_size
+        )
+    except DatabaseConnectionError as e:
+        raise web.HTTPNotFound() from e
+    except SQLError as e:
+        # e.g. a query that postgres cannot read
+        if isinstance(e.__cause__, (psycopg2.DataError, ValueError)):
+            return web.json_response({"Error": "Invalid query: %s" % query}, status=400)
+        logging.exception(e)
+        return web.json_response({"Error": "Failed to search the sentences"}, status=500)
+
+    return web.json_response({
+        "query": query,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "results": sentences
+    })
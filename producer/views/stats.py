@@ -0,0 +1,68 @@
+"""
+Copyright [2009-present] EMBL-European Bioinformatics Institute
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+     http://www.apache.org/licenses/LICENSE-2.0
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from aiohttp import web
+from aiojobs.aiohttp import atomic
+
+from database import DatabaseConnectionError
+from database.stats import get_database_stats, get_job_stats, get_year_stats
+
+
+@atomic
+async def job_stats(request):
+    """
+    Function that returns the stats of a job. Run this command to test:
+    curl "localhost:8080/api/stats/jobs/RF00001"
+    :param request: used to get job_id and params to connect to the db
+    :return: json with the number of hits, rna_related and retracted articles, and the hits of each year
+    """
+    try:
+        stats = await get_job_stats(request.app['engine'], request.match_info['job_id'])
+    except DatabaseConnectionError as e:
+        raise web.HTTPNotFound() from e
+
+    if stats is None:
+        raise web.HTTPNotFound()
+
+    return web.json_response(stats)
+
+
+@atomic
+async def database_stats(request):
+    """
+    Function that returns the stats of each Expert Database. Run this command to test:
+    curl "localhost:8080/api/stats/databases"
+    :param request: used to connect to the db
+    :return: list of json objects with the number of jobs, hits, rna_related and retracted articles
+    """
+    try:
+        stats = await get_database_stats(request.app['engine'])
+    except DatabaseConnectionError as e:
+        raise web.HTTPNotFound() from e
+
+    return web.json_response(stats)
+
+
+@atomic
+async def year_stats(request):
+    """
+    Function that returns the number of hits of each year of publication. Run this command to test:
+    curl "localhost:8080/api/stats/years?database=rfam"
+    :param request: used to get the database param and to connect to the db
+    :return: list of json objects with the number of hits, rna_related and retracted articles of each year
+    """
+    try:
+        stats = await get_year_stats(request.app['engine'], database=request.query.get("database"))
+    except DatabaseConnectionError as e:
+        raise web.HTTPNotFound() from e
+
+    return web.json_response(stats)
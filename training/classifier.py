@@ -0,0 +1,184 @@
+import argparse
+import functools
+import hashlib
+import joblib
+import numpy as np
+import os
+import re
+
+
+# classifier used to check if an article is RNA-related
+CLASSIFIER = "training/svc_pipeline.pkl"
+
+# files of the compact version of the classifier (see export_classifier)
+HASHES = "hashes.npy"
+IDF = "idf.npy"
+COEF = "coef.npy"
+INTERCEPT = "intercept.npy"
+CALIBRATION = "calibration.npy"
+CLASSES = "classes.npy"
+VERSION = "version.txt"
+
+# same tokenization as the TfidfVectorizer used in text_classification.py
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def model_version(path=CLASSIFIER):
+    """
+    Version of a classifier, i.e. the hash of the file content. It is saved with the
+    rna_related and probability fields, so that only stale articles need to be reclassified.
+
+    :param path: path to the classifier
+    :return: first 16 characters of the sha256 of the file
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as model_file:
+        for block in iter(lambda: model_file.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()[:16]
+
+
+def token_hash(token):
+    """
+    64-bit hash of a token, used instead of the vocabulary dict of the TfidfVectorizer
+
+    :param token: token
+    :return: hash of the token
+    """
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+
+
+def export_classifier(pipeline, folder, version):
+    """
+    Save the weights of a TfidfVectorizer + CalibratedClassifierCV(LinearSVC) pipeline as NumPy arrays.
+    The vocabulary is replaced by the sorted hashes of the terms, and the columns of the idf and of
+    the coefficients of each fold follow the same order.
+
+    :param pipeline: fitted pipeline
+    :param folder: folder where the arrays will be saved
+    :param version: version of the pipeline (see model_version)
+    :return: None
+    """
+    tfidf = pipeline.named_steps["tfidf"]
+    clf = pipeline.named_steps["clf"]
+    if not tfidf.lowercase or tfidf.ngram_range != (1, 1) or tfidf.norm != "l2" or tfidf.sublinear_tf \
+            or tfidf.token_pattern != TOKEN_PATTERN.pattern or clf.method != "sigmoid" or len(clf.classes_) != 2:
+        raise ValueError("Only binary TfidfVectorizer + CalibratedClassifierCV(method='sigmoid') pipelines "
+                         "with the default tokenization can be exported")
+
+    terms = sorted(tfidf.vocabulary_, key=tfidf.vocabulary_.get)
+    hashes = np.array([token_hash(term) for term in terms], dtype=np.uint64)
+    order = np.argsort(hashes)
+    if len(np.unique(hashes)) != len(hashes):
+        raise ValueError("Two terms of the vocabulary have the same hash")
+
+    folds = clf.calibrated_classifiers_
+    coef = np.vstack([fold.estimator.coef_[0] for fold in folds])
+    intercept = np.array([fold.estimator.intercept_[0] for fold in folds])
+    calibration = np.array([[fold.calibrators[0].a_, fold.calibrators[0].b_] for fold in folds])
+
+    os.makedirs(folder, exist_ok=True)
+    np.save(os.path.join(folder, HASHES), hashes[order])
+    np.save(os.path.join(folder, IDF), tfidf.idf_[order])
+    np.save(os.path.join(folder, COEF), np.ascontiguousarray(coef[:, order]))
+    np.save(os.path.join(folder, INTERCEPT), intercept)
+    np.save(os.path.join(folder, CALIBRATION), calibration)
+    np.save(os.path.join(folder, CLASSES), clf.classes_)
+
+    # written last, so that an incomplete export is never loaded
+    with open(os.path.join(folder, VERSION), "w") as version_file:
+        version_file.write(version)
+
+
+class CompactClassifier:
+    """
+    Classifier saved by export_classifier. The arrays are memory-mapped, so all the processes of a
+    machine share the same copy of the weights. It gives the same probabilities as the pipeline.
+    """
+    def __init__(self, folder):
+        self.hashes = np.load(os.path.join(folder, HASHES), mmap_mode="r")
+        self.idf = np.load(os.path.join(folder, IDF), mmap_mode="r")
+        self.coef = np.load(os.path.join(folder, COEF), mmap_mode="r")
+        self.intercept = np.load(os.path.join(folder, INTERCEPT))
+        self.calibration = np.load(os.path.join(folder, CALIBRATION))
+        self.classes_ = np.load(os.path.join(folder, CLASSES))
+        with open(os.path.join(folder, VERSION)) as version_file:
+            self.version = version_file.read().strip()
+
+    def decision_function(self, texts):
+        """
+        Decision function of the LinearSVC of each fold
+
+        :param texts: list of texts
+        :return: array of shape (folds, texts)
+        """
+        tokens = [TOKEN_PATTERN.findall(text.lower()) for text in texts]
+        docs = np.repeat(np.arange(len(texts)), [len(item) for item in tokens])
+        tokens = [token for item in tokens for token in item]
+
+        # each distinct token of the batch is hashed only once
+        unique = {token: token_hash(token) for token in set(tokens)}
+        hashes = np.fromiter((unique[token] for token in tokens), dtype=np.uint64, count=len(tokens))
+        columns = np.searchsorted(self.hashes, hashes)
+        columns[columns == len(self.hashes)] = 0
+        known = self.hashes[columns] == hashes
+
+        # term frequencies of the known tokens of each text
+        pairs, counts = np.unique(docs[known] * len(self.hashes) + columns[known], return_counts=True)
+        docs, columns = np.divmod(pairs, len(self.hashes))
+
+        weights = counts * self.idf[columns]
+        norms = np.sqrt(np.bincount(docs, weights ** 2, minlength=len(texts)))
+        norms[norms == 0] = 1
+        dot = np.array([np.bincount(docs, weights * coef[columns], minlength=len(texts)) for coef in self.coef])
+        return dot / norms + self.intercept[:, np.newaxis]
+
+    def predict_proba(self, texts):
+        """
+        Probabilities of each class, averaged over the calibrated folds
+
+        :param texts: list of texts
+        :return: array of shape (texts, 2)
+        """
+        decision = self.decision_function(texts)
+        a, b = self.calibration[:, :1], self.calibration[:, 1:]
+        # sigmoid of the calibration (same as sklearn's expit(-(a * decision + b))), a large exponent gives 0
+        with np.errstate(over="ignore"):
+            positive = (1.0 / (1.0 + np.exp(a * decision + b))).mean(axis=0)
+        return np.column_stack([1.0 - positive, positive])
+
+    def predict(self, texts):
+        """
+        Predicted class of each text
+
+        :param texts: list of texts
+        :return: array of classes
+        """
+        return self.classes_[self.predict_proba(texts).argmax(axis=1)]
+
+
+@functools.lru_cache(maxsize=None)
+def load_classifier(path=CLASSIFIER):
+    """
+    Load a classifier only once per process. The compact version saved next to the pipeline
+    (e.g. training/svc_pipeline/) is used when it was exported from the same pipeline.
+
+    :param path: path to the classifier
+    :return: classifier and its version
+    """
+    version = model_version(path)
+    folder = os.path.splitext(path)[0]
+    if os.path.exists(os.path.join(folder, VERSION)):
+        compact = CompactClassifier(folder)
+        if compact.version == version:
+            return compact, version
+    return joblib.load(path), version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the compact version of a classifier")
+    parser.add_argument("path", nargs="?", default=CLASSIFIER, help="path to the classifier")
+    args = parser.parse_args()
+
+    export_classifier(joblib.load(args.path), os.path.splitext(args.path)[0], model_version(args.path))
+    print(f"Saved {os.path.splitext(args.path)[0]}/ (version {model_version(args.path)})")
@@ -1,21 +1,24 @@
+import aiohttp
 import asyncio
 import csv
 import json
 import os
-import pandas as pd
 import re
 import requests
 import sqlalchemy as sa
+import sqlite3
 
 from aiopg.sa import create_engine
-from database.models import Article, ManuallyAnnotated
 from dotenv import load_dotenv
-from typing import Optional, List, Dict, Set
+from typing import Any, Dict, Iterable, List, Optional, Set
 
 load_dotenv()
 
 EUROPE_PMC = "https://www.ebi.ac.uk/europepmc/webservices/rest"
 RATE_LIMIT = 8
+BATCH_SIZE = 100  # number of PMIDs searched with a single request
+ABSTRACT_CACHE = "abstracts.sqlite"
+FETCH_SIZE = 1000  # number of rows read at a time from the database cursor
 NON_RNA_ARTICLE_LIMIT = 3500
 
 
@@ -35,25 +38,129 @@ async def clean_text(text: str) -> str:
     return text.strip()
 
 
-async def fetch_abstract(pmid: str, semaphore: asyncio.Semaphore) -> Optional[str]:
+class RateLimiter:
     """
-    Fetches the abstract for a given PubMed ID (PMID) using the Europe PMC API.
+    Spread requests to respect the Europe PMC rate limit. The limiter is shared by all
+    concurrent tasks, so they can run in parallel without exceeding `rate` requests per second.
+    """
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_request = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            delay = self.next_request - now
+            self.next_request = max(now, self.next_request) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
 
-    :param pmid: the PubMed ID
-    :param semaphore: semaphore to enforce rate limiting
-    :return: the abstract text if found, otherwise None.
+
+class AbstractCache:
     """
-    async with semaphore:
-        try:
-            response = requests.get(
-                f"{EUROPE_PMC}/search?query=EXT_ID:{pmid}"
-                f"&resulttype=core&format=json"
+    Abstracts already fetched from Europe PMC, saved in a SQLite file. PMIDs without
+    abstract are saved as well, so that rebuilding data.csv does not request anything again.
+    """
+    def __init__(self, path: str = ABSTRACT_CACHE):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS abstract (pmid TEXT PRIMARY KEY, abstract TEXT)")
+
+    def get(self, pmids: Iterable[str]) -> Dict[str, Optional[str]]:
+        pmids = list(pmids)
+        cached = {}
+        for start in range(0, len(pmids), 500):
+            batch = pmids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.connection.execute(
+                f"SELECT pmid, abstract FROM abstract WHERE pmid IN ({placeholders})", batch
             )
-            response.raise_for_status()
-            data = json.loads(response.text)
-            return data["resultList"]["result"][0]["abstractText"]
-        except (IndexError, KeyError, requests.RequestException):
-            pass
+            cached.update(rows)
+        return cached
+
+    def save(self, abstracts: Dict[str, Optional[str]]) -> None:
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO abstract VALUES (?, ?)", abstracts.items())
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+async def fetch_abstracts(
+        session: aiohttp.ClientSession,
+        limiter: RateLimiter,
+        pmids: List[str]
+) -> Optional[Dict[str, Optional[str]]]:
+    """
+    Fetches the abstracts of many PubMed IDs (PMIDs) with a single Europe PMC search.
+
+    :param session: aiohttp session
+    :param limiter: rate limiter shared by all requests
+    :param pmids: list of PubMed IDs (at most BATCH_SIZE)
+    :return: dict with the abstract of each PMID (None if not found) or None if the request failed
+    """
+    params = {
+        "query": f"EXT_ID:({' OR '.join(pmids)}) AND SRC:MED",
+        "resultType": "core",
+        "pageSize": len(pmids),
+        "format": "json",
+    }
+
+    for attempt in range(3):
+        await limiter.wait()
+        try:
+            async with session.get(f"{EUROPE_PMC}/search", params=params) as response:
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+            results = data["resultList"]["result"]
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, TypeError, ValueError) as e:
+            print(f"Failed to fetch abstracts of {pmids[0]}..{pmids[-1]} (attempt {attempt + 1}). Error: {e}")
+            await asyncio.sleep(2 ** attempt)
+            continue
+
+        abstracts = dict.fromkeys(pmids)
+        for result in results:
+            if result.get("pmid") in abstracts:
+                abstracts[result["pmid"]] = result.get("abstractText")
+        return abstracts
+
+    return None
+
+
+async def harvest_abstracts(pmids: Iterable[str], cache_path: str = ABSTRACT_CACHE) -> Dict[str, str]:
+    """
+    Fetches the abstracts of a set of PubMed IDs. Abstracts found in the local cache are not
+    requested again; the others are requested BATCH_SIZE at a time, with up to RATE_LIMIT
+    requests per second running concurrently.
+
+    :param pmids: PubMed IDs
+    :param cache_path: path to the SQLite cache
+    :return: dict with the abstract of each PMID that has one
+    """
+    pmids = sorted(set(pmids))
+    cache = AbstractCache(cache_path)
+    abstracts = cache.get(pmids)
+    missing = [pmid for pmid in pmids if pmid not in abstracts]
+    print(f"{len(abstracts)} abstracts found in the cache, {len(missing)} to fetch")
+
+    limiter = RateLimiter(RATE_LIMIT)
+    timeout = aiohttp.ClientTimeout(total=60)
+
+    async def fetch_and_save(session, batch):
+        result = await fetch_abstracts(session, limiter, batch)
+        if result is not None:
+            # save each batch as soon as it arrives, so that an interrupted run is not lost
+            cache.save(result)
+            abstracts.update(result)
+
+    try:
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            batches = [missing[start:start + BATCH_SIZE] for start in range(0, len(missing), BATCH_SIZE)]
+            await asyncio.gather(*[fetch_and_save(session, batch) for batch in batches])
+    finally:
+        cache.close()
+
+    return {pmid: abstract for pmid, abstract in abstracts.items() if abstract}
 
 
 async def tarbase_articles() -> Set[str]:
@@ -130,13 +237,15 @@ async def go_term_publication() -> Set[str]:
     return pubmed_ids
 
 
-async def manually_annotated_articles(pmids: Set[str]) -> List[Dict[str, int]]:
+async def manually_annotated_articles(pmids: Set[str], writer: Any) -> int:
     """
-    Retrieves manually annotated articles from the database, excluding those with PubMed IDs
-    present in the provided `pmids` set.
+    Writes the abstracts of manually annotated articles to a CSV file, excluding those with PubMed IDs
+    present in the provided `pmids` set. Rows are read from a server-side cursor on a single connection,
+    so memory and query time do not grow with the size of the annotation table.
 
     :param pmids: a set of PubMed IDs to exclude from the results
-    :return: a list of abstracts that were manually annotated
+    :param writer: csv writer of the output file
+    :return: number of abstracts written
     """
     user = os.getenv("POSTGRES_USER")
     password = os.getenv("POSTGRES_PASSWORD")
@@ -144,42 +253,38 @@ async def manually_annotated_articles(pmids: Set[str]) -> List[Dict[str, int]]:
     host = os.getenv("POSTGRES_HOST")
     port = os.getenv("POSTGRES_PORT")
 
-    offset = 0
-    limit = 1000
-    results = []
+    declare_cursor = sa.text('''
+        DECLARE annotated_articles NO SCROLL CURSOR FOR
+        SELECT abstract
+        FROM litscan_article
+        WHERE NOT retracted
+          AND abstract IS NOT NULL AND abstract <> ''
+          AND pmcid IN (SELECT pmcid FROM litscan_manually_annotated)
+          AND pmid <> ALL(CAST(:pmids AS TEXT[]))
+    ''')
+    fetch = sa.text(f"FETCH {FETCH_SIZE} FROM annotated_articles")
+    total = 0
 
-    while True:
-        async with create_engine(user=user, database=database, host=host, password=password, port=port) as engine:
-            subquery = sa.select([ManuallyAnnotated.c.pmcid]).distinct()
-            query = (
-                sa.select([Article.c.abstract])
-                .select_from(Article)
-                .where(
-                    ~Article.c.retracted,
-                    Article.c.abstract.isnot(None),
-                    Article.c.abstract != "",
-                    Article.c.pmcid.in_(subquery),
-                    Article.c.pmid.notin_(pmids)
-                )
-                .limit(limit)
-                .offset(offset)
-            )  # noqa
-
-            async with engine.acquire() as connection:
-                get_data = await connection.execute(query)
-                rows = await get_data.fetchall()
+    async with create_engine(user=user, database=database, host=host, password=password, port=port) as engine:
+        async with engine.acquire() as connection:
+            # a cursor only exists inside a transaction
+            async with connection.begin():
+                await connection.execute(declare_cursor, pmids=list(pmids))
 
-                if not rows:
-                    break
+                while True:
+                    get_data = await connection.execute(fetch)
+                    rows = await get_data.fetchall()
 
-                for row in rows:
-                    abstract = await clean_text(row.abstract)
-                    if "rna" in abstract:
-                        results.append({"abstract": abstract, "rna_related": 1})
+                    if not rows:
+                        break
 
-            offset += limit
+                    for row in rows:
+                        abstract = await clean_text(row.abstract)
+                        if "rna" in abstract:
+                            writer.writerow([abstract, 1])
+                            total += 1
 
-    return results
+    return total
 
 
 async def non_rna_articles(page):
@@ -208,9 +313,6 @@ async def main():
     """
     list_of_abstracts = []
 
-    # use semaphore to fetch abstracts in parallel (respecting the API rate limit)
-    semaphore = asyncio.Semaphore(RATE_LIMIT)
-
     # get abstracts from TarBase and Rfam
     tarbase, rfam, go_term = await asyncio.gather(
         tarbase_articles(),
@@ -218,10 +320,9 @@ async def main():
         go_term_publication()
     )
     rna_pmids = tarbase | rfam | go_term
-    rna_task = [fetch_abstract(pmid, semaphore) for pmid in rna_pmids]
-    rna_abstracts = await asyncio.gather(*rna_task)
+    rna_abstracts = await harvest_abstracts(rna_pmids)
 
-    for abstract in filter(None, rna_abstracts):
+    for abstract in rna_abstracts.values():
         cleaned_abstract = await clean_text(abstract)
         list_of_abstracts.append({"abstract": cleaned_abstract, "rna_related": 1})
 
@@ -234,19 +335,21 @@ async def main():
             if len(non_rna_pmids) < NON_RNA_ARTICLE_LIMIT:
                 non_rna_pmids.add(pmid)
 
-    non_rna_task = [fetch_abstract(pmid, semaphore) for pmid in non_rna_pmids]
-    non_rna_abstracts = await asyncio.gather(*non_rna_task)
+    non_rna_abstracts = await harvest_abstracts(non_rna_pmids)
 
-    for abstract in filter(None, non_rna_abstracts):
+    for abstract in non_rna_abstracts.values():
         cleaned_abstract = await clean_text(abstract)
         list_of_abstracts.append({"abstract": cleaned_abstract, "rna_related": 0})
 
-    # get abstracts of manually annotated articles (extracted from the RNAcentral database)
-    manually_annotated = await manually_annotated_articles(rna_pmids)
+    with open("data.csv", "a", newline="") as output:
+        writer = csv.writer(output, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+        writer.writerow(["abstract", "rna_related"])
+
+        # get abstracts of manually annotated articles (extracted from the RNAcentral database)
+        await manually_annotated_articles(rna_pmids, writer)
 
-    # save to CSV
-    df = pd.DataFrame(manually_annotated + list_of_abstracts)
-    df.to_csv("data.csv", mode="a", index=False, quoting=csv.QUOTE_NONNUMERIC)
+        # save to CSV
+        writer.writerows([item["abstract"], item["rna_related"]] for item in list_of_abstracts)
 
 
 if __name__ == "__main__":
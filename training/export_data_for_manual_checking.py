@@ -5,13 +5,12 @@ import pandas as pd
 import requests
 
 from dotenv import load_dotenv
-from export_data import clean_text, fetch_abstract
+from export_data import clean_text, harvest_abstracts
 from typing import Any, Dict, List, Set
 
 load_dotenv()
 
 EUROPE_PMC: str = "https://www.ebi.ac.uk/europepmc/webservices/rest/search"
-RATE_LIMIT: int = 8
 ARTICLE_LIMIT: int = 100
 KEYWORDS: List[str] = [
     "non-coding", "noncoding", "ncrna", "rrna", "lncrna", "sncrna", "mirna", "trna", "rbp", "snrna", "pirna",
@@ -37,10 +36,9 @@ async def fetch_pmids(params: Dict[str, Any]) -> Set[str]:
     return pubmed_ids
 
 
-async def process_abstracts(pmids: Set[str], semaphore: asyncio.Semaphore, rna_related: int, keyword: str) -> List[Dict[str, Any]]:
+async def process_abstracts(pmids: Set[str], rna_related: int, keyword: str) -> List[Dict[str, Any]]:
     """Fetch, clean, and classify abstracts based on RNA relation."""
-    tasks = [fetch_abstract(pmid, semaphore) for pmid in pmids]
-    abstracts = await asyncio.gather(*tasks)
+    abstracts = (await harvest_abstracts(pmids)).values()
     number_of_abstracts: int = 0
     processed: List[Dict[str, Any]] = []
 
@@ -70,9 +68,6 @@ async def main() -> None:
     # track processed PMIDs
     processed_pmids: Set[str] = set()
 
-    # use semaphore to fetch abstracts in parallel (respecting the API rate limit)
-    semaphore = asyncio.Semaphore(RATE_LIMIT)
-
     queries: List[Dict[str, Any]] = [
         {
             "params": {
@@ -124,7 +119,7 @@ async def main() -> None:
         processed_pmids.update(new_pmids)
 
         # fetch abstracts for the new PMIDs
-        abstracts = await process_abstracts(new_pmids, semaphore, query["rna_related"], query["keyword"])
+        abstracts = await process_abstracts(new_pmids, query["rna_related"], query["keyword"])
         list_of_abstracts.extend(abstracts)
 
     df = pd.DataFrame(list_of_abstracts)
@@ -0,0 +1,133 @@
+import argparse
+import hashlib
+import joblib
+import os
+import pandas as pd
+import pickle
+import time
+
+from scipy import sparse
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+from sklearn.metrics import accuracy_score, recall_score
+from sklearn.model_selection import GridSearchCV, train_test_split
+from sklearn.naive_bayes import ComplementNB, MultinomialNB
+from sklearn.pipeline import Pipeline
+from sklearn.svm import LinearSVC
+
+# candidate classifiers and the hyperparameters tested with each of them
+CANDIDATES = {
+    "MultinomialNB": (MultinomialNB(), {"clf__alpha": [0.01, 0.1, 1.0]}),
+    "ComplementNB": (ComplementNB(), {"clf__alpha": [0.01, 0.1, 1.0]}),
+    "LinearSVC": (
+        CalibratedClassifierCV(LinearSVC()),
+        {"clf__estimator__C": [0.1, 1.0, 10.0], "tfidf__sublinear_tf": [False, True]}
+    ),
+    "RandomForest": (
+        RandomForestClassifier(),
+        {"clf__n_estimators": [100, 300], "clf__max_features": ["sqrt", 0.05]}
+    ),
+}
+
+# number of abstracts classified one at a time to measure the latency of each model
+LATENCY_SAMPLE = 200
+
+
+def vectorize(data, cache):
+    """
+    Count the terms of every abstract only once. The matrix is saved in the cache folder and
+    reused while data.csv does not change; the TF-IDF weights are computed inside each pipeline,
+    so the cross-validation folds do not see the idf of the test data.
+
+    :param data: path to data.csv
+    :param cache: folder where the matrix is saved
+    :return: dataframe, fitted CountVectorizer and sparse matrix of term counts
+    """
+    df = pd.read_csv(data)
+
+    with open(data, "rb") as data_file:
+        digest = hashlib.sha256(data_file.read()).hexdigest()[:16]
+    matrix_path = os.path.join(cache, f"counts_{digest}.npz")
+    vectorizer_path = os.path.join(cache, f"vectorizer_{digest}.pkl")
+
+    if os.path.exists(matrix_path) and os.path.exists(vectorizer_path):
+        return df, joblib.load(vectorizer_path), sparse.load_npz(matrix_path)
+
+    vectorizer = CountVectorizer()
+    counts = vectorizer.fit_transform(df["abstract"])
+    os.makedirs(cache, exist_ok=True)
+    joblib.dump(vectorizer, vectorizer_path)
+    sparse.save_npz(matrix_path, counts)
+    return df, vectorizer, counts
+
+
+def inference_latency(pipeline, abstracts):
+    """
+    Average time needed to classify one abstract, as the consumer does
+
+    :param pipeline: pipeline that accepts raw text
+    :param abstracts: list of abstracts
+    :return: milliseconds per abstract
+    """
+    start = time.perf_counter()
+    for abstract in abstracts:
+        pipeline.predict_proba([abstract])
+    return (time.perf_counter() - start) * 1000 / len(abstracts)
+
+
+def main(data="data.csv", cache=".cache", n_jobs=-1, cv=5):
+    """
+    Search the best hyperparameters of each candidate with cross-validation on the training set,
+    then report accuracy, sensitivity and specificity on the test set together with the latency
+    and the size of the model.
+
+    :param data: path to data.csv
+    :param cache: folder where the term counts are saved
+    :param n_jobs: number of processes used by GridSearchCV (-1 to use all cores)
+    :param cv: number of cross-validation folds
+    :return: dataframe with one row per candidate
+    """
+    start = time.perf_counter()
+    df, vectorizer, counts = vectorize(data, cache)
+    print(f"Vectorized {counts.shape[0]} abstracts ({counts.shape[1]} terms) in {time.perf_counter() - start:.1f}s\n")
+
+    indices = range(counts.shape[0])
+    train, test = train_test_split(indices, test_size=0.2, random_state=42)
+    y_train, y_test = df["rna_related"].iloc[train], df["rna_related"].iloc[test]
+    abstracts = df["abstract"].iloc[test].tolist()[:LATENCY_SAMPLE]
+
+    report = []
+    for name, (classifier, grid) in CANDIDATES.items():
+        pipeline = Pipeline(steps=[("tfidf", TfidfTransformer()), ("clf", classifier)])
+        search = GridSearchCV(pipeline, grid, cv=cv, n_jobs=n_jobs, scoring="accuracy")
+        search.fit(counts[train], y_train)
+
+        y_pred = search.predict(counts[test])
+        model = Pipeline(steps=[("counts", vectorizer), ("model", search.best_estimator_)])
+        report.append({
+            "classifier": name,
+            "params": search.best_params_,
+            "cv_accuracy": round(float(search.best_score_), 3),
+            "accuracy": round(accuracy_score(y_test, y_pred), 3),
+            "sensitivity": round(recall_score(y_test, y_pred, pos_label=1), 3),
+            "specificity": round(recall_score(y_test, y_pred, pos_label=0), 3),
+            "latency_ms": round(inference_latency(model, abstracts), 2),
+            "size_mb": round(len(pickle.dumps(model)) / 2 ** 20, 2),
+        })
+        print(report[-1])
+
+    report = pd.DataFrame(report).sort_values("accuracy", ascending=False)
+    print("\n" + report.to_string(index=False))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare text classifiers with cross-validation")
+    parser.add_argument("--data", default="data.csv", help="csv file with the abstract and rna_related columns")
+    parser.add_argument("--cache", default=".cache", help="folder where the term counts are saved")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="number of processes (-1 to use all cores)")
+    parser.add_argument("--cv", type=int, default=5, help="number of cross-validation folds")
+    args = parser.parse_args()
+
+    main(data=args.data, cache=args.cache, n_jobs=args.n_jobs, cv=args.cv)
@@ -1,6 +1,8 @@
 import joblib
 import pandas as pd
 
+from classifier import export_classifier, model_version
+
 from sklearn.calibration import CalibratedClassifierCV
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -73,6 +75,13 @@ def main():
             f"to '{best_classifier_name}_pipeline.pkl'"
         )
         # Saved the best classifier (LinearSVC) with accuracy 0.98 to 'LinearSVC_pipeline.pkl'
+        version = model_version(f"{best_classifier_name}_pipeline.pkl")
+        print(f"Classifier version: {version}")
+
+        # save the weights in the format used by the consumers (only available for LinearSVC)
+        if best_classifier_name == "LinearSVC":
+            export_classifier(best_pipeline, f"{best_classifier_name}_pipeline", version)
+            print(f"Saved the compact version of the classifier to '{best_classifier_name}_pipeline/'")
 
     # display classification report for the best classifier pipeline
     print(f"\nClassification Report for {best_classifier_name}:")
@@ -1,44 +1,147 @@
+import argparse
 import asyncio
-import joblib
 import os
+import pandas as pd
 import sqlalchemy as sa
 
 from aiopg.sa import create_engine
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 from tenacity import retry, stop_after_attempt, wait_fixed
 
-from export_data import clean_text
+from classifier import CLASSIFIER, load_classifier, model_version
 
 load_dotenv()
 
+# classifier used by the batch, loaded once per process
+rna_pipeline = None
+
 
 @retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
-async def fetch_articles(connection, batch_size, offset):
+async def fetch_articles(connection, batch_size, last_pmcid, version):
     """
     Fetch articles from the database with retry mechanism.
+    Keyset pagination (pmcid > last_pmcid) is used so that every batch is read from the primary key index.
+    Articles already classified by this version of the classifier are skipped.
 
     :param connection: database connection
     :param batch_size: number of articles to fetch
-    :param offset: offset for pagination
+    :param last_pmcid: last pmcid of the previous batch
+    :param version: version of the classifier
     :return: list of articles
     """
     query = sa.text(
-        '''SELECT pmcid, abstract 
-           FROM litscan_article 
-           WHERE NOT retracted
-           ORDER BY pmcid 
-           LIMIT :batch_size OFFSET :offset'''
+        '''SELECT pmcid, abstract
+           FROM litscan_article
+           WHERE NOT retracted AND pmcid > :last_pmcid AND model_version IS DISTINCT FROM :version
+           ORDER BY pmcid
+           LIMIT :batch_size'''
     )
-    result = await connection.execute(query, batch_size=batch_size, offset=offset)
+    result = await connection.execute(query, batch_size=batch_size, last_pmcid=last_pmcid, version=version)
     articles = await result.fetchall()
     return articles
 
 
-async def is_rna_related(batch_size=1000):
+def clean_abstracts(abstracts):
+    """
+    Same as export_data.clean_text, applied to a whole batch
+
+    :param abstracts: list of abstracts
+    :return: list of cleaned abstracts
+    """
+    text = pd.Series(abstracts, dtype=object).fillna("").str.lower()
+    text = text.str.replace(r'<[^>]*>', " ", regex=True)
+    text = text.str.replace(r"\[.*?\]", "", regex=True)
+    text = text.str.replace(r"https?://\S+|www\.\S+", "", regex=True)
+    text = text.str.replace(r"\s+", " ", regex=True)
+    return text.str.strip().tolist()
+
+
+def load_pipeline(path):
+    """
+    Load the classifier (in the main process or in each worker of the pool)
+
+    :param path: path to the classifier
+    :return: None
+    """
+    global rna_pipeline
+    rna_pipeline, _ = load_classifier(path)
+
+
+def classify(pmcids, abstracts):
     """
-    Update the rna_related and probability fields of articles identified by LitScan
+    Classify a batch of articles with a single call to predict_proba
+
+    :param pmcids: list of pmcids
+    :param abstracts: list of abstracts
+    :return: pmcids, rna_related and probability of each article
+    """
+    probabilities = rna_pipeline.predict_proba(clean_abstracts(abstracts))
+    labels = rna_pipeline.classes_[probabilities.argmax(axis=1)]
+    rna_related = [bool(int(label)) for label in labels]
+    probability = [round(float(item), 2) for item in probabilities[:, 1]]
+    return pmcids, rna_related, probability
+
+
+async def save_batch(connection, version, pmcids, rna_related, probability):
+    """
+    Update the articles of a batch with a single statement. The same statement adds the articles whose
+    label changed to the rna_related count of litscan_stats (see database/stats.py), for every job that found them
+
+    :param connection: database connection
+    :param version: version of the classifier
+    :param pmcids: list of pmcids
+    :param rna_related: list of labels
+    :param probability: list of probabilities
+    :return: number of articles updated
+    """
+    update_query = sa.text(
+        '''WITH old AS (
+             SELECT pmcid, rna_related FROM litscan_article WHERE pmcid = ANY(CAST(:pmcids AS TEXT[]))
+           ),
+           updated AS (
+             UPDATE litscan_article a
+             SET rna_related = v.rna_related, probability = v.probability, model_version = :version
+             FROM unnest(CAST(:pmcids AS TEXT[]), CAST(:rna_related AS BOOLEAN[]), CAST(:probability AS FLOAT[]))
+               AS v(pmcid, rna_related, probability)
+             WHERE a.pmcid = v.pmcid
+             RETURNING a.pmcid, a.year, a.rna_related
+           ),
+           changed AS (
+             SELECT u.pmcid, COALESCE(u.year, 0) AS year, CASE WHEN u.rna_related THEN 1 ELSE -1 END AS delta
+             FROM updated u
+             JOIN old o ON o.pmcid = u.pmcid
+             WHERE COALESCE(o.rna_related, FALSE) <> COALESCE(u.rna_related, FALSE)
+           )
+           UPDATE litscan_stats s
+           SET rna_related = s.rna_related + d.delta
+           FROM (
+             SELECT r.job_id, c.year, SUM(c.delta) AS delta
+             FROM changed c
+             JOIN litscan_result r ON r.pmcid = c.pmcid
+             GROUP BY r.job_id, c.year
+           ) d
+           WHERE s.job_id = d.job_id AND s.year = d.year'''
+    )
+    try:
+        await connection.execute(
+            update_query, version=version, pmcids=pmcids, rna_related=rna_related, probability=probability
+        )
+    except Exception as e:
+        print(f"Failed to save rna_related and probability for pmcids {pmcids[0]} to {pmcids[-1]}. Error: {e}")
+        return 0
+    return len(pmcids)
+
+
+async def is_rna_related(batch_size=5000, workers=0, model=CLASSIFIER):
+    """
+    Update the rna_related and probability fields of articles identified by LitScan.
+    Only articles that were classified by another version of the classifier (or never classified) are
+    updated, so the script can be stopped and started again.
 
     :param batch_size: number of articles to fetch
+    :param workers: number of processes used to classify batches (0 to classify in this process)
+    :param model: path to the classifier
     :return: None
     """
     # get credentials
@@ -48,49 +151,57 @@ async def is_rna_related(batch_size=1000):
     host = os.getenv("POSTGRES_HOST")
     port = os.getenv("POSTGRES_PORT")
 
-    rna_pipeline = joblib.load("training/svc_pipeline.pkl")
+    version = model_version(model)
+    print(f"Classifier version: {version}")
+
+    loop = asyncio.get_running_loop()
+    executor = None
+    if workers:
+        executor = ProcessPoolExecutor(workers, initializer=load_pipeline, initargs=(model,))
+    else:
+        load_pipeline(model)
 
     async with create_engine(user=user, database=database, host=host, password=password, port=port) as engine:
         async with engine.acquire() as connection:
-            offset = 0
+            last_pmcid = ""
+            pending = []
+            updated = 0
 
             while True:
                 try:
-                    articles = await fetch_articles(connection, batch_size, offset)
+                    articles = await fetch_articles(connection, batch_size, last_pmcid, version)
                 except Exception as e:
                     print(f"Failed to fetch articles after 3 attempts. Error: {e}")
-                    break
+                    articles = []
+
+                if articles:
+                    last_pmcid = articles[-1]["pmcid"]
+                    pmcids = [article["pmcid"] for article in articles]
+                    abstracts = [article["abstract"] for article in articles]
+
+                    if executor:
+                        pending.append(loop.run_in_executor(executor, classify, pmcids, abstracts))
+                    else:
+                        updated += await save_batch(connection, version, *classify(pmcids, abstracts))
+
+                # save the oldest batch when all workers are busy or when there is nothing else to read
+                while pending and (len(pending) >= workers or not articles):
+                    updated += await save_batch(connection, version, *await pending.pop(0))
 
                 if not articles:
                     break
 
-                for article in articles:
-                    pmcid = article["pmcid"]
-                    abstract = await clean_text(article["abstract"])
-                    relevance_label = rna_pipeline.predict([abstract])[0]
-                    relevance_label = bool(int(relevance_label))
-                    probability = rna_pipeline.predict_proba([abstract])[0][1]
-                    probability = round(float(probability), 2)
-
-                    try:
-                        # update article data
-                        update_query = sa.text(
-                            '''UPDATE litscan_article 
-                               SET rna_related = :rna_related, probability = :probability 
-                               WHERE pmcid = :pmcid'''
-                        )
-                        await connection.execute(
-                            update_query,
-                            rna_related=relevance_label,
-                            probability=probability,
-                            pmcid=pmcid
-                        )
-                    except Exception as e:
-                        print(f"Failed to save rna_related and probability for pmcid = {pmcid}. Error: {e}")
-
-                # increment offset for the next batch
-                offset += batch_size
+                print(f"{updated} articles updated (last pmcid: {last_pmcid})")
+
+    if executor:
+        executor.shutdown()
 
 
 if __name__ == "__main__":
-    asyncio.run(is_rna_related())
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=5000, help="number of articles classified at once")
+    parser.add_argument("--workers", type=int, default=0, help="number of processes used to classify batches")
+    parser.add_argument("--model", default=CLASSIFIER, help="path to the classifier")
+    args = parser.parse_args()
+
+    asyncio.run(is_rna_related(batch_size=args.batch_size, workers=args.workers, model=args.model))